@@ -4,42 +4,49 @@ from vector_db_manager.chroma import (
     build_document_filter,
 )
 from llm_client.embedding import generate_embeddings
-from llm_client.completion import get_completion
+from llm_client.completion import get_completion, stream_completion
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
-def rewrite_document_with_rag(existing_doc_id, new_standard_text):
+# 書き換えプロンプトのテンプレートを変更したら更新する（補完キャッシュのキーに含まれる）
+REWRITE_PROMPT_VERSION = "rag-rewrite-1"
+
+class RewriteError(RuntimeError):
+    """Raised by :func:`rewrite_document_with_rag_stream` when retrieval fails."""
+
+def _build_rewrite_prompt(existing_doc_id, new_standard_text, tenant):
     """
-    Rewrites a document using the RAG (Retrieval Augmented Generation) approach.
+    Runs the retrieval steps and returns ``(prompt, None)``, or
+    ``(None, error_message)`` when a step fails.
     """
-    logger.info("Starting document rewrite process with RAG...")
 
     # 1. 新規格のテキストをベクトル化してクエリとして使用
     logger.info("Step 1: Generating embedding for the new standard...")
     try:
-        embeddings = generate_embeddings([new_standard_text])
-        if not embeddings:
+        embeddings = generate_embeddings([new_standard_text], as_array=True)
+        if len(embeddings) == 0:
             logger.error("Could not generate embedding for the new standard.")
-            return "Error: Could not generate embedding for the new standard."
+            return None, "Error: Could not generate embedding for the new standard."
 
         query_embedding = embeddings[0]
-        if not query_embedding:
+        if not query_embedding.size:
             logger.error("Could not generate embedding for the new standard.")
-            return "Error: Could not generate embedding for the new standard."
+            return None, "Error: Could not generate embedding for the new standard."
     except Exception as e:
         logger.error(f"Error generating embedding for new standard: {e}", exc_info=True)
-        return f"Error: 新規格のベクトル化中にエラーが発生しました。 {e}"
+        return None, f"Error: 新規格のベクトル化中にエラーが発生しました。 {e}"
 
     # 2. 関連する既存文書のチャンクをベクトルDBから検索
     logger.info("Step 2: Searching for relevant chunks from the existing document...")
     try:
-        collection = get_or_create_collection()
+        collection = get_or_create_collection(tenant=tenant)
         retrieved_chunks = search_similar_chunks(
             collection,
             query_embedding,
             top_k=5,
             where=build_document_filter(existing_doc_id),
+            query_text=new_standard_text,
         )
         if not retrieved_chunks:
             logger.warning("No relevant chunks found. Proceeding without context from existing doc.")
@@ -49,7 +56,7 @@ def rewrite_document_with_rag(existing_doc_id, new_standard_text):
             logger.info(f"Found {len(retrieved_chunks)} relevant chunks.")
     except Exception as e:
         logger.error(f"Error searching for similar chunks: {e}", exc_info=True)
-        return f"Error: 関連文書の検索中にエラーが発生しました。 {e}"
+        return None, f"Error: 関連文書の検索中にエラーが発生しました。 {e}"
 
     # 3. AIへのプロンプトを構築
     logger.info("Step 3: Constructing prompt for the AI...")
@@ -70,10 +77,45 @@ def rewrite_document_with_rag(existing_doc_id, new_standard_text):
     - AIの判断だけでは対応が難しい、あるいは解釈の確認が必要な項目があれば、`[要確認]`というプレフィックスを付けてその項目を記述してください。
     """
 
+    return prompt, None
+
+def rewrite_document_with_rag(existing_doc_id, new_standard_text, tenant=None, regenerate=False):
+    """
+    Rewrites a document using the RAG (Retrieval Augmented Generation) approach.
+
+    ``tenant`` must match the namespace the existing document was stored in.
+    An identical earlier rewrite is returned from the completion cache
+    unless ``regenerate`` is set.
+    """
+    logger.info("Starting document rewrite process with RAG...")
+    prompt, error = _build_rewrite_prompt(existing_doc_id, new_standard_text, tenant)
+    if error:
+        return error
+
     # 4. AIを呼び出して書き換え後のコンテンツを取得
     logger.info("Step 4: Calling AI for document generation...")
-    rewritten_content = get_completion(prompt)
+    rewritten_content = get_completion(prompt, regenerate=regenerate, cache_version=REWRITE_PROMPT_VERSION)
     logger.info("Document generation complete.")
 
     return rewritten_content
 
+def rewrite_document_with_rag_stream(existing_doc_id, new_standard_text, tenant=None, regenerate=False):
+    """
+    Streaming variant of :func:`rewrite_document_with_rag`.
+
+    Yields the rewritten document piece by piece as the model produces it;
+    ``"".join`` of the pieces equals the non-streaming result.  Failures are
+    raised rather than yielded: :class:`RewriteError` when retrieval fails
+    and :class:`~llm_client.completion.CompletionError` when generation
+    does, possibly after some pieces, which must then be discarded.
+    """
+    logger.info("Starting streaming document rewrite process with RAG...")
+    prompt, error = _build_rewrite_prompt(existing_doc_id, new_standard_text, tenant)
+    if error:
+        raise RewriteError(error)
+
+    # 4. AIの出力を受信しながら順次返す
+    logger.info("Step 4: Streaming AI document generation...")
+    yield from stream_completion(prompt, regenerate=regenerate, cache_version=REWRITE_PROMPT_VERSION)
+    logger.info("Document generation complete.")
+
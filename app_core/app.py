@@ -1,10 +1,13 @@
 import streamlit as st
 import os
+import time
 from pathlib import Path
 from datetime import datetime
 
 from document_processor.extractor import extract_text
+from document_processor.spool import spool_upload
 from utils.helpers import validate_file_type
+from vector_db_manager.chroma import TenantLease, sweep_orphaned_tenants
 
 # ページ設定
 st.set_page_config(
@@ -14,7 +17,41 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# ストリーミング表示の再描画間隔（秒）
+STREAM_RENDER_INTERVAL = 0.1
+
+@st.cache_resource
+def sweep_vector_tenants():
+    """プロセス起動時に一度だけ、異常終了で残ったセッション用テナントのディレクトリを削除する"""
+    return sweep_orphaned_tenants()
+
+def get_session_tenant():
+    """セッションで使うベクトルDBの名前空間を返す
+
+    永続ストア（CHROMA_DB_PATH）では、ベクトル化した文書をセッションをまたいで再利用できるよう
+    固定のテナント（VECTOR_TENANT、未設定なら既定の名前空間）を使う。
+    メモリ上のストアではセッションごとの TenantLease を使い、他セッションの文書と混ざらないようにする。
+    リースはセッション状態に保持し、セッションが破棄されるとそのコレクションを解放する。
+    """
+    if os.getenv('CHROMA_DB_PATH'):
+        return os.getenv('VECTOR_TENANT') or None
+    if 'vector_tenant_lease' not in st.session_state:
+        st.session_state['vector_tenant_lease'] = TenantLease()
+    return st.session_state['vector_tenant_lease'].tenant
+
+def get_spooled_path(upload):
+    """アップロードを一時ディレクトリへ一度だけ書き出し、そのパスを返す（getvalue() による複製を避ける）"""
+    if 'spooled_uploads' not in st.session_state:
+        st.session_state['spooled_uploads'] = {}
+    spooled = st.session_state['spooled_uploads']
+    key = getattr(upload, 'file_id', None) or (upload.name, upload.size)
+    if key not in spooled or not os.path.exists(spooled[key]):
+        spooled[key] = spool_upload(upload)
+    return spooled[key]
+
 def main():
+    sweep_vector_tenants()
+
     # サイドバーの設定
     with st.sidebar:
         st.title("📋 ISOP")
@@ -129,8 +166,7 @@ def show_upload_page():
             # プレビュー機能
             if st.checkbox("📄 ファイル内容をプレビュー"):
                 try:
-                    content = existing_doc.getvalue()
-                    text = extract_text(content, existing_doc.type)
+                    text = extract_text(get_spooled_path(existing_doc), existing_doc.type)
                     st.text_area("ファイル内容", text, height=200)
                 except Exception as e:
                     st.error(f"プレビューの生成に失敗しました: {e}")
@@ -160,8 +196,7 @@ def show_upload_page():
             # プレビュー機能
             if st.checkbox("📄 新規格内容をプレビュー", key="preview_new"):
                 try:
-                    content = new_standard_doc.getvalue()
-                    text = extract_text(content, new_standard_doc.type)
+                    text = extract_text(get_spooled_path(new_standard_doc), new_standard_doc.type)
                     st.text_area("新規格内容", text, height=200)
                 except Exception as e:
                     st.error(f"プレビューの生成に失敗しました: {e}")
@@ -205,6 +240,11 @@ def show_ai_processing_page():
     with tab1:
         st.header("処理実行")
         
+        regenerate = st.checkbox(
+            "🔄 前回の結果を使わずに再生成する",
+            help="同じ書類・規格・モデルでの書き換え結果はキャッシュから即座に返されます",
+        )
+        
         if st.button("🚀 処理を開始", type="primary"):
             try:
                 # ステップ1: 書類解析
@@ -220,8 +260,8 @@ def show_ai_processing_page():
                         try:
                             from utils.logger import app_logger, log_file_operation
                             
-                            existing_doc_content = existing_doc.getvalue()
-                            new_standard_doc_content = new_standard_doc.getvalue()
+                            existing_doc_content = get_spooled_path(existing_doc)
+                            new_standard_doc_content = get_spooled_path(new_standard_doc)
                             
                             # ログ記録
                             log_file_operation("upload", existing_doc.name, existing_doc.size)
@@ -253,10 +293,13 @@ def show_ai_processing_page():
                     try:
                         from services.document_service import process_and_store_document
                         
+                        # 再実行時は前回のチャンクを置き換えてコレクションの肥大化を防ぐ
                         doc_id, num_chunks = process_and_store_document(
                             file_content=existing_doc_content,
                             file_type=existing_doc.type,
-                            document_name=existing_doc.name
+                            document_name=existing_doc.name,
+                            doc_id=st.session_state.get('existing_doc_id'),
+                            tenant=get_session_tenant()
                         )
                         
                         if doc_id:
@@ -280,16 +323,28 @@ def show_ai_processing_page():
                 st.session_state['current_step'] = 2
                 st.session_state['processing_status'] = "AI書き換え中..."
                 
-                with st.spinner("AIが書類を書き換えています...（数分かかることがあります）"):
+                with st.spinner("AIが書類を書き換えています...（生成された内容から順に表示します）"):
+                    preview = st.empty()
                     try:
-                        from ai_agent.rag import rewrite_document_with_rag
+                        from ai_agent.rag import rewrite_document_with_rag_stream
                         from utils.logger import log_ai_operation
                         
-                        rewritten_doc = rewrite_document_with_rag(
+                        # 受信したトークンを逐次表示する（再描画は間引いて負荷を抑える）
+                        pieces = []
+                        last_render = 0.0
+                        for piece in rewrite_document_with_rag_stream(
                             existing_doc_id=st.session_state['existing_doc_id'],
-                            new_standard_text=st.session_state['new_standard_doc_text']
-                        )
+                            new_standard_text=st.session_state['new_standard_doc_text'],
+                            tenant=get_session_tenant(),
+                            regenerate=regenerate
+                        ):
+                            pieces.append(piece)
+                            if time.monotonic() - last_render >= STREAM_RENDER_INTERVAL:
+                                preview.markdown("".join(pieces) + "▌")
+                                last_render = time.monotonic()
                         
+                        rewritten_doc = "".join(pieces)
+                        preview.markdown(rewritten_doc)
                         st.session_state['rewritten_doc'] = rewritten_doc
                         log_ai_operation("書類書き換え", "gpt-4o-mini", success=True)
                         app_logger.log_processing_step("AI書き換え", "完了", {
@@ -298,6 +353,9 @@ def show_ai_processing_page():
                         st.success("✅ AI書き換えが完了しました")
                         
                     except Exception as e:
+                        # 途中で失敗した出力は書き換え結果として扱わず、表示からも消す
+                        preview.empty()
+                        st.session_state.pop('rewritten_doc', None)
                         log_ai_operation("書類書き換え", "gpt-4o-mini", success=False, error=e)
                         app_logger.log_error("AI書き換え中にエラーが発生", e)
                         st.error(f"AI書き換え中にエラーが発生しました: {e}")
@@ -507,7 +565,7 @@ def show_batch_processing_page():
     
     from services.batch_processor import create_batch_interface
     
-    create_batch_interface()
+    create_batch_interface(tenant=get_session_tenant())
 
 def show_template_page():
     """テンプレートページの表示"""
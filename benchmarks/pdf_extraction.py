@@ -0,0 +1,73 @@
+"""Wall-clock benchmark of serial versus process-pool PDF text extraction.
+
+Run from the repository root::
+
+    python -m benchmarks.pdf_extraction                 # synthetic 300-page PDF
+    python -m benchmarks.pdf_extraction standard.pdf --workers 1 2 4 8
+
+Pool start-up is measured separately (first call) and excluded from the
+per-run timings, which are the best of ``--repeat`` runs.
+"""
+
+import argparse
+import io
+import os
+import time
+
+from document_processor.extractor import extract_text_from_pdf
+
+
+def synthetic_pdf(pages=300, lines=60):
+    """Return a text-heavy PDF similar in layout to a standards document."""
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer)
+    for page in range(pages):
+        y = 800
+        for line in range(lines):
+            c.drawString(40, y, f"{page + 1}.{line + 1} The organization shall establish, implement, maintain and continually improve the ISMS.")
+            y -= 13
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+def best_of(repeat, function):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdf", nargs="?", help="PDF file (default: synthetic document)")
+    parser.add_argument("--pages", type=int, default=300, help="pages of the synthetic document")
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.pdf:
+        with open(args.pdf, "rb") as f:
+            content = f.read()
+    else:
+        content = synthetic_pdf(args.pages)
+
+    baseline, expected = best_of(args.repeat, lambda: extract_text_from_pdf(content, workers=1))
+    print(f"CPUs: {os.cpu_count()}, document: {len(content) / 2**20:.1f} MiB")
+    print(f"{'workers':>7} {'seconds':>8} {'speedup':>8}  pool start-up")
+    print(f"{1:>7} {baseline:>8.2f} {1.0:>7.2f}x  -")
+    for workers in args.workers:
+        if workers <= 1:
+            continue
+        startup, _ = best_of(1, lambda: extract_text_from_pdf(content, workers=workers, min_pages=0))
+        seconds, text = best_of(args.repeat, lambda: extract_text_from_pdf(content, workers=workers, min_pages=0))
+        assert text == expected, "parallel extraction changed the text"
+        print(f"{workers:>7} {seconds:>8.2f} {baseline / seconds:>7.2f}x  {startup - seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Peak RSS of extracting a large PDF from in-memory bytes versus a spooled path.
+
+Run from the repository root (Unix only, uses ``resource``)::
+
+    python -m benchmarks.upload_memory                  # synthetic 100 MiB PDF
+    python -m benchmarks.upload_memory standard.pdf
+
+Each mode runs in a fresh interpreter, so the reported peak belongs to that
+mode alone.  ``upload`` reproduces the previous flow: the upload buffer plus
+a ``getvalue()`` copy handed to the extractor.  ``path`` spools the upload
+once and extracts from the memory-mapped file.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+MODES = ("baseline", "upload", "path")
+
+_CHILD = """
+import io, resource, sys
+from document_processor.extractor import extract_text
+from document_processor.spool import spool_upload
+
+mode, path, spool = sys.argv[1:]
+if mode == "upload":
+    with open(path, "rb") as f:
+        upload = io.BytesIO(f.read())
+    extract_text(bytearray(upload.getbuffer()), "application/pdf", use_cache=False)
+elif mode == "path":
+    with open(path, "rb") as f:
+        source = spool_upload(f, spool)
+    extract_text(source, "application/pdf", use_cache=False)
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def synthetic_pdf(path, megabytes=100):
+    """Write a short PDF that carries ``megabytes`` of incompressible embedded data."""
+    import pypdf
+
+    writer = pypdf.PdfWriter()
+    writer.add_blank_page(width=595, height=842)
+    writer.add_attachment("appendix.bin", os.urandom(megabytes * 2**20))
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+def peak_rss_mib(mode, path, spool):
+    output = subprocess.run(
+        [sys.executable, "-c", _CHILD, mode, path, spool], check=True, capture_output=True, text=True
+    ).stdout
+    kilobytes = int(output.split()[-1])
+    return kilobytes / 1024 if sys.platform != "darwin" else kilobytes / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdf", nargs="?", help="PDF file (default: synthetic document)")
+    parser.add_argument("--megabytes", type=int, default=100, help="size of the synthetic document")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = args.pdf or os.path.join(workdir, "synthetic.pdf")
+        if not args.pdf:
+            synthetic_pdf(path, args.megabytes)
+        print(f"document: {os.path.getsize(path) / 2**20:.1f} MiB")
+        print(f"{'mode':>8} {'peak MiB':>9} {'over baseline':>14}")
+        baseline = None
+        for mode in MODES:
+            peak = peak_rss_mib(mode, path, os.path.join(workdir, "spool"))
+            baseline = peak if baseline is None else baseline
+            print(f"{mode:>8} {peak:>9.1f} {peak - baseline:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
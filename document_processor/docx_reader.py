@@ -0,0 +1,114 @@
+"""Streaming text extraction from DOCX files.
+
+A ``.docx`` file is a zip archive whose text lives in WordprocessingML
+parts: ``word/document.xml`` for the body plus ``word/headerN.xml``,
+``word/footerN.xml``, ``word/footnotes.xml`` and ``word/endnotes.xml``.
+Instead of building python-docx's object model, each part is decompressed
+as a stream and parsed with :func:`xml.etree.ElementTree.iterparse`.
+Every paragraph, table row and table is detached from its parent as soon
+as it has been read, so memory stays flat however large the document is.
+
+Blocks are produced in reading order: headers, the body, footnotes,
+endnotes, then footers.  A paragraph outside tables is one block (empty
+paragraphs included, as in python-docx's ``paragraph.text``).  A table cell
+is one block, made of its paragraphs joined by newlines.  Text in
+``<w:delText>`` (tracked deletions), field instructions and the
+``mc:Fallback`` copies of text boxes is skipped.
+"""
+
+from __future__ import annotations
+
+import re
+import zipfile
+from typing import IO, Iterator, List, Union
+from xml.etree.ElementTree import iterparse
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+
+_P, _T, _TC, _TR, _TBL = W + "p", W + "t", W + "tc", W + "tr", W + "tbl"
+_NOTES = {W + "footnote", W + "endnote"}
+_CHARACTERS = {W + "tab": "\t", W + "ptab": "\t", W + "br": "\n", W + "cr": "\n", W + "noBreakHyphen": "-"}
+_SEPARATOR_NOTES = {"separator", "continuationSeparator", "continuationNotice"}
+_DETACHED = {_P, _TR, _TBL}
+
+BODY_PART = "word/document.xml"
+_HEADER = re.compile(r"word/header\d*\.xml")
+_FOOTER = re.compile(r"word/footer\d*\.xml")
+
+
+def _part_key(name: str):
+    number = re.search(r"(\d+)\.xml$", name)
+    return int(number.group(1)) if number else 0
+
+
+def document_parts(names: List[str]) -> List[str]:
+    """Return the text-bearing parts among archive ``names`` in reading order."""
+
+    headers = sorted((name for name in names if _HEADER.fullmatch(name)), key=_part_key)
+    footers = sorted((name for name in names if _FOOTER.fullmatch(name)), key=_part_key)
+    notes = [name for name in ("word/footnotes.xml", "word/endnotes.xml") if name in names]
+    return headers + [BODY_PART] + notes + footers
+
+
+def iter_part_blocks(stream: IO[bytes], keep_empty: bool = True) -> Iterator[str]:
+    """Yield the paragraph and table-cell texts of one WordprocessingML part."""
+
+    stack = []
+    paragraphs: List[List[str]] = []  # text pieces of the open paragraphs (text boxes nest)
+    cells: List[List[str]] = []  # paragraph texts of the open table cells
+    skip = 0  # depth inside elements whose text is ignored
+
+    for event, elem in iterparse(stream, events=("start", "end")):
+        tag = elem.tag
+        if event == "start":
+            stack.append(elem)
+            if tag == MC_FALLBACK or (tag in _NOTES and elem.get(W + "type") in _SEPARATOR_NOTES):
+                skip += 1
+            elif skip:
+                pass
+            elif tag == _P:
+                paragraphs.append([])
+            elif tag == _TC:
+                cells.append([])
+            continue
+
+        stack.pop()
+        if tag == MC_FALLBACK or (tag in _NOTES and elem.get(W + "type") in _SEPARATOR_NOTES):
+            skip -= 1
+        elif skip:
+            pass
+        elif tag == _T:
+            if paragraphs and elem.text:
+                paragraphs[-1].append(elem.text)
+        elif tag in _CHARACTERS:
+            if paragraphs:
+                paragraphs[-1].append(_CHARACTERS[tag])
+        elif tag == _P:
+            text = "".join(paragraphs.pop())
+            if cells:
+                cells[-1].append(text)
+            elif text or keep_empty:
+                yield text
+        elif tag == _TC:
+            text = "\n".join(cells.pop())
+            if text.strip() or keep_empty:
+                yield text
+
+        if tag in _DETACHED:
+            # 読み終えた要素を親から外し、文書全体の木がメモリに残らないようにする
+            elem.clear()
+            if stack:
+                stack[-1].remove(elem)
+
+
+def iter_docx_blocks(source: Union[str, IO[bytes]]) -> Iterator[str]:
+    """Yield the text blocks of the DOCX file ``source`` (a path or binary file object)."""
+
+    with zipfile.ZipFile(source) as archive:
+        names = archive.namelist()
+        if BODY_PART not in names:
+            raise ValueError("Not a DOCX file: word/document.xml is missing")
+        for name in document_parts(names):
+            with archive.open(name) as stream:
+                yield from iter_part_blocks(stream, keep_empty=name == BODY_PART)
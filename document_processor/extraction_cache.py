@@ -0,0 +1,117 @@
+"""Content-addressed cache of extracted document text.
+
+The same upload is extracted several times per run: every preview rerun of
+the upload page, the AI processing page, ``process_and_store_document`` and
+the batch processor all call :func:`~document_processor.extractor.extract_text`
+on the same bytes.  Results are keyed by ``sha256(file type + bytes)`` so
+each distinct file is parsed once per process (and, with the disk tier,
+once across restarts).
+
+The cache is a :class:`~utils.tiered_cache.TieredCache` whose disk tier is
+off unless a path is given.  Concurrent extractions of the same key are
+coalesced with :class:`~utils.singleflight.SingleFlight`; ``stats()``
+counts them as ``coalesced``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from typing import Any, Callable, Dict, Optional
+
+from utils.singleflight import SingleFlight
+from utils.tiered_cache import ProcessWide, TieredCache
+
+DEFAULT_MEMORY_BYTES = 128 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS extractions (
+    key BLOB PRIMARY KEY,
+    file_type TEXT NOT NULL,
+    text TEXT NOT NULL
+) WITHOUT ROWID
+"""
+
+
+def extraction_key(file_content, file_type: str) -> bytes:
+    """Return the cache key of ``file_content`` (bytes-like or ``mmap``) parsed as ``file_type``."""
+
+    digest = hashlib.sha256(file_type.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(file_content)
+    return digest.digest()
+
+
+class ExtractionCache(TieredCache):
+    """Two-tier (memory LRU, then optional SQLite) cache of extracted text.
+
+    ``path`` is the SQLite file; ``None`` keeps only the in-memory tier.
+    """
+
+    table = "extractions"
+    schema = _SCHEMA
+
+    def __init__(self, path: Optional[str] = None, max_memory_bytes: int = DEFAULT_MEMORY_BYTES) -> None:
+        super().__init__(path, max_memory_bytes)
+        self._flights = SingleFlight()
+
+    def get(self, key: bytes) -> Optional[str]:
+        """Return the text cached under ``key`` in either tier, or ``None``."""
+
+        with self._lock:
+            text = self._memory_get(key)
+            if text is None and self._conn is not None:
+                row = self._conn.execute("SELECT text FROM extractions WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    text = row[0]
+                    self._memory_put(key, text)
+                    self._counters["disk_hits"] += 1
+            return text
+
+    def get_or_extract(self, key: bytes, file_type: str, extract: Callable[[], str]) -> str:
+        """Return the text cached under ``key``, calling ``extract()`` at most once per key.
+
+        Errors raised by ``extract`` are not cached; callers waiting on the
+        same key receive the same exception.
+        """
+
+        text = self.get(key)
+        if text is not None:
+            return text
+        return self._flights.do_sync(key, lambda: self._extract(key, file_type, extract))
+
+    def _extract(self, key: bytes, file_type: str, extract: Callable[[], str]) -> str:
+        # 直前に別の呼び出しが抽出を終えていれば、その結果を使う
+        text = self.get(key)
+        if text is not None:
+            return text
+        with self._lock:
+            self._counters["misses"] += 1
+        text = extract()
+        with self._lock:
+            self._memory_put(key, text)
+            if self._conn is not None:
+                self._conn.execute("INSERT OR REPLACE INTO extractions VALUES (?, ?, ?)", (key, file_type, text))
+        return text
+
+    def _table_stats(self) -> Dict[str, Any]:
+        return {"coalesced": self._flights.stats()["coalesced"]}
+
+
+_cache = ProcessWide(
+    lambda: ExtractionCache(
+        os.getenv("EXTRACTION_CACHE_PATH") or None,
+        int(float(os.getenv("EXTRACTION_CACHE_MEMORY_MB", DEFAULT_MEMORY_BYTES / 2**20)) * 2**20),
+    )
+)
+
+
+def get_extraction_cache() -> ExtractionCache:
+    """Return the process-wide cache, creating it on first use.
+
+    ``EXTRACTION_CACHE_MEMORY_MB`` bounds the in-memory tier (default 128).
+    ``EXTRACTION_CACHE_PATH`` enables the disk tier at that SQLite file;
+    it is off by default.
+    """
+
+    return _cache.get()
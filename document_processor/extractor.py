@@ -1,69 +1,310 @@
 import io
 import logging
+import mmap
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from concurrent.futures.process import BrokenProcessPool
+from typing import NamedTuple, Optional
 
 """Utilities for extracting text from common document formats."""
 
 import pypdf
 
-# ``python-docx`` is an optional dependency.  Importing it at module load time
-# causes the whole package import to fail when the library is missing.  The
-# tests only require graceful handling when the dependency is absent, so the
-# import is performed defensively and ``None`` is used as a sentinel value.  The
-# actual function will raise a ``ValueError`` if DOCX support is unavailable.
-try:  # pragma: no cover - simple dependency check
-    import docx  # type: ignore
-except Exception:  # pragma: no cover - environment without python-docx
-    docx = None
+from document_processor.docx_reader import iter_docx_blocks
+from document_processor.extraction_cache import extraction_key, get_extraction_cache
 
 logger = logging.getLogger(__name__)
 
-def extract_text(file_content, file_type):
+# PDF のページ抽出を並列化する設定。既定は逐次抽出（1）で、並列化は明示的に有効にする
+# （ワーカーは spawn で起動するため、起動と再インポートのコストがかかる）
+PDF_WORKERS = max(1, int(os.getenv("PDF_EXTRACT_WORKERS", "1")))
+# ページ数が少ない場合はプロセス起動の方が高くつく
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "32"))
+# ワーカー1つあたりのページ範囲数（範囲ごとの処理時間のばらつきを均す）
+_RANGES_PER_WORKER = 4
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+class TextSegment(NamedTuple):
+    """A piece of extracted text and where it came from.
+
+    ``page`` is the 1-based PDF page; ``paragraph`` is the 0-based index of
+    a DOCX or plain-text paragraph.  The location that does not apply is
+    ``None``.
     """
-    Extracts text from a file based on its type.
+    text: str
+    page: Optional[int] = None
+    paragraph: Optional[int] = None
+
+DOCX_MIME_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+def iter_text(file_content, file_type):
+    """
+    Yields the text of a file as :class:`TextSegment` objects, in document order.
+
+    ``file_content`` may be the file's bytes, an ``mmap`` of it, or a
+    filesystem path.  Paths are memory-mapped rather than read, so a large
+    upload spooled to disk (see :mod:`document_processor.spool`) is never
+    copied into memory.
+
+    PDFs are yielded page by page and DOCX/TXT files paragraph by
+    paragraph, so downstream processing can start before the whole file
+    has been parsed.  Joining the segment texts gives :func:`extract_text`.
     """
     if file_type == 'application/pdf':
-        return extract_text_from_pdf(file_content)
-    elif file_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
-        return extract_text_from_docx(file_content)
+        return iter_text_from_pdf(file_content)
+    elif file_type == DOCX_MIME_TYPE:
+        return iter_text_from_docx(file_content)
     elif file_type == 'text/plain':
-        return extract_text_from_txt(file_content)
+        return iter_text_from_txt(file_content)
     else:
         raise ValueError(f"Unsupported file type: {file_type}")
 
-def extract_text_from_pdf(file_content):
+def extract_text(file_content, file_type, use_cache=True):
+    """
+    Extracts text from a file based on its type.
+
+    ``file_content`` is bytes, an ``mmap`` or a path, as for
+    :func:`iter_text`.  Results are cached by content hash and file type
+    (see :mod:`document_processor.extraction_cache`), so every caller that
+    extracts the same upload shares one parse.  ``use_cache=False`` always
+    parses.
+    """
+    def parse():
+        return "".join(segment.text for segment in iter_text(file_content, file_type))
+
+    if not use_cache:
+        return parse()
+    return get_extraction_cache().get_or_extract(_cache_key(file_content, file_type), file_type, parse)
+
+def _is_path(source):
+    return isinstance(source, (str, os.PathLike))
+
+@contextmanager
+def _mapped(path):
+    """Memory-maps the file at ``path`` read-only; an empty file yields ``b""``."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # 空ファイルは mmap できない
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+class _MappedStream(io.RawIOBase):
+    """Read-only file object over an ``mmap``, which lacks ``seekable()`` (needed by ``zipfile``)."""
+    def __init__(self, mapped):
+        self._mapped = mapped
+        mapped.seek(0)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        return self._mapped.read(None if size is None or size < 0 else size)
+
+    def readinto(self, buffer):
+        data = self._mapped.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._mapped.seek(offset, whence)
+        return self._mapped.tell()
+
+    def tell(self):
+        return self._mapped.tell()
+
+def _as_stream(data):
+    if isinstance(data, mmap.mmap):
+        return _MappedStream(data)
+    return io.BytesIO(data)
+
+@contextmanager
+def _open_source(source):
+    """Yields a seekable binary stream over ``source`` without copying a path or mmap into memory."""
+    if _is_path(source):
+        with _mapped(source) as data:
+            yield _as_stream(data)
+    else:
+        yield _as_stream(source)
+
+def _cache_key(source, file_type):
+    if _is_path(source):
+        with _mapped(source) as data:
+            return extraction_key(data, file_type)
+    return extraction_key(source, file_type)
+
+def _pdf_error(e):
+    logger.error("Failed to extract text from PDF: %s", e)
+    return ValueError("Failed to extract text from PDF")
+
+def iter_text_from_pdf(file_content, workers=None, min_pages=None):
+    """
+    Yields one :class:`TextSegment` per page of a PDF file.
+
+    Pages are extracted serially unless ``workers`` (default
+    ``PDF_EXTRACT_WORKERS``, which defaults to 1) is above 1.  Then
+    documents with at least ``min_pages`` pages (default
+    ``PDF_PARALLEL_MIN_PAGES``) are split into page ranges that are
+    extracted on the shared process pool.  Workers open the PDF from
+    its path, or from a temporary file when ``file_content`` is not a
+    path, instead of receiving a pickled copy of its bytes.  Pages are
+    yielded in order as soon as their range is done.
+    """
+    workers = workers or PDF_WORKERS
+    min_pages = PDF_PARALLEL_MIN_PAGES if min_pages is None else min_pages
+    with _open_source(file_content) as stream:
+        try:
+            pdf_reader = pypdf.PdfReader(stream)
+            num_pages = len(pdf_reader.pages)
+        except Exception as e:  # pragma: no cover - defensive
+            raise _pdf_error(e) from e
+
+        page = 0
+        if workers > 1 and num_pages >= max(min_pages, 2):
+            try:
+                for text in _iter_pdf_parallel(file_content, num_pages, workers):
+                    page += 1
+                    yield TextSegment(text, page=page)
+            except BrokenProcessPool as e:
+                # 残りのページは逐次処理で抽出する
+                logger.warning("PDF worker pool failed (%s); extracting serially", e)
+            except Exception as e:  # pragma: no cover - defensive
+                raise _pdf_error(e) from e
+
+        for index in range(page, num_pages):
+            try:
+                text = pdf_reader.pages[index].extract_text() or ""
+            except Exception as e:  # pragma: no cover - defensive
+                raise _pdf_error(e) from e
+            yield TextSegment(text, page=index + 1)
+
+def extract_text_from_pdf(file_content, workers=None, min_pages=None):
     """
     Extracts text from a PDF file.
+
+    Joins the pages of :func:`iter_text_from_pdf`, which may extract them
+    in parallel.
     """
-    text = ""
-    try:
-        pdf_reader = pypdf.PdfReader(io.BytesIO(file_content))
-        for page in pdf_reader.pages:
-            text += page.extract_text() or ""
-    except Exception as e:  # pragma: no cover - defensive
-        logger.error("Failed to extract text from PDF: %s", e)
-        raise ValueError("Failed to extract text from PDF") from e
-    return text
+    return "".join(segment.text for segment in iter_text_from_pdf(file_content, workers, min_pages))
 
-def extract_text_from_docx(file_content):
+def _page_ranges(num_pages, parts):
+    """Splits ``range(num_pages)`` into at most ``parts`` contiguous ``(start, stop)`` ranges."""
+    parts = max(1, min(parts, num_pages))
+    bounds = [num_pages * i // parts for i in range(parts + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def _extract_page_range(path, start, stop):
+    """Worker: extracts the text of pages ``start``..``stop - 1`` of the PDF at ``path``."""
+    pdf_reader = pypdf.PdfReader(path)
+    return [pdf_reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+def _get_pool(workers):
+    """Returns the shared process pool, replacing it only when more workers are requested.
+
+    Requests for fewer workers reuse the existing pool, so the processes are
+    spawned once per server process.
     """
-    Extracts text from a DOCX file.
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers < workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn: Streamlit のスレッドから fork するとロック状態を引き継ぐ恐れがあるため
+            _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+def _iter_pdf_parallel(file_content, num_pages, workers):
+    """Extracts all pages on the process pool and yields their texts in page order."""
+    if _is_path(file_content):
+        yield from _iter_page_ranges(os.path.abspath(file_content), num_pages, workers)
+        return
+    handle, path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(handle, "wb") as f:
+            f.write(file_content)
+        yield from _iter_page_ranges(path, num_pages, workers)
+    finally:
+        os.remove(path)
+
+def _iter_page_ranges(path, num_pages, workers):
+    pool = _get_pool(workers)
+    futures = [
+        pool.submit(_extract_page_range, path, start, stop)
+        for start, stop in _page_ranges(num_pages, workers * _RANGES_PER_WORKER)
+    ]
+    try:
+        for future in futures:
+            yield from future.result()
+    except BrokenProcessPool:
+        _reset_pool()
+        raise
+    except BaseException:
+        # 途中で中断された場合も、一時ファイルを消す前に実行中のワーカーの終了を待つ
+        # （Windows では開いたファイルを削除できない）
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        raise
+
+def iter_text_from_docx(file_content):
     """
-    if docx is None:  # pragma: no cover - simple runtime guard
-        raise ValueError("python-docx is required to process DOCX files")
+    Yields one :class:`TextSegment` per paragraph or table cell of a DOCX file.
 
-    text = ""
+    The XML parts are streamed from the zip archive (see
+    :mod:`document_processor.docx_reader`), so headers, footers, footnotes
+    and tables are included and memory use does not grow with the file.
+    """
     try:
-        doc = docx.Document(io.BytesIO(file_content))
-        for para in doc.paragraphs:
-            text += para.text + "\n"
+        with _open_source(file_content) as stream:
+            for index, block in enumerate(iter_docx_blocks(stream)):
+                yield TextSegment(block + "\n", paragraph=index)
     except Exception as e:  # pragma: no cover - defensive
         logger.error("Failed to extract text from DOCX: %s", e)
         raise ValueError("Failed to extract text from DOCX") from e
-    return text
+
+def extract_text_from_docx(file_content):
+    """
+    Extracts text from a DOCX file.
+    """
+    return "".join(segment.text for segment in iter_text_from_docx(file_content))
+
+def iter_text_from_txt(file_content):
+    """
+    Yields the paragraphs (blocks separated by a blank line) of a TXT file.
+    """
+    paragraphs = _read_text(file_content).split("\n\n")
+    for index, paragraph in enumerate(paragraphs):
+        # 区切りの空行も前の段落に含め、連結すると元のテキストに戻るようにする
+        yield TextSegment(paragraph if index == len(paragraphs) - 1 else paragraph + "\n\n", paragraph=index)
 
 def extract_text_from_txt(file_content):
     """
     Extracts text from a TXT file.
     """
-    return file_content.decode('utf-8')
+    return _read_text(file_content)
 
+def _read_text(file_content):
+    if _is_path(file_content):
+        # newline='' で改行コードをバイト列のデコード時と同じく変換しない
+        with open(file_content, encoding='utf-8', newline='') as f:
+            return f.read()
+    return str(file_content, 'utf-8')
@@ -0,0 +1,111 @@
+"""Spooling of uploaded files to a temporary directory.
+
+Streamlit keeps every upload in memory, and each ``getvalue()`` call makes
+another full copy of it.  :func:`spool_upload` writes an upload to disk
+once and returns its path.  Callers pass that path around instead of the
+bytes; the extractors memory-map it (see
+:func:`document_processor.extractor.iter_text`).
+
+Spooled files are named by the SHA-256 of their content, so the reruns of a
+page reuse the existing copy instead of writing it again.  Files that have
+not been spooled for ``UPLOAD_SPOOL_TTL`` seconds (default one day) are
+removed.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+import time
+from typing import Iterable, Optional
+
+DEFAULT_TTL = 24 * 60 * 60
+_CHUNK_SIZE = 1024 * 1024
+
+
+def spool_directory() -> str:
+    """Return the spool directory: ``UPLOAD_SPOOL_DIR`` or ``isop-uploads`` in the temp dir."""
+
+    return os.getenv("UPLOAD_SPOOL_DIR") or os.path.join(tempfile.gettempdir(), "isop-uploads")
+
+
+def _chunks(upload) -> Iterable[bytes]:
+    upload.seek(0)
+    while True:
+        chunk = upload.read(_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _write(directory: str, name: Optional[str], suffix: str, chunks: Iterable) -> str:
+    """Write ``chunks`` atomically into ``directory`` and return the file's path.
+
+    The file is named ``name + suffix``, or after the SHA-256 of the
+    written bytes when ``name`` is ``None``.
+    """
+
+    digest = hashlib.sha256()
+    handle, temp = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(handle, "wb") as f:
+            for chunk in chunks:
+                if name is None:
+                    digest.update(chunk)
+                f.write(chunk)
+        path = os.path.join(directory, (name or digest.hexdigest()) + suffix)
+        os.replace(temp, path)
+    except BaseException:
+        os.remove(temp)
+        raise
+    return path
+
+
+def prune_spool(directory: Optional[str] = None, ttl: Optional[float] = None) -> int:
+    """Remove spooled files older than ``ttl`` seconds and return how many were removed."""
+
+    directory = directory or spool_directory()
+    ttl = float(os.getenv("UPLOAD_SPOOL_TTL", DEFAULT_TTL)) if ttl is None else ttl
+    cutoff = time.time() - ttl
+    removed = 0
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except OSError:
+            # 他プロセスが使用中（Windows）または既に削除済み
+            continue
+    return removed
+
+
+def spool_upload(upload, directory: Optional[str] = None) -> str:
+    """Write ``upload`` to the spool directory once and return the path of the copy.
+
+    ``upload`` is a binary file object (such as Streamlit's
+    ``UploadedFile``) or a bytes-like object.  The extension of its
+    ``name`` attribute, if any, is kept.
+    """
+
+    directory = directory or spool_directory()
+    os.makedirs(directory, exist_ok=True)
+    suffix = os.path.splitext(getattr(upload, "name", None) or "")[1].lower()
+
+    if hasattr(upload, "getbuffer") or not hasattr(upload, "read"):
+        # BytesIO 系はバッファを直接参照し、既に書き出し済みなら書き込みを省く
+        with (upload.getbuffer() if hasattr(upload, "getbuffer") else memoryview(upload)) as buffer:
+            name = hashlib.sha256(buffer).hexdigest()
+            path = os.path.join(directory, name + suffix)
+            if not os.path.exists(path):
+                path = _write(directory, name, suffix, [buffer])
+    else:
+        path = _write(directory, None, suffix, _chunks(upload))
+
+    os.utime(path)  # 保持期間は最後に書き出した時刻から数える
+    prune_spool(directory)
+    return path
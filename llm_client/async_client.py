@@ -0,0 +1,210 @@
+"""Lazily created, shared ``AsyncOpenAI`` clients and the loop behind the sync API.
+
+Nothing is loaded or connected at import time: the first request resolves
+the API key (``OPENAI_API_KEY``, falling back to ``.env`` through
+:func:`utils.helpers.load_env_variables`) and builds the client.  Completion
+and embedding requests share the same client.
+
+An ``AsyncOpenAI`` client keeps a pool of keep-alive HTTP connections, so
+one client can carry dozens of concurrent requests over a handful of
+sockets.  Its connections belong to the event loop that opened them, which
+is why :func:`get_async_client` keeps one client per running loop.  The
+client is rebuilt when its configuration changes, so a key entered on the
+settings page takes effect on the next request without a restart.
+
+Configuration comes from the environment and can be overridden with
+:func:`configure_clients`:
+
+``OPENAI_API_KEY``       API key
+``OPENAI_BASE_URL``      alternative endpoint (proxy, Azure-compatible gateway)
+``LLM_TIMEOUT``          request timeout in seconds (default 60)
+``LLM_MAX_CONNECTIONS``  connection pool size per client (default 64)
+
+The blocking functions of :mod:`llm_client` run their coroutines with
+:func:`run_sync` (async generators with :func:`iterate_sync`) on one
+long-lived background loop, so every synchronous
+caller, from any thread, shares that loop's connection pool.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import queue
+import threading
+import weakref
+from typing import Any, Dict, NamedTuple, Optional
+
+KEEPALIVE_SECONDS = 30.0
+
+_overrides: Dict[str, Any] = {}
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple]" = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+class ClientConfig(NamedTuple):
+    api_key: str
+    base_url: Optional[str]
+    timeout: float
+    max_connections: int
+
+
+def configure_clients(**settings) -> None:
+    """Override ``api_key``, ``base_url``, ``timeout`` or ``max_connections``.
+
+    Passing ``None`` for a setting falls back to the environment again.
+    Clients pick up the change on their next request.
+    """
+
+    unknown = set(settings) - set(ClientConfig._fields)
+    if unknown:
+        raise TypeError(f"Unknown client settings: {', '.join(sorted(unknown))}")
+    with _clients_lock:
+        for name, value in settings.items():
+            if value is None:
+                _overrides.pop(name, None)
+            else:
+                _overrides[name] = value
+
+
+def _api_key() -> str:
+    key = os.getenv("OPENAI_API_KEY")
+    if key:
+        return key
+    from utils.helpers import load_env_variables
+
+    return load_env_variables()["OPENAI_API_KEY"]
+
+
+def client_config() -> ClientConfig:
+    """Return the configuration a client created now would use."""
+
+    return ClientConfig(
+        api_key=_overrides.get("api_key") or _api_key(),
+        base_url=_overrides.get("base_url", os.getenv("OPENAI_BASE_URL") or None),
+        timeout=float(_overrides.get("timeout", os.getenv("LLM_TIMEOUT", "60"))),
+        max_connections=int(_overrides.get("max_connections", os.getenv("LLM_MAX_CONNECTIONS", "64"))),
+    )
+
+
+def _http_client(config: ClientConfig):
+    """Return a pooled HTTP client for ``AsyncOpenAI``, or ``None`` for its default."""
+
+    try:
+        import httpx
+        from openai import DefaultAsyncHttpxClient
+    except ImportError:
+        return None
+    return DefaultAsyncHttpxClient(
+        timeout=config.timeout,
+        limits=httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_connections,
+            keepalive_expiry=KEEPALIVE_SECONDS,
+        ),
+    )
+
+
+def _create_client(config: ClientConfig):
+    from openai import AsyncOpenAI
+
+    # Retries are left to llm_client.governor, which also adapts concurrency.
+    kwargs = {"api_key": config.api_key, "timeout": config.timeout, "max_retries": 0}
+    if config.base_url:
+        kwargs["base_url"] = config.base_url
+    http_client = _http_client(config)
+    if http_client is not None:
+        kwargs["http_client"] = http_client
+    return AsyncOpenAI(**kwargs)
+
+
+def get_async_client():
+    """Return the ``AsyncOpenAI`` client for the running event loop.
+
+    Raises :class:`ValueError` when no API key is configured.
+    """
+
+    loop = asyncio.get_running_loop()
+    config = client_config()
+    with _clients_lock:
+        cached = _clients.get(loop)
+        if cached is not None and cached[0] == config:
+            return cached[1]
+        client = _create_client(config)
+        _clients[loop] = (config, client)
+    if cached is not None and hasattr(cached[1], "close"):
+        # The configuration changed; release the old client's connections.
+        loop.create_task(cached[1].close())
+    return client
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-client-loop", daemon=True).start()
+        return _loop
+
+
+def run_sync(coroutine):
+    """Run ``coroutine`` on the shared background loop and return its result.
+
+    Safe to call from any thread, including one that runs its own event
+    loop (that loop is blocked until the result arrives).
+    """
+
+    loop = _background_loop()
+    if _on_loop(loop):
+        coroutine.close()
+        raise RuntimeError("run_sync() cannot be called from the llm_client background loop; await the coroutine")
+    return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+
+def _on_loop(loop: asyncio.AbstractEventLoop) -> bool:
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
+
+
+def iterate_sync(iterable):
+    """Iterate over the async iterable ``iterable`` from synchronous code.
+
+    The iterable is consumed on the shared background loop and its items
+    are handed over through a queue as soon as they are produced.  Closing
+    the generator early cancels the consumer on the loop.
+    """
+
+    loop = _background_loop()
+    if _on_loop(loop):
+        raise RuntimeError("iterate_sync() cannot be called from the llm_client background loop; use async for")
+    items: "queue.Queue[tuple]" = queue.Queue()
+
+    async def pump():
+        try:
+            async for item in iterable:
+                items.put((True, item))
+        except Exception as e:
+            items.put((False, e))
+        else:
+            items.put((False, None))
+        finally:
+            aclose = getattr(iterable, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    future = asyncio.run_coroutine_threadsafe(pump(), loop)
+    try:
+        while True:
+            ok, value = items.get()
+            if ok:
+                yield value
+            elif value is None:
+                return
+            else:
+                raise value
+    finally:
+        future.cancel()
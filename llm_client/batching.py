@@ -0,0 +1,194 @@
+"""Splitting embedding inputs into API-sized requests and dispatching them.
+
+The embeddings endpoint limits both the number of inputs per request and
+the total tokens per request, and the account is limited in tokens per
+minute.  :func:`pack_requests` groups texts into consecutive slices that
+respect the per-request limits, :class:`TokenRateLimiter` paces requests to
+the per-minute budget and :func:`adispatch` sends the slices with bounded
+concurrency, retrying only the slices that failed and reassembling the
+results in input order.
+
+Tokens are counted with ``tiktoken`` when it is installed and its encoding
+can be loaded.  Otherwise the UTF-8 byte length is used, which never
+undercounts because every BPE token covers at least one byte.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from functools import lru_cache
+from typing import Awaitable, Callable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Limits of the OpenAI embeddings endpoint.
+MAX_INPUTS_PER_REQUEST = 2048
+MAX_TOKENS_PER_REQUEST = 300_000
+MAX_TOKENS_PER_INPUT = 8191
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:  # pragma: no cover - tiktoken is in requirements.txt
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:  # e.g. the encoding file cannot be downloaded
+        logger.warning("tiktoken encoding unavailable, estimating tokens from UTF-8 length: %s", e)
+        return None
+
+
+def count_tokens(texts: Sequence[str], model: str) -> List[int]:
+    """Return the number of tokens of each text for ``model``."""
+
+    encoding = _encoding(model)
+    if encoding is None:
+        return [len(text.encode("utf-8")) for text in texts]
+    return [len(tokens) for tokens in encoding.encode_ordinary_batch(list(texts))]
+
+
+def truncate_to_tokens(text: str, model: str, max_tokens: int = MAX_TOKENS_PER_INPUT) -> str:
+    """Cut ``text`` down to at most ``max_tokens`` tokens."""
+
+    encoding = _encoding(model)
+    if encoding is None:
+        return text.encode("utf-8")[:max_tokens].decode("utf-8", errors="ignore")
+    return encoding.decode(encoding.encode_ordinary(text)[:max_tokens])
+
+
+def pack_requests(
+    token_counts: Sequence[int],
+    max_inputs: int = MAX_INPUTS_PER_REQUEST,
+    max_tokens: int = MAX_TOKENS_PER_REQUEST,
+) -> List[Tuple[int, int]]:
+    """Group consecutive inputs into ``(start, stop)`` slices within both limits.
+
+    An input larger than ``max_tokens`` on its own gets a slice to itself.
+    """
+
+    slices = []
+    start, tokens = 0, 0
+    for position, count in enumerate(token_counts):
+        if position > start and (position - start >= max_inputs or tokens + count > max_tokens):
+            slices.append((start, position))
+            start, tokens = position, 0
+        tokens += count
+    if start < len(token_counts):
+        slices.append((start, len(token_counts)))
+    return slices
+
+
+class TokenRateLimiter:
+    """Token bucket allowing ``tokens_per_minute`` tokens per rolling minute.
+
+    The bucket starts full, so short bursts go out immediately; once it is
+    empty callers wait for it to refill at ``tokens_per_minute / 60`` per
+    second.  Requests larger than the whole budget wait for a full bucket.
+    """
+
+    def __init__(
+        self,
+        tokens_per_minute: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.tokens_per_minute = tokens_per_minute
+        self._clock = clock
+        self._sleep = sleep
+        self._available = float(tokens_per_minute)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._available = min(
+            self.tokens_per_minute, self._available + (now - self._updated) * self.tokens_per_minute / 60.0
+        )
+        self._updated = now
+
+    def _take(self, tokens: float) -> float:
+        """Spend ``tokens`` and return 0, or return the seconds until they are available."""
+
+        with self._lock:
+            self._refill()
+            if self._available >= tokens:
+                self._available -= tokens
+                return 0.0
+            return (tokens - self._available) * 60.0 / self.tokens_per_minute
+
+    def acquire(self, tokens: int) -> float:
+        """Block until ``tokens`` may be spent; return the seconds waited."""
+
+        tokens = min(tokens, self.tokens_per_minute)
+        waited = 0.0
+        while True:
+            delay = self._take(tokens)
+            if not delay:
+                return waited
+            self._sleep(delay)
+            waited += delay
+
+    async def aacquire(self, tokens: int) -> float:
+        """Like :meth:`acquire`, but waits with ``asyncio.sleep``."""
+
+        tokens = min(tokens, self.tokens_per_minute)
+        waited = 0.0
+        while True:
+            delay = self._take(tokens)
+            if not delay:
+                return waited
+            await asyncio.sleep(delay)
+            waited += delay
+
+
+async def adispatch(
+    slices: Sequence[Tuple[int, int]],
+    send: Callable[[int, int], Awaitable[list]],
+    token_counts: Sequence[int],
+    limiter: Optional[TokenRateLimiter] = None,
+    max_concurrency: int = 16,
+    max_retries: int = 2,
+    backoff: float = 1.0,
+) -> Union[list, np.ndarray]:
+    """Await ``send(start, stop)`` for every slice and concatenate the results in order.
+
+    NumPy results are joined into one array, other sequences into a list.
+    At most ``max_concurrency`` slices are in flight at once.  A slice that
+    raises is retried on its own up to ``max_retries`` times with
+    exponential backoff; its last error is raised once they are exhausted.
+    """
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(piece):
+        start, stop = piece
+        tokens = sum(token_counts[start:stop])
+        for attempt in range(max_retries + 1):
+            if limiter is not None:
+                await limiter.aacquire(tokens)
+            try:
+                async with semaphore:
+                    result = await send(start, stop)
+                if len(result) != stop - start:
+                    raise ValueError(f"Expected {stop - start} results, got {len(result)}")
+                return result
+            except Exception as e:
+                if attempt == max_retries:
+                    raise
+                logger.warning("Request for inputs %d-%d failed (%s); retrying", start, stop, e)
+                await asyncio.sleep(backoff * 2**attempt)
+
+    parts = await asyncio.gather(*(run(piece) for piece in slices))
+    if parts and all(isinstance(part, np.ndarray) for part in parts):
+        return np.concatenate(parts)
+    return [item for part in parts for item in part]
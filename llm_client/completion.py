@@ -1,30 +1,160 @@
-from openai import OpenAI
-from utils.helpers import load_env_variables
 from utils.logger import get_logger
+from llm_client.async_client import get_async_client, iterate_sync, run_sync
+from llm_client.batching import count_tokens
+from llm_client.completion_cache import completion_key, get_completion_cache
+from llm_client.governor import get_governor
+from utils.singleflight import coalesce
 
 # AGENT.md 4.2.2 APIキー管理
-# ヘルパー関数からAPIキーを取得する
-env_vars = load_env_variables()
-api_key = env_vars["OPENAI_API_KEY"]
-client = OpenAI(api_key=api_key)
+# APIキーは最初のリクエスト時に llm_client.async_client が読み込む
 logger = get_logger(__name__)
 
-def get_completion(prompt, model="gpt-4.1-mini"):
+TEMPERATURE = 0.7  # 創造性と正確性のバランス
+MAX_TOKENS = 2048 # 最大出力トークン数
+
+class CompletionError(RuntimeError):
+    """Raised by :func:`astream_completion` when the completion cannot be (fully) produced."""
+
+def _request_options(prompt, model):
+    return {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": TEMPERATURE,
+        "max_tokens": MAX_TOKENS,
+    }
+
+def _cache_key(prompt, model, cache_version):
+    return completion_key(model, prompt, TEMPERATURE, MAX_TOKENS, cache_version)
+
+def _tokens_used(usage, prompt, text, model):
+    # usage が無い場合（ストリーミングの一部実装など）は推定値を使う
+    total = getattr(usage, "total_tokens", None)
+    if isinstance(total, int):
+        return total
+    return sum(count_tokens([prompt, text], model))
+
+async def aget_completion(prompt, model="gpt-4.1-mini", use_cache=True, regenerate=False, cache_version=""):
     """
-    Sends a prompt to the specified GPT model and returns the completion.
+    Asynchronously sends a prompt to the specified GPT model and returns the completion.
+
+    Requests share a pooled ``AsyncOpenAI`` client, so many can be in flight
+    at once (e.g. with ``asyncio.gather``); :mod:`llm_client.governor`
+    bounds their concurrency and retries transient failures.
+
+    Successful completions are stored in the completion cache (see
+    :mod:`llm_client.completion_cache`) and an identical request is then
+    answered from it.  ``cache_version`` identifies the prompt template;
+    ``regenerate`` skips the lookup and replaces the cached text, and
+    ``use_cache=False`` bypasses the cache entirely.  Identical requests
+    in flight at the same time are sent once (see
+    :mod:`utils.singleflight`).
     """
     if not prompt:
         return ""
 
-    try:
-        messages = [{"role": "user", "content": prompt}]
-        response = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=0.7,  # 創造性と正確性のバランス
-            max_tokens=2048, # 最大出力トークン数
+    key = _cache_key(prompt, model, cache_version)
+    if use_cache and not regenerate:
+        cached = get_completion_cache().get(key)
+        if cached is not None:
+            return cached
+
+    async def complete():
+        # 429 や一時的な障害は governor がバックオフ付きでリトライする
+        response = await get_governor("completions").call(
+            lambda: get_async_client().chat.completions.create(**_request_options(prompt, model))
         )
-        return response.choices[0].message.content
+        content = response.choices[0].message.content
+        if use_cache and content:
+            get_completion_cache().put(key, model, content, _tokens_used(getattr(response, "usage", None), prompt, content, model))
+        return content
+
+    try:
+        # 同じリクエストが同時に実行中なら、その結果を共有する
+        return await coalesce(("completions", key, use_cache), complete)
     except Exception as e:
         logger.error("An error occurred while calling the OpenAI API: %s", e, exc_info=True)
         return f"Error: AIモデルの呼び出し中にエラーが発生しました。 {e}"
+
+def get_completion(prompt, model="gpt-4.1-mini", use_cache=True, regenerate=False, cache_version=""):
+    """
+    Sends a prompt to the specified GPT model and returns the completion.
+
+    Blocking wrapper around :func:`aget_completion`.
+    """
+    if not prompt:
+        return ""
+    return run_sync(
+        aget_completion(prompt, model=model, use_cache=use_cache, regenerate=regenerate, cache_version=cache_version)
+    )
+
+async def astream_completion(prompt, model="gpt-4.1-mini", use_cache=True, regenerate=False, cache_version=""):
+    """
+    Asynchronously streams the completion of ``prompt``, yielding text as it arrives.
+
+    Opening the stream goes through the completions governor, so failures
+    before the first token are retried.  Any remaining failure, including
+    one after some pieces were yielded, raises :class:`CompletionError`;
+    the pieces already received are then an incomplete text and must be
+    discarded.  The response stream is closed however iteration ends,
+    including when the caller stops early.
+
+    A cached completion is yielded as a single piece; a stream that ends
+    without error is cached.  The cache options are those of
+    :func:`aget_completion`.
+    """
+    if not prompt:
+        return
+
+    key = _cache_key(prompt, model, cache_version) if use_cache else None
+    if key is not None and not regenerate:
+        cached = get_completion_cache().get(key)
+        if cached is not None:
+            yield cached
+            return
+
+    pieces = []
+    usage = None
+    try:
+        stream = await get_governor("completions").call(
+            lambda: get_async_client().chat.completions.create(
+                **_request_options(prompt, model), stream=True, stream_options={"include_usage": True}
+            )
+        )
+        try:
+            async for chunk in stream:
+                usage = getattr(chunk, "usage", None) or usage
+                # 最後のチャンクなど choices や content が空の場合がある
+                if chunk.choices and chunk.choices[0].delta.content:
+                    pieces.append(chunk.choices[0].delta.content)
+                    yield pieces[-1]
+        finally:
+            # 途中で打ち切られた・キャンセルされた場合も HTTP 接続をプールに返す
+            await stream.close()
+    except Exception as e:
+        logger.error("An error occurred while streaming from the OpenAI API: %s", e, exc_info=True)
+        # 途中までの出力を完成した文書と取り違えないよう、エラーは例外で知らせる
+        raise CompletionError(f"AIモデルの呼び出し中にエラーが発生しました。 {e}") from e
+
+    if key is not None and pieces:
+        content = "".join(pieces)
+        get_completion_cache().put(key, model, content, _tokens_used(usage, prompt, content, model))
+
+def stream_completion(prompt, model="gpt-4.1-mini", use_cache=True, regenerate=False, cache_version=""):
+    """
+    Streams the completion of ``prompt``, yielding text pieces as they arrive.
+
+    Blocking generator over :func:`astream_completion`; join the pieces
+    with ``"".join`` to obtain the full text.  Raises
+    :class:`CompletionError` if the completion fails.
+    """
+    if not prompt:
+        return
+    yield from iterate_sync(
+        astream_completion(
+            prompt, model=model, use_cache=use_cache, regenerate=regenerate, cache_version=cache_version
+        )
+    )
+
+def get_completion_cache_stats():
+    """Return completion cache hits, misses, evictions and tokens saved."""
+    return get_completion_cache().stats()
@@ -0,0 +1,142 @@
+"""Disk cache for chat completions.
+
+A completion is keyed by ``sha256`` of the model, sampling parameters,
+prompt and a caller-supplied prompt-template version, so re-running the
+same rewrite (page reruns, repeated batch runs) returns the stored text
+instead of paying for another multi-minute completion.  Bumping the
+template version invalidates every entry produced by the old template.
+
+Entries live in the SQLite table of a :class:`~utils.tiered_cache.TieredCache`
+(without a memory tier), which is kept in memory unless a disk tier is
+configured, and are dropped when older than ``ttl`` seconds or,
+least recently used first, when the texts exceed ``max_bytes``.
+``stats()`` also reports expirations, evictions and the tokens the hits
+saved.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+
+from utils.tiered_cache import ProcessWide, TieredCache, disk_cache_path
+
+CACHE_FILENAME = "completions.sqlite3"
+DEFAULT_TTL = 7 * 24 * 3600.0
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS completions (
+    key BLOB PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    tokens INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+
+def completion_key(model: str, prompt: str, temperature: float, max_tokens: int, version: str = "") -> bytes:
+    """Return the cache key of a completion request."""
+
+    payload = json.dumps([model, temperature, max_tokens, version, prompt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).digest()
+
+
+class CompletionCache(TieredCache):
+    """SQLite-backed completion cache with TTL and size-based LRU eviction.
+
+    ``path`` is the SQLite file; ``None`` keeps the cache in memory.
+    """
+
+    table = "completions"
+    schema = _SCHEMA
+    memory_database = True
+    counters = ("hits", "misses", "expired", "evictions", "tokens_saved")
+    hit_counters = ("hits",)
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl: float = DEFAULT_TTL,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        super().__init__(path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+    def get(self, key: bytes) -> Optional[str]:
+        """Return the cached response for ``key``, or ``None``."""
+
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, tokens, created FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[2] > self.ttl:
+                self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self._counters["expired"] += 1
+                row = None
+            if row is None:
+                self._counters["misses"] += 1
+                return None
+            self._conn.execute("UPDATE completions SET last_used = ? WHERE key = ?", (now, key))
+            self._counters["hits"] += 1
+            self._counters["tokens_saved"] += row[1]
+            return row[0]
+
+    def put(self, key: bytes, model: str, response: str, tokens: int = 0) -> None:
+        """Store ``response`` (which cost ``tokens`` tokens) and enforce the limits."""
+
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, response, tokens, size, now, now),
+            )
+            self._conn.execute("DELETE FROM completions WHERE created < ?", (now - self.ttl,))
+            self._evict()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM completions ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            victims.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM completions WHERE key = ?", victims)
+        self._counters["evictions"] += len(victims)
+
+    def _table_stats(self) -> Dict[str, Any]:
+        entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions").fetchone()
+        return {"entries": entries, "bytes": size}
+
+
+_cache = ProcessWide(
+    lambda: CompletionCache(
+        disk_cache_path("COMPLETION_CACHE_PATH", CACHE_FILENAME),
+        float(os.getenv("COMPLETION_CACHE_TTL", DEFAULT_TTL)),
+        int(float(os.getenv("COMPLETION_CACHE_MAX_MB", DEFAULT_MAX_BYTES / 2**20)) * 2**20),
+    )
+)
+
+
+def get_completion_cache() -> CompletionCache:
+    """Return the process-wide cache, opening it on first use.
+
+    The cache is kept in memory by default.  ``LLM_CACHE_DIR`` stores it
+    in ``completions.sqlite3`` in that directory, and
+    ``COMPLETION_CACHE_PATH`` names the SQLite file directly (an empty
+    string keeps it in memory).  ``COMPLETION_CACHE_TTL`` sets the
+    lifetime in seconds (default 7 days) and ``COMPLETION_CACHE_MAX_MB``
+    the size bound.
+    """
+
+    return _cache.get()
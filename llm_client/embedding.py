@@ -1,28 +1,206 @@
-from openai import OpenAI
-from utils.helpers import load_env_variables
+import base64
+import os
+
+import numpy as np
+
 from utils.logger import get_logger
+from llm_client.async_client import get_async_client, run_sync
+from llm_client.batching import (
+    MAX_TOKENS_PER_INPUT,
+    TokenRateLimiter,
+    adispatch,
+    count_tokens,
+    pack_requests,
+    truncate_to_tokens,
+)
+from llm_client.embedding_cache import alookup_embeddings, get_embedding_cache
+from llm_client.governor import get_governor
+from llm_client.local_embedding import DEFAULT_DIMENSIONS, hashed_ngram_embeddings
+from utils.singleflight import coalesce
 
 # AGENT.md 4.2.2 APIキー管理
-# ヘルパー関数からAPIキーを取得する
-env_vars = load_env_variables()
-api_key = env_vars["OPENAI_API_KEY"]
-client = OpenAI(api_key=api_key)
+# APIキーは最初のリクエスト時に llm_client.async_client が読み込む
 logger = get_logger(__name__)
 
-def generate_embeddings(text_chunks, model="text-embedding-3-small"):
+# 同時リクエスト数の上限とレート制限（tokens per minute）
+# 実際の並列度とリトライは llm_client.governor が調整する
+MAX_WORKERS = int(os.getenv("EMBEDDING_MAX_WORKERS", "32"))
+rate_limiter = TokenRateLimiter(float(os.getenv("EMBEDDING_TPM", "1000000")))
+
+# 次元削減（text-embedding-3 系のみ）。未設定ならモデルの既定次元
+DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "0")) or None
+
+def _decode_embeddings(data):
     """
-    Generates vector embeddings for a list of text chunks using OpenAI's API.
+    Returns the vectors of an embeddings response as an ``(n, d)`` float32 array.
+
+    Base64 payloads are little-endian float32 and are decoded with
+    ``np.frombuffer`` without creating a Python float per component.
+    """
+    vectors = [item.embedding for item in data]
+    if vectors and isinstance(vectors[0], str):
+        raw = bytearray().join(base64.b64decode(vector) for vector in vectors)
+        block = np.frombuffer(raw, dtype="<f4").astype(np.float32, copy=False)
+    else:
+        block = np.asarray(vectors, dtype=np.float32)
+    return block.reshape(len(vectors), -1)
+
+async def _send_embedding_request(text_chunks, model, dimensions=None):
+    # OpenAIのAPIはリスト形式でテキストを受け取る
+    # base64 形式で受け取り、JSON の浮動小数点配列のパースを避ける
+    options = {"encoding_format": "base64"}
+    if dimensions:
+        options["dimensions"] = dimensions
+    response = await get_governor("embeddings").call(
+        lambda: get_async_client().embeddings.create(input=text_chunks, model=model, **options)
+    )
+    # 埋め込みデータを抽出して返す
+    return _decode_embeddings(response.data)
+
+async def _request_embeddings(text_chunks, model, dimensions=None):
+    """
+    Embeds ``text_chunks`` in as many requests as the API limits require.
+
+    Requests are packed by input count and token count, sent concurrently
+    under the tokens-per-minute limit (retried by the embeddings governor)
+    and reassembled in input order into
+    one ``(n, d)`` float32 array.
+    """
+    text_chunks = list(text_chunks)
+    token_counts = count_tokens(text_chunks, model)
+    for i, tokens in enumerate(token_counts):
+        if tokens > MAX_TOKENS_PER_INPUT:
+            logger.warning("Chunk %d has %d tokens; truncating to %d.", i, tokens, MAX_TOKENS_PER_INPUT)
+            text_chunks[i] = truncate_to_tokens(text_chunks[i], model)
+            token_counts[i] = MAX_TOKENS_PER_INPUT
+
+    return await adispatch(
+        pack_requests(token_counts),
+        lambda start, stop: _send_embedding_request(text_chunks[start:stop], model, dimensions),
+        token_counts,
+        limiter=rate_limiter,
+        max_concurrency=MAX_WORKERS,
+        max_retries=0,
+    )
+
+class EmbeddingBackend:
+    """
+    Source of embedding vectors used by :func:`agenerate_embeddings`.
+
+    Subclasses implement :meth:`embed`.  ``cacheable`` says whether results
+    are worth storing in the embedding cache.
+    """
+    name = ""
+    cacheable = True
+
+    async def embed(self, texts, model, dimensions):
+        """Returns an ``(n, d)`` float32 array for ``texts`` in order."""
+        raise NotImplementedError
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """The OpenAI embeddings API (default)."""
+    name = "openai"
+
+    async def embed(self, texts, model, dimensions):
+        return await _request_embeddings(texts, model, dimensions)
+
+class LocalEmbeddingBackend(EmbeddingBackend):
+    """
+    Offline hashed character n-gram vectors for tests and benchmarks.
+
+    ``model`` is ignored.  Computing a vector is cheaper than a cache
+    lookup, so results are not cached.
     """
-    if not text_chunks:
-        return []
+    name = "local"
+    cacheable = False
+
+    async def embed(self, texts, model, dimensions):
+        return hashed_ngram_embeddings(texts, dimensions or DEFAULT_DIMENSIONS)
+
+EMBEDDING_BACKENDS = {backend.name: backend for backend in (OpenAIEmbeddingBackend, LocalEmbeddingBackend)}
+
+def get_embedding_backend(name=None):
+    """
+    Returns the backend called ``name``, by default ``EMBEDDING_BACKEND``
+    (``openai`` unless set; ``local`` works offline).
+    """
+    name = (name or os.getenv("EMBEDDING_BACKEND") or "openai").lower()
+    try:
+        return EMBEDDING_BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unsupported embedding backend: {name}") from None
+
+def _empty(as_array, dimensions):
+    return np.empty((0, dimensions or 0), dtype=np.float32) if as_array else []
+
+async def agenerate_embeddings(
+    text_chunks, model="text-embedding-3-small", use_cache=True, as_array=False, dimensions=None, backend=None
+):
+    """
+    Asynchronously generates vector embeddings for a list of text chunks.
+
+    With ``use_cache`` only the chunks missing from the embedding cache (see
+    :mod:`llm_client.embedding_cache`) are sent to the API; results are
+    returned in the order of ``text_chunks``.  Large inputs are split into
+    several requests (see :mod:`llm_client.batching`).
+
+    The result is a list of lists of floats, or with ``as_array`` a
+    contiguous ``(n, d)`` float32 array that the vector store accepts as is.
+    On failure it is empty.  ``dimensions`` requests shortened vectors
+    (default ``EMBEDDING_DIMENSIONS``); they are cached separately.
+
+    ``backend`` is an :class:`EmbeddingBackend` or the name of one; the
+    default is chosen by ``EMBEDDING_BACKEND``.  Identical requests in
+    flight at the same time are sent once (see :mod:`utils.singleflight`).
+    """
+    dimensions = dimensions or DIMENSIONS
+    if not len(text_chunks):
+        return _empty(as_array, dimensions)
+    if not isinstance(backend, EmbeddingBackend):
+        backend = get_embedding_backend(backend)
+
+    def embed(texts):
+        # 同じ入力の同時リクエスト（複数セッション・重複ファイル）は1回にまとめる
+        key = ("embeddings", backend.name, model, dimensions, tuple(texts))
+        return coalesce(key, lambda: backend.embed(texts, model, dimensions))
 
     try:
-        # OpenAIのAPIはリスト形式でテキストを受け取る
-        response = client.embeddings.create(input=text_chunks, model=model)
-        # 埋め込みデータを抽出して返す
-        return [embedding.embedding for embedding in response.data]
+        if not (use_cache and backend.cacheable):
+            block = await embed(list(text_chunks))
+            return block if as_array else block.tolist()
+        cache_model = f"{model}@{dimensions}" if dimensions else model
+        return await alookup_embeddings(cache_model, text_chunks, embed, as_array=as_array)
     except Exception as e:
         logger.error(
             "An error occurred while generating embeddings: %s", e, exc_info=True
         )
-        return []
+        return _empty(as_array, dimensions)
+
+def generate_embeddings(
+    text_chunks, model="text-embedding-3-small", use_cache=True, as_array=False, dimensions=None, backend=None
+):
+    """
+    Generates vector embeddings for a list of text chunks using OpenAI's API.
+
+    Blocking wrapper around :func:`agenerate_embeddings`.
+    """
+    if not len(text_chunks):
+        return _empty(as_array, dimensions or DIMENSIONS)
+    return run_sync(
+        agenerate_embeddings(
+            text_chunks,
+            model=model,
+            use_cache=use_cache,
+            as_array=as_array,
+            dimensions=dimensions,
+            backend=backend,
+        )
+    )
+
+def get_embedding_cache_stats():
+    """Return the embedding cache hit/miss counters."""
+    return get_embedding_cache().stats()
+
+def get_embedding_call_stats():
+    """Return concurrency, queue depth and retry counters of embedding requests."""
+    return get_governor("embeddings").stats()
@@ -0,0 +1,174 @@
+"""Content-addressed cache for embedding vectors.
+
+Embeddings are keyed by ``sha256(model + normalised text)``, so re-uploading
+a document, re-running a batch or storing boilerplate paragraphs shared by
+several documents only pays for the text the cache has never seen.
+
+The cache is a :class:`~utils.tiered_cache.TieredCache`: recently used
+vectors stay in memory and, when a disk tier is configured, every vector is
+written to a SQLite file that survives restarts.  Vectors are stored as
+float32 blobs.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import unicodedata
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from utils.tiered_cache import ProcessWide, TieredCache, disk_cache_path
+
+CACHE_FILENAME = "embeddings.sqlite3"
+
+# Vectors kept in the in-memory tier; about 10k text-embedding-3-small vectors.
+DEFAULT_MEMORY_BYTES = 64 * 1024 * 1024
+
+# Keys looked up per ``SELECT ... IN`` statement.
+_LOOKUP_BATCH = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key BLOB PRIMARY KEY,
+    model TEXT NOT NULL,
+    vector BLOB NOT NULL
+) WITHOUT ROWID
+"""
+
+
+def normalize_text(text: str) -> str:
+    """NFKC-normalise ``text`` and collapse runs of whitespace."""
+
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def cache_key(model: str, text: str) -> bytes:
+    """Return the cache key of ``text`` embedded with ``model``."""
+
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).digest()
+
+
+class EmbeddingCache(TieredCache):
+    """Two-tier (memory LRU, then optional SQLite) embedding cache.
+
+    ``path`` is the SQLite file; ``None`` keeps only the in-memory tier.
+    """
+
+    table = "embeddings"
+    schema = _SCHEMA
+
+    def __init__(self, path: Optional[str] = None, max_memory_bytes: int = DEFAULT_MEMORY_BYTES) -> None:
+        super().__init__(path, max_memory_bytes)
+
+    @staticmethod
+    def sizeof(vector: np.ndarray) -> int:
+        return vector.nbytes
+
+    def get_many(self, keys: Iterable[bytes]) -> Dict[bytes, np.ndarray]:
+        """Return the cached vectors among ``keys``; absent keys count as misses."""
+
+        keys = list(dict.fromkeys(keys))
+        found: Dict[bytes, np.ndarray] = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory_get(key)
+                if vector is not None:
+                    found[key] = vector
+
+            missing = [key for key in keys if key not in found]
+            if self._conn is not None:
+                for lo in range(0, len(missing), _LOOKUP_BATCH):
+                    batch = missing[lo : lo + _LOOKUP_BATCH]
+                    placeholders = ", ".join("?" * len(batch))
+                    for key, blob in self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                    ):
+                        vector = np.frombuffer(blob, dtype=np.float32)
+                        found[bytes(key)] = vector
+                        self._memory_put(bytes(key), vector)
+                        self._counters["disk_hits"] += 1
+            self._counters["misses"] += len(keys) - len(found)
+        return found
+
+    def put_many(self, model: str, items: Dict[bytes, Iterable[float]]) -> None:
+        """Store ``{key: vector}`` pairs computed with ``model`` in both tiers."""
+
+        # Copy so that cached rows never pin a whole response array in memory.
+        vectors = {key: np.array(vector, dtype=np.float32) for key, vector in items.items()}
+        with self._lock:
+            for key, vector in vectors.items():
+                self._memory_put(key, vector)
+            if self._conn is not None and vectors:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                    [(key, model, vector.tobytes()) for key, vector in vectors.items()],
+                )
+
+
+_cache = ProcessWide(
+    lambda: EmbeddingCache(
+        disk_cache_path("EMBEDDING_CACHE_PATH", CACHE_FILENAME),
+        int(float(os.getenv("EMBEDDING_CACHE_MEMORY_MB", DEFAULT_MEMORY_BYTES / 2**20)) * 2**20),
+    )
+)
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Return the process-wide cache, opening it on first use.
+
+    The disk tier is off by default.  ``LLM_CACHE_DIR`` enables it with
+    ``embeddings.sqlite3`` in that directory, and ``EMBEDDING_CACHE_PATH``
+    names the SQLite file directly (an empty string keeps the cache in
+    memory).  ``EMBEDDING_CACHE_MEMORY_MB`` bounds the in-memory tier.
+    """
+
+    return _cache.get()
+
+
+def _plan(model: str, texts: List[str]):
+    cache = get_embedding_cache()
+    keys = [cache_key(model, text) for text in texts]
+    found = cache.get_many(keys)
+    missing: Dict[bytes, str] = {}
+    for key, text in zip(keys, texts):
+        if key not in found and key not in missing:
+            missing[key] = text
+    return cache, keys, found, missing
+
+
+def _merge(cache, model, keys, found, missing, computed, as_array):
+    if len(computed) != len(missing):
+        raise ValueError(f"Expected {len(missing)} embeddings, got {len(computed)}")
+    fresh = dict(zip(missing, computed))
+    cache.put_many(model, fresh)
+    found.update((key, np.asarray(vector, dtype=np.float32)) for key, vector in fresh.items())
+    if not as_array:
+        return [found[key].tolist() for key in keys]
+    out = np.empty((len(keys), len(found[keys[0]]) if keys else 0), dtype=np.float32)
+    for row, key in enumerate(keys):
+        out[row] = found[key]
+    return out
+
+
+def lookup_embeddings(model: str, texts: List[str], compute, as_array: bool = False):
+    """Return embeddings of ``texts`` in order, computing only the cache misses.
+
+    ``compute(unique_missing_texts)`` must return one vector per text in the
+    same order.  Texts repeated within ``texts`` are computed once.  The
+    result is a list of lists, or an ``(n, d)`` float32 array with
+    ``as_array``.
+    """
+
+    cache, keys, found, missing = _plan(model, texts)
+    computed = compute(list(missing.values())) if missing else []
+    return _merge(cache, model, keys, found, missing, computed, as_array)
+
+
+async def alookup_embeddings(model: str, texts: List[str], compute, as_array: bool = False):
+    """:func:`lookup_embeddings` for an async ``compute`` coroutine function."""
+
+    cache, keys, found, missing = _plan(model, texts)
+    computed = await compute(list(missing.values())) if missing else []
+    return _merge(cache, model, keys, found, missing, computed, as_array)
@@ -0,0 +1,336 @@
+"""Retries, adaptive concurrency and circuit breaking for LLM API calls.
+
+Every request of :mod:`llm_client` goes through the :class:`CallGovernor`
+of its endpoint (``get_governor("embeddings")``,
+``get_governor("completions")``):
+
+* **Retries.**  Throttling (429), server errors (5xx), request timeouts and
+  connection errors are retried up to ``max_retries`` times.  The delay
+  honours ``retry-after-ms`` / ``retry-after`` and the
+  ``x-ratelimit-reset-*`` headers when the response carries them and
+  otherwise grows exponentially with full jitter.  Other errors (bad
+  request, authentication) are raised at once.
+* **AIMD concurrency.**  The number of requests in flight is capped by a
+  limit that grows by one per limit's worth of successes (additive
+  increase) and halves on throttling (multiplicative decrease).  Requests
+  that started before the last decrease do not halve it again, so a burst
+  of 429s from one window counts once.  Callers over the limit wait in a
+  FIFO queue.
+* **Circuit breaker.**  After ``failure_threshold`` consecutive failed
+  attempts (throttling excluded) calls fail fast with
+  :class:`CircuitOpenError` for ``reset_timeout`` seconds; then a single
+  probe is let through, which closes the circuit on success.
+
+The governor is shared by every event loop and thread: waiting callers are
+woken on their own loop with ``call_soon_threadsafe``.  :meth:`stats`
+reports the current limit, requests in flight, queue depth and counters.
+
+Defaults come from ``LLM_MIN_CONCURRENCY`` (1), ``LLM_INITIAL_CONCURRENCY``
+(4), ``LLM_MAX_CONCURRENCY`` (32) and ``LLM_MAX_RETRIES`` (5).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import email.utils
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_RETRYABLE_STATUS = {408, 409, 429}
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an endpoint whose circuit is open."""
+
+
+def _status(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether ``error`` is throttling or a transient server/network failure."""
+
+    status = _status(error)
+    if status is not None:
+        return status in _RETRYABLE_STATUS or status >= 500
+    if isinstance(error, (ConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    # openai.APIConnectionError / APITimeoutError carry no status code.
+    return any(cls.__name__ == "APIConnectionError" for cls in type(error).__mro__)
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    """Parse ``"20ms"``, ``"1.5s"`` or ``"6m0s"`` into seconds."""
+
+    parts = _DURATION.findall(value)
+    if not parts or "".join(number + unit for number, unit in parts) != value.strip():
+        return None
+    return sum(float(number) * _UNITS[unit] for number, unit in parts)
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Return the wait in seconds requested by the response headers of ``error``."""
+
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            try:
+                return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    resets = [
+        _parse_duration(headers[name])
+        for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+        if headers.get(name)
+    ]
+    resets = [reset for reset in resets if reset is not None]
+    return max(resets) if resets else None
+
+
+class CallGovernor:
+    """AIMD concurrency limit, retry policy and circuit breaker for one endpoint."""
+
+    def __init__(
+        self,
+        name: str = "",
+        min_concurrency: int = 1,
+        initial_concurrency: int = 4,
+        max_concurrency: int = 32,
+        max_retries: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+    ) -> None:
+        self.name = name
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._limit = float(min(max(initial_concurrency, min_concurrency), max_concurrency))
+        self._in_flight = 0
+        self._waiters: "deque[tuple]" = deque()
+        self._last_decrease = float("-inf")
+        self._consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._counters = {"calls": 0, "successes": 0, "failures": 0, "retries": 0, "throttled": 0, "rejected": 0}
+
+    # -- concurrency slots -----------------------------------------------
+
+    async def _acquire(self) -> None:
+        with self._lock:
+            if not self._waiters and self._in_flight < int(self._limit):
+                self._in_flight += 1
+                return
+            loop = asyncio.get_running_loop()
+            entry = (loop, loop.create_future())
+            self._waiters.append(entry)
+        future = entry[1]
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                try:
+                    self._waiters.remove(entry)
+                    granted = False
+                except ValueError:
+                    granted = True
+            # A slot handed to a cancelled future is returned by _grant.
+            if granted and not future.cancelled():
+                self._release()
+            raise
+
+    def _grant(self, future: asyncio.Future) -> None:
+        if future.cancelled():
+            self._release()
+        else:
+            future.set_result(None)
+
+    def _wake(self) -> None:
+        """Hand free slots to queued callers; the lock must be held."""
+
+        while self._waiters and self._in_flight < int(self._limit):
+            loop, future = self._waiters.popleft()
+            self._in_flight += 1
+            try:
+                loop.call_soon_threadsafe(self._grant, future)
+            except RuntimeError:  # the waiter's loop is closed
+                self._in_flight -= 1
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self._wake()
+
+    # -- feedback ----------------------------------------------------------
+
+    def _on_success(self) -> None:
+        with self._lock:
+            self._counters["successes"] += 1
+            self._consecutive_failures = 0
+            self._opened_at = None
+            self._probing = False
+            self._limit = min(self.max_concurrency, self._limit + 1.0 / self._limit)
+            self._wake()
+
+    def _on_throttled(self, started: float) -> None:
+        with self._lock:
+            self._counters["throttled"] += 1
+            self._probing = False
+            if started > self._last_decrease:
+                self._limit = max(self.min_concurrency, self._limit / 2.0)
+                self._last_decrease = time.monotonic()
+
+    def _on_failure(self) -> None:
+        with self._lock:
+            self._consecutive_failures += 1
+            self._probing = False
+            if self._consecutive_failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning("Opening circuit for %s after %d failures", self.name or "LLM calls", self._consecutive_failures)
+                self._opened_at = time.monotonic()
+
+    def _check_circuit(self) -> None:
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at >= self.reset_timeout and not self._probing:
+                self._probing = True
+                return
+            self._counters["rejected"] += 1
+        raise CircuitOpenError(f"Circuit for {self.name or 'LLM calls'} is open after repeated failures")
+
+    def _delay(self, error: BaseException, attempt: int) -> float:
+        requested = retry_after(error)
+        if requested is not None:
+            return min(self.max_delay, requested) + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    # -- public API --------------------------------------------------------
+
+    async def call(self, request: Callable[[], Awaitable[T]]) -> T:
+        """Await ``request()`` under the concurrency limit, retrying transient errors.
+
+        ``request`` is called again for every attempt.  The last error is
+        raised once retries are exhausted.
+        """
+
+        with self._lock:
+            self._counters["calls"] += 1
+        for attempt in range(self.max_retries + 1):
+            self._check_circuit()
+            acquired = False
+            try:
+                await self._acquire()
+                acquired = True
+                started = time.monotonic()
+                result = await request()
+            except Exception as error:
+                self._release()
+                if not is_retryable(error):
+                    with self._lock:
+                        self._counters["failures"] += 1
+                        self._probing = False
+                    raise
+                if _status(error) == 429:
+                    self._on_throttled(started)
+                else:
+                    self._on_failure()
+                if attempt == self.max_retries:
+                    with self._lock:
+                        self._counters["failures"] += 1
+                    raise
+                delay = self._delay(error, attempt)
+                with self._lock:
+                    self._counters["retries"] += 1
+                logger.warning(
+                    "%s request failed (%s); retry %d/%d in %.2fs",
+                    self.name or "LLM", error, attempt + 1, self.max_retries, delay,
+                )
+                await asyncio.sleep(delay)
+            except BaseException:
+                # Cancellation: give the slot back and end a half-open probe
+                # so that later calls are neither starved nor rejected.
+                if acquired:
+                    self._release()
+                with self._lock:
+                    self._probing = False
+                raise
+            else:
+                self._release()
+                self._on_success()
+                return result
+        raise AssertionError("unreachable")  # pragma: no cover
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the concurrency limit, in-flight and queued requests, and counters."""
+
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._counters)
+            stats.update(
+                concurrency_limit=int(self._limit),
+                in_flight=self._in_flight,
+                queued=len(self._waiters),
+                circuit="closed" if self._opened_at is None else ("half_open" if self._probing else "open"),
+            )
+        return stats
+
+
+_governors: Dict[str, CallGovernor] = {}
+_governors_lock = threading.Lock()
+
+
+def get_governor(name: str) -> CallGovernor:
+    """Return the process-wide governor of endpoint ``name``."""
+
+    with _governors_lock:
+        governor = _governors.get(name)
+        if governor is None:
+            governor = _governors[name] = CallGovernor(
+                name,
+                min_concurrency=int(os.getenv("LLM_MIN_CONCURRENCY", "1")),
+                initial_concurrency=int(os.getenv("LLM_INITIAL_CONCURRENCY", "4")),
+                max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "32")),
+                max_retries=int(os.getenv("LLM_MAX_RETRIES", "5")),
+            )
+        return governor
+
+
+def governor_stats() -> Dict[str, Dict[str, Any]]:
+    """Return :meth:`CallGovernor.stats` of every governor created so far."""
+
+    with _governors_lock:
+        governors = dict(_governors)
+    return {name: governor.stats() for name, governor in governors.items()}
@@ -0,0 +1,92 @@
+"""Deterministic, offline embeddings from hashed character n-grams.
+
+Used by the ``local`` embedding backend (``EMBEDDING_BACKEND=local``) so
+that ingestion and retrieval can be tested and benchmarked without network
+access or API cost.  Vectors carry no semantics beyond character overlap,
+which is enough for similar chunks to score higher than unrelated ones.
+
+Each text is NFKC-normalised and lower-cased, then its character bi- and
+tri-grams (never spanning whitespace, as in
+:func:`vector_db_manager.lexical.char_ngrams`) are hashed into
+``dimensions`` buckets with a random sign.  That signed feature hashing acts
+as a fixed random projection of the n-gram term-frequency vector.  Rows are
+L2-normalised.
+
+Hashing is vectorised: a batch of texts is joined into one array of code
+points, n-gram hashes are computed with a few array operations per n-gram
+size and term frequencies are summed with one ``np.bincount``.
+"""
+
+from __future__ import annotations
+
+import unicodedata
+from typing import Sequence
+
+import numpy as np
+
+DEFAULT_DIMENSIONS = 1536
+
+# Texts hashed per ``np.bincount``; bounds the accumulator to batch * dimensions.
+BATCH_SIZE = 256
+
+_SPACE = np.uint64(ord(" "))
+_PRIME = np.uint64(0x100000001B3)
+_MIX = np.uint64(0xFF51AFD7ED558CCD)
+_SHIFT = np.uint64(33)
+_SIGN_BIT = np.uint64(63)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text).lower().split())
+
+
+def _embed_batch(texts: Sequence[str], dimensions: int, sizes: Sequence[int]) -> np.ndarray:
+    normalized = [_normalize(text) for text in texts]
+    codes = np.frombuffer(" ".join(normalized).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    # Row of every code point; the separator after each text counts towards it.
+    rows = np.repeat(np.arange(len(texts), dtype=np.int64), [len(text) + 1 for text in normalized])[: len(codes)]
+    space = codes == _SPACE
+
+    counts = np.zeros(len(texts) * dimensions, dtype=np.float64)
+    for size in sizes:
+        windows = len(codes) - size + 1
+        if windows <= 0:
+            continue
+        hashes = np.full(windows, size, dtype=np.uint64)
+        blocked = np.zeros(windows, dtype=bool)
+        for offset in range(size):
+            hashes = hashes * _PRIME + codes[offset : offset + windows]
+            blocked |= space[offset : offset + windows]
+        # Finaliser from MurmurHash3 so that neighbouring n-grams spread out.
+        hashes ^= hashes >> _SHIFT
+        hashes *= _MIX
+        hashes ^= hashes >> _SHIFT
+
+        keep = ~blocked
+        hashes = hashes[keep]
+        buckets = rows[:windows][keep] * dimensions + (hashes % np.uint64(dimensions)).astype(np.int64)
+        signs = 1.0 - 2.0 * (hashes >> _SIGN_BIT).astype(np.float64)
+        counts += np.bincount(buckets, weights=signs, minlength=len(counts))
+
+    vectors = counts.reshape(len(texts), dimensions).astype(np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+def hashed_ngram_embeddings(
+    texts: Sequence[str], dimensions: int = DEFAULT_DIMENSIONS, sizes: Sequence[int] = (2, 3)
+) -> np.ndarray:
+    """Return an ``(n, dimensions)`` float32 array of unit-length embeddings.
+
+    The result depends only on the texts and parameters, never on the
+    process (Python's randomised ``hash`` is not used).  Texts without any
+    n-gram map to zero vectors.
+    """
+
+    texts = list(texts)
+    out = np.empty((len(texts), dimensions), dtype=np.float32)
+    for lo in range(0, len(texts), BATCH_SIZE):
+        hi = lo + BATCH_SIZE
+        out[lo:hi] = _embed_batch(texts[lo:hi], dimensions, sizes)
+    return out
@@ -1,7 +1,7 @@
 """Minimal stub of the :mod:`openai` package used in tests.
 
-Only the ``OpenAI`` class is provided so that unit tests can patch it without
-requiring the real external dependency.
+Only the ``OpenAI`` and ``AsyncOpenAI`` classes are provided so that unit
+tests can patch them without requiring the real external dependency.
 """
 
 
@@ -9,3 +9,7 @@ class OpenAI:  # pragma: no cover - simple stub
     def __init__(self, *args, **kwargs):
         pass
 
+
+class AsyncOpenAI:  # pragma: no cover - simple stub
+    def __init__(self, *args, **kwargs):
+        pass
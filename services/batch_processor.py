@@ -11,15 +11,21 @@ import streamlit as st
 from pathlib import Path
 
 from document_processor.extractor import extract_text
-from services.document_service import process_and_store_document
+from document_processor.spool import spool_upload
+from services.document_service import content_document_id, process_and_store_document
 from ai_agent.rag import rewrite_document_with_rag
 from diff_generator.generator import generate_diff_report
 from utils.logger import app_logger, log_file_operation, log_ai_operation
 
 class BatchProcessor:
-    """バッチ処理を管理するクラス"""
+    """バッチ処理を管理するクラス
+
+    ``tenant`` はベクトルDBの名前空間。書類は内容から求めたIDで格納されるため、
+    同じ書類を再処理してもチャンクは置き換えられ、コレクションは肥大化しない。
+    """
     
-    def __init__(self):
+    def __init__(self, tenant: str = None):
+        self.tenant = tenant
         self.batch_id = None
         self.batch_results = []
         self.batch_config = {}
@@ -110,7 +116,9 @@ class BatchProcessor:
                 'timestamp': datetime.now().isoformat()
             })
             
-            existing_doc_text = extract_text(document['content'], document['type'])
+            # 一時ディレクトリへ書き出したファイルのパス（無ければバイト列）を使う
+            source = document.get('path') or document['content']
+            existing_doc_text = extract_text(source, document['type'])
             
             result['processing_steps'][-1]['status'] = 'completed'
             result['processing_steps'][-1]['end_timestamp'] = datetime.now().isoformat()
@@ -123,9 +131,11 @@ class BatchProcessor:
             })
             
             doc_id, num_chunks = process_and_store_document(
-                file_content=document['content'],
+                file_content=source,
                 file_type=document['type'],
-                document_name=document['name']
+                document_name=document['name'],
+                doc_id=content_document_id(source),
+                tenant=self.tenant
             )
             
             result['processing_steps'][-1]['status'] = 'completed'
@@ -141,7 +151,8 @@ class BatchProcessor:
             
             rewritten_doc = rewrite_document_with_rag(
                 existing_doc_id=doc_id,
-                new_standard_text=new_standard_text
+                new_standard_text=new_standard_text,
+                tenant=self.tenant
             )
             
             result['processing_steps'][-1]['status'] = 'completed'
@@ -226,8 +237,8 @@ class BatchProcessor:
             'success_rate': (results.get('successful_documents', 0) / max(results.get('total_documents', 1), 1)) * 100
         }
 
-def create_batch_interface():
-    """バッチ処理インターフェースを作成"""
+def create_batch_interface(tenant: str = None):
+    """バッチ処理インターフェースを作成（``tenant`` は書類を格納するベクトルDBの名前空間）"""
     
     st.subheader("📦 バッチ処理")
     
@@ -252,19 +263,18 @@ def create_batch_interface():
         
         try:
             # バッチ処理の初期化
-            processor = BatchProcessor()
+            processor = BatchProcessor(tenant=tenant)
             processor.start_batch(batch_name)
             
             # 新規格内容の読み込み
-            new_standard_content = new_standard_file.getvalue()
-            new_standard_text = extract_text(new_standard_content, new_standard_file.type)
+            new_standard_text = extract_text(spool_upload(new_standard_file), new_standard_file.type)
             
-            # 書類リストの作成
+            # 書類リストの作成（内容はメモリに複製せず一時ディレクトリへ書き出して参照する）
             documents = []
             for file in uploaded_files:
                 documents.append({
                     'name': file.name,
-                    'content': file.getvalue(),
+                    'path': spool_upload(file),
                     'type': file.type,
                     'size': file.size
                 })
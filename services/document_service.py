@@ -1,3 +1,5 @@
+import hashlib
+import os
 import uuid  # For generating unique document IDs
 
 from document_processor.extractor import extract_text
@@ -6,6 +8,7 @@ from llm_client.embedding import generate_embeddings
 from vector_db_manager.chroma import (
     get_or_create_collection,
     store_document_chunks,
+    upsert_document,
 )
 
 from utils.logger import get_logger
@@ -15,9 +18,34 @@ logger = get_logger(__name__)
 # AGENT.md 9.2.2 services モジュール
 
 
-def process_and_store_document(file_content, file_type, document_name):
+def content_document_id(file_content):
+    """
+    Returns a document ID derived from the file's content.
+
+    ``file_content`` is bytes or a file path.  Passing the ID as ``doc_id``
+    to :func:`process_and_store_document` makes re-processing the same file
+    replace its chunks instead of adding another copy.
+    """
+    digest = hashlib.sha256()
+    if isinstance(file_content, (str, os.PathLike)):
+        with open(file_content, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+    else:
+        digest.update(file_content)
+    return f"doc_{digest.hexdigest()[:32]}"
+
+
+def process_and_store_document(file_content, file_type, document_name, doc_id=None, tenant=None):
     """
     Orchestrates the entire process of document processing and storage.
+
+    ``file_content`` is the document's bytes or the path of a spooled copy
+    (see :mod:`document_processor.spool`).
+
+    When ``doc_id`` is given, the chunks previously stored under that ID are
+    replaced instead of a new document being added.  ``tenant`` selects the
+    vector store namespace the document is stored in.
     """
     logger.info(f"Starting processing for document: {document_name}")
 
@@ -41,8 +69,9 @@ def process_and_store_document(file_content, file_type, document_name):
     # 3. ベクトル埋め込みの生成
     logger.info("Step 3: Generating embeddings...")
     try:
-        embeddings = generate_embeddings(chunks)
-        if not embeddings:
+        # (n, d) の float32 配列をそのままベクトルDBへ渡す
+        embeddings = generate_embeddings(chunks, as_array=True)
+        if len(embeddings) == 0:
             logger.error("Failed to generate embeddings. Aborting.")
             return None, 0
         logger.info("Embeddings generated successfully.")
@@ -55,10 +84,13 @@ def process_and_store_document(file_content, file_type, document_name):
 
     # 4. ベクトルデータベースへの格納
     logger.info("Step 4: Storing document in vector database...")
-    doc_id = f"doc_{str(uuid.uuid4())}"
     try:
-        collection = get_or_create_collection()
-        store_document_chunks(collection, chunks, embeddings, doc_id)
+        collection = get_or_create_collection(tenant=tenant)
+        if doc_id:
+            upsert_document(collection, doc_id, chunks, embeddings)
+        else:
+            doc_id = f"doc_{str(uuid.uuid4())}"
+            store_document_chunks(collection, chunks, embeddings, doc_id)
         logger.info(f"Document stored successfully with ID: {doc_id}")
     except Exception as e:
         logger.error(
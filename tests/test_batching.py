@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from llm_client.batching import TokenRateLimiter, adispatch, pack_requests
+
+
+def test_pack_requests_respects_input_and_token_limits():
+    assert pack_requests([1] * 5, max_inputs=2, max_tokens=100) == [(0, 2), (2, 4), (4, 5)]
+    assert pack_requests([40, 40, 40, 150, 10], max_inputs=10, max_tokens=100) == [(0, 2), (2, 3), (3, 4), (4, 5)]
+    assert pack_requests([]) == []
+
+
+def test_dispatch_reassembles_in_order_and_retries_only_failed_slice():
+    calls = []
+
+    async def send(start, stop):
+        calls.append((start, stop))
+        if calls.count((2, 4)) == 1 and start == 2:
+            raise RuntimeError("rate limited")
+        return list(range(start, stop))
+
+    slices = pack_requests([1] * 7, max_inputs=2)
+    result = asyncio.run(adispatch(slices, send, [1] * 7, max_concurrency=3, backoff=0))
+
+    assert result == list(range(7))
+    assert sorted(calls) == [(0, 2), (2, 4), (2, 4), (4, 6), (6, 7)]
+
+
+def test_dispatch_raises_after_retries():
+    async def send(start, stop):
+        raise RuntimeError("down")
+
+    with pytest.raises(RuntimeError, match="down"):
+        asyncio.run(adispatch([(0, 1)], send, [1], max_retries=1, backoff=0))
+
+
+def test_rate_limiter_waits_for_refill():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    limiter = TokenRateLimiter(600, clock=lambda: now[0], sleep=sleep)
+
+    assert limiter.acquire(600) == 0
+    assert limiter.acquire(60) == pytest.approx(6.0)
+    assert sleeps == [pytest.approx(6.0)]
@@ -0,0 +1,115 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from llm_client import completion_cache
+
+
+@pytest.fixture(autouse=True)
+def memory_only_cache(monkeypatch):
+    monkeypatch.setattr(completion_cache._cache, "instance", completion_cache.CompletionCache(None))
+
+
+def _import_completion():
+    # 環境変数は最初のリクエスト時に読まれるため、再インポートせずに使える
+    import llm_client.completion as completion
+    return completion
+
+
+def test_get_completion_wraps_the_async_client():
+    completion = _import_completion()
+    client = MagicMock()
+    client.chat.completions.create = AsyncMock(
+        return_value=SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="rewritten"))])
+    )
+    with patch.object(completion, "get_async_client", return_value=client):
+        assert completion.get_completion("prompt") == "rewritten"
+
+    assert client.chat.completions.create.call_args.kwargs["messages"] == [{"role": "user", "content": "prompt"}]
+
+
+class _Stream:
+    """Async iterable of chunks with the ``close()`` of an OpenAI ``AsyncStream``."""
+
+    def __init__(self, chunks, error=None):
+        self._chunks = chunks
+        self._error = error
+        self.closed = False
+
+    async def __aiter__(self):
+        for chunk in self._chunks:
+            yield chunk
+        if self._error is not None:
+            raise self._error
+
+    async def close(self):
+        self.closed = True
+
+
+def _chunk(piece):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))] if piece != "" else [])
+
+
+def _stream_client(pieces, error=None):
+    client = MagicMock()
+    client.chat.completions.create = AsyncMock(return_value=_Stream([_chunk(piece) for piece in pieces], error))
+    return client
+
+
+def test_stream_completion_yields_pieces_in_order():
+    completion = _import_completion()
+    client = _stream_client(["# 見出し", "\n", "", None, "本文"])
+
+    with patch.object(completion, "get_async_client", return_value=client):
+        pieces = list(completion.stream_completion("prompt"))
+
+    assert pieces == ["# 見出し", "\n", "本文"]
+    assert client.chat.completions.create.call_args.kwargs["stream"] is True
+
+
+def test_stream_completion_raises_on_errors_and_can_be_closed_early():
+    completion = _import_completion()
+
+    client = MagicMock()
+    client.chat.completions.create = AsyncMock(side_effect=Exception("boom"))
+    with patch.object(completion, "get_async_client", return_value=client):
+        with pytest.raises(completion.CompletionError, match="boom"):
+            list(completion.stream_completion("prompt"))
+
+    with patch.object(completion, "get_async_client", return_value=_stream_client(["a", "b", "c"])):
+        stream = completion.stream_completion("prompt")
+        assert next(stream) == "a"
+        stream.close()
+
+
+def test_stream_failing_midway_raises_after_the_partial_pieces_and_is_not_cached():
+    completion = _import_completion()
+
+    client = _stream_client(["途中まで"], ConnectionError("connection reset"))
+    pieces = []
+    with patch.object(completion, "get_async_client", return_value=client):
+        with pytest.raises(completion.CompletionError, match="connection reset"):
+            for piece in completion.stream_completion("prompt"):
+                pieces.append(piece)
+
+    assert pieces == ["途中まで"]
+    assert completion.get_completion_cache_stats()["entries"] == 0
+    assert client.chat.completions.create.return_value.closed
+
+
+def test_stream_closed_after_the_first_piece_closes_the_response():
+    completion = _import_completion()
+    client = _stream_client(["a", "b", "c"])
+
+    async def first_piece():
+        pieces = completion.astream_completion("prompt", use_cache=False)
+        piece = await pieces.__anext__()
+        await pieces.aclose()
+        return piece
+
+    with patch.object(completion, "get_async_client", return_value=client):
+        assert asyncio.run(first_piece()) == "a"
+
+    assert client.chat.completions.create.return_value.closed
@@ -0,0 +1,103 @@
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from llm_client import completion_cache
+from llm_client.completion_cache import CompletionCache, completion_key
+
+
+@pytest.fixture
+def memory_only_cache(monkeypatch):
+    monkeypatch.setattr(completion_cache._cache, "instance", CompletionCache(None))
+
+
+def _import_completion():
+    # 環境変数は最初のリクエスト時に読まれるため、再インポートせずに使える
+    import llm_client.completion as completion
+    return completion
+
+
+def test_key_covers_model_parameters_and_template_version():
+    base = completion_key("gpt-4.1-mini", "prompt", 0.7, 2048, "v1")
+    assert base == completion_key("gpt-4.1-mini", "prompt", 0.7, 2048, "v1")
+    assert base != completion_key("gpt-4.1", "prompt", 0.7, 2048, "v1")
+    assert base != completion_key("gpt-4.1-mini", "prompt", 0.0, 2048, "v1")
+    assert base != completion_key("gpt-4.1-mini", "prompt", 0.7, 1024, "v1")
+    assert base != completion_key("gpt-4.1-mini", "prompt", 0.7, 2048, "v2")
+
+
+
+def test_disk_tier_is_opt_in_and_shares_the_cache_directory(tmp_path, monkeypatch):
+    for variable in ("COMPLETION_CACHE_PATH", "LLM_CACHE_DIR"):
+        monkeypatch.delenv(variable, raising=False)
+    monkeypatch.setattr(completion_cache._cache, "instance", None)
+    assert completion_cache.get_completion_cache().path is None
+
+    monkeypatch.setenv("LLM_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(completion_cache._cache, "instance", None)
+    cache = completion_cache.get_completion_cache()
+    assert cache.path == str(tmp_path / "completions.sqlite3")
+    cache.close()
+
+def test_hits_count_saved_tokens_and_survive_reopening(tmp_path):
+    path = str(tmp_path / "completions.sqlite3")
+    cache = CompletionCache(path)
+    cache.put(b"k", "m", "改訂後の文書", tokens=1500)
+    cache.close()
+
+    cache = CompletionCache(path)
+    assert cache.get(b"k") == "改訂後の文書"
+    assert cache.get(b"other") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["tokens_saved"], stats["entries"]) == (1, 1, 1500, 1)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_expired_entries_are_dropped():
+    cache = CompletionCache(None, ttl=0.01)
+    cache.put(b"k", "m", "text")
+    time.sleep(0.02)
+
+    assert cache.get(b"k") is None
+    assert cache.stats()["expired"] == 1 and cache.stats()["entries"] == 0
+
+
+def test_size_bound_evicts_least_recently_used():
+    cache = CompletionCache(None, max_bytes=10)
+    cache.put(b"a", "m", "aaaa")
+    cache.put(b"b", "m", "bbbb")
+    time.sleep(0.001)
+    assert cache.get(b"a") == "aaaa"
+    cache.put(b"c", "m", "cccc")
+
+    assert cache.get(b"b") is None
+    assert cache.get(b"a") == "aaaa" and cache.get(b"c") == "cccc"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_completions_are_cached_per_template_version(memory_only_cache):
+    completion = _import_completion()
+    client = MagicMock()
+    client.chat.completions.create = AsyncMock(
+        side_effect=[
+            Exception("boom"),
+            SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="v1"))], usage=SimpleNamespace(total_tokens=900)),
+            SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="v2"))], usage=None),
+            SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="other"))], usage=None),
+        ]
+    )
+
+    with patch.object(completion, "get_async_client", return_value=client):
+        assert completion.get_completion("prompt", cache_version="t1").startswith("Error:")
+        assert completion.get_completion("prompt", cache_version="t1") == "v1"
+        assert completion.get_completion("prompt", cache_version="t1") == "v1"
+        assert list(completion.stream_completion("prompt", cache_version="t1")) == ["v1"]
+        assert completion.get_completion("prompt", cache_version="t1", regenerate=True) == "v2"
+        assert completion.get_completion("prompt", cache_version="t1") == "v2"
+        assert completion.get_completion("prompt", cache_version="t2") == "other"
+
+    assert client.chat.completions.create.call_count == 4
+    stats = completion.get_completion_cache_stats()
+    assert stats["hits"] == 3 and stats["tokens_saved"] >= 1800
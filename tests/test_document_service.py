@@ -15,42 +15,41 @@ class RecursiveCharacterTextSplitter:
         return [text]
 text_splitter_module.RecursiveCharacterTextSplitter = RecursiveCharacterTextSplitter
 langchain_module.text_splitter = text_splitter_module
-sys.modules['langchain'] = langchain_module
-sys.modules['langchain.text_splitter'] = text_splitter_module
 
 llm_client_module = types.ModuleType('llm_client')
 embedding_module = types.ModuleType('llm_client.embedding')
-def generate_embeddings(chunks, model='text-embedding-3-small'):
+def generate_embeddings(chunks, model='text-embedding-3-small', **kwargs):
     return []
 embedding_module.generate_embeddings = generate_embeddings
 llm_client_module.embedding = embedding_module
-sys.modules['llm_client'] = llm_client_module
-sys.modules['llm_client.embedding'] = embedding_module
 
 vector_db_module = types.ModuleType('vector_db_manager')
 chroma_module = types.ModuleType('vector_db_manager.chroma')
-def get_or_create_collection(name='iso_documents'):
+def get_or_create_collection(name='iso_documents', tenant=None):
     return None
 def store_document_chunks(collection, chunks, embeddings, doc_id):
     pass
+def upsert_document(collection, doc_id, chunks, embeddings):
+    pass
 chroma_module.get_or_create_collection = get_or_create_collection
 chroma_module.store_document_chunks = store_document_chunks
+chroma_module.upsert_document = upsert_document
 vector_db_module.chroma = chroma_module
-sys.modules['vector_db_manager'] = vector_db_module
-sys.modules['vector_db_manager.chroma'] = chroma_module
-
-from services.document_service import process_and_store_document
 
-# Clean up stubbed modules to avoid affecting other tests
-for mod in [
-    'langchain',
-    'langchain.text_splitter',
-    'llm_client',
-    'llm_client.embedding',
-    'vector_db_manager',
-    'vector_db_manager.chroma',
-]:
-    sys.modules.pop(mod, None)
+# Install the stubs only while the service is imported, so that they are
+# removed again even if the import fails and never shadow the real packages
+# in other test modules
+with pytest.MonkeyPatch.context() as stubs:
+    for module in [
+        langchain_module,
+        text_splitter_module,
+        llm_client_module,
+        embedding_module,
+        vector_db_module,
+        chroma_module,
+    ]:
+        stubs.setitem(sys.modules, module.__name__, module)
+    from services.document_service import content_document_id, process_and_store_document
 
 
 @pytest.fixture
@@ -87,3 +86,28 @@ def test_process_and_store_document_embedding_failure(sample_input):
         embed_mock.assert_called_once()
         get_coll_mock.assert_not_called()
         store_mock.assert_not_called()
+
+
+def test_content_document_id_is_stable_across_bytes_and_paths(tmp_path):
+    path = tmp_path / "manual.txt"
+    path.write_bytes(b"Hello world")
+
+    assert content_document_id(b"Hello world") == content_document_id(str(path)) == content_document_id(path)
+    assert content_document_id(b"Hello world").startswith("doc_")
+    assert content_document_id(b"Hello there") != content_document_id(b"Hello world")
+
+
+def test_reprocessing_with_content_id_upserts(sample_input):
+    file_content, file_type, name = sample_input
+    doc_id = content_document_id(file_content)
+
+    with patch("services.document_service.generate_embeddings", return_value=[[0.1, 0.2, 0.3]]), \
+         patch("services.document_service.get_or_create_collection", return_value=MagicMock()) as get_coll_mock, \
+         patch("services.document_service.upsert_document") as upsert_mock, \
+         patch("services.document_service.store_document_chunks") as store_mock:
+        for _ in range(2):
+            assert process_and_store_document(file_content, file_type, name, doc_id=doc_id, tenant="t1") == (doc_id, 1)
+
+        assert upsert_mock.call_count == 2
+        store_mock.assert_not_called()
+        get_coll_mock.assert_called_with(tenant="t1")
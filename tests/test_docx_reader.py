@@ -0,0 +1,78 @@
+import io
+import zipfile
+
+import pytest
+
+from document_processor.docx_reader import document_parts, iter_docx_blocks, iter_part_blocks
+
+NS = (
+    'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+    'xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006"'
+)
+
+
+def part(body):
+    return f"<w:document {NS}><w:body>{body}</w:body></w:document>".encode("utf-8")
+
+
+def blocks(xml, keep_empty=True):
+    return list(iter_part_blocks(io.BytesIO(xml), keep_empty=keep_empty))
+
+
+def test_runs_and_special_characters_are_joined():
+    xml = part(
+        "<w:p><w:r><w:t>情報</w:t></w:r><w:r><w:t>セキュリティ</w:t><w:tab/><w:t>方針</w:t></w:r></w:p>"
+        "<w:p><w:r><w:t>行1</w:t><w:br/><w:t>行2</w:t></w:r></w:p>"
+        "<w:p/>"
+    )
+    assert blocks(xml) == ["情報セキュリティ\t方針", "行1\n行2", ""]
+    assert blocks(xml, keep_empty=False) == ["情報セキュリティ\t方針", "行1\n行2"]
+
+
+def test_deleted_text_and_fallback_copies_are_skipped():
+    xml = part(
+        "<w:p><w:del><w:r><w:delText>削除</w:delText></w:r></w:del><w:r><w:t>残す</w:t></w:r>"
+        "<mc:AlternateContent><mc:Choice><w:txbxContent><w:p><w:r><w:t>枠</w:t></w:r></w:p></w:txbxContent></mc:Choice>"
+        "<mc:Fallback><w:p><w:r><w:t>枠</w:t></w:r></w:p></mc:Fallback></mc:AlternateContent></w:p>"
+    )
+    assert blocks(xml) == ["枠", "残す"]
+
+
+def test_table_cells_are_blocks_in_document_order():
+    xml = part(
+        "<w:tbl><w:tr>"
+        "<w:tc><w:p><w:r><w:t>A1</w:t></w:r></w:p></w:tc>"
+        "<w:tc><w:p><w:r><w:t>B1</w:t></w:r></w:p><w:p><w:r><w:t>B1-2</w:t></w:r></w:p></w:tc>"
+        "</w:tr></w:tbl>"
+        "<w:p><w:r><w:t>after</w:t></w:r></w:p>"
+    )
+    assert blocks(xml) == ["A1", "B1\nB1-2", "after"]
+
+
+def test_separator_notes_are_skipped():
+    xml = (
+        f'<w:footnotes {NS}>'
+        '<w:footnote w:type="separator" w:id="-1"><w:p><w:r><w:separator/></w:r></w:p></w:footnote>'
+        '<w:footnote w:id="1"><w:p><w:r><w:t>脚注</w:t></w:r></w:p></w:footnote>'
+        "</w:footnotes>"
+    ).encode("utf-8")
+    assert blocks(xml, keep_empty=False) == ["脚注"]
+
+
+def test_document_parts_are_in_reading_order():
+    names = [
+        "word/footer2.xml", "word/document.xml", "word/header10.xml", "word/endnotes.xml",
+        "word/header2.xml", "word/footnotes.xml", "word/styles.xml", "word/footer1.xml",
+    ]
+    assert document_parts(names) == [
+        "word/header2.xml", "word/header10.xml", "word/document.xml",
+        "word/footnotes.xml", "word/endnotes.xml", "word/footer1.xml", "word/footer2.xml",
+    ]
+
+
+def test_missing_body_part_is_rejected():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("word/styles.xml", "<styles/>")
+    with pytest.raises(ValueError):
+        list(iter_docx_blocks(buffer))
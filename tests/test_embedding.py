@@ -1,19 +1,174 @@
+import asyncio
+import importlib.util
 import sys
 import logging
-from unittest.mock import patch, MagicMock
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
 
+import pytest
 
-def test_generate_embeddings_logs_and_returns_empty_list_on_error(caplog):
-    with patch("utils.helpers.load_env_variables", return_value={"OPENAI_API_KEY": "test"}), \
-         patch("openai.OpenAI", return_value=MagicMock()):
-        if "llm_client.embedding" in sys.modules:
-            del sys.modules["llm_client.embedding"]
-        import llm_client.embedding as emb
+from llm_client import embedding_cache
 
-    with patch.object(emb.client.embeddings, "create", side_effect=Exception("boom")), \
+
+@pytest.fixture(autouse=True)
+def memory_only_cache(monkeypatch):
+    monkeypatch.setattr(embedding_cache._cache, "instance", embedding_cache.EmbeddingCache(None))
+
+
+@pytest.fixture
+def emb(monkeypatch):
+    # テストごとに読み込み直したモジュールを登録し、終了時（失敗時も）に元のモジュールへ戻す
+    spec = importlib.util.find_spec("llm_client.embedding")
+    module = importlib.util.module_from_spec(spec)
+    monkeypatch.setitem(sys.modules, spec.name, module)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _fake_client(create):
+    client = MagicMock()
+    client.embeddings.create = AsyncMock(side_effect=create)
+    return client
+
+
+def _echo_lengths(input, model, **options):
+    return SimpleNamespace(data=[SimpleNamespace(embedding=[float(len(text))]) for text in input])
+
+
+def test_generate_embeddings_logs_and_returns_empty_list_on_error(emb, caplog):
+    with patch.object(emb, "get_async_client", return_value=_fake_client(Exception("boom"))), \
          caplog.at_level(logging.ERROR):
         result = emb.generate_embeddings(["hello"])
         assert result == []
         assert "An error occurred while generating embeddings" in caplog.text
 
-    sys.modules.pop("llm_client.embedding", None)
+
+def test_generate_embeddings_only_requests_cache_misses(emb):
+    client = _fake_client(_echo_lengths)
+
+    with patch.object(emb, "get_async_client", return_value=client):
+        assert emb.generate_embeddings(["a", "bb"]) == [[1.0], [2.0]]
+        assert emb.generate_embeddings(["bb", "ccc", "a"]) == [[2.0], [3.0], [1.0]]
+
+    assert [call.kwargs["input"] for call in client.embeddings.create.call_args_list] == [["a", "bb"], ["ccc"]]
+    assert emb.get_embedding_cache_stats()["memory_hits"] == 2
+
+
+def test_large_inputs_are_split_into_ordered_requests(emb):
+    def create(input, model, **options):
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[float(text)]) for text in input])
+
+    client = _fake_client(create)
+    texts = [str(i) for i in range(5000)]
+    with patch.object(emb, "get_async_client", return_value=client):
+        result = emb.generate_embeddings(texts, use_cache=False)
+
+    assert result == [[float(i)] for i in range(5000)]
+    assert client.embeddings.create.call_count == 3
+    assert max(len(call.kwargs["input"]) for call in client.embeddings.create.call_args_list) <= 2048
+
+
+def test_agenerate_embeddings_runs_on_the_callers_loop(emb):
+    async def main():
+        with patch.object(emb, "get_async_client", return_value=_fake_client(_echo_lengths)):
+            return await asyncio.gather(
+                emb.agenerate_embeddings(["a"], use_cache=False),
+                emb.agenerate_embeddings(["bb"], use_cache=False),
+            )
+
+    assert asyncio.run(main()) == [[[1.0]], [[2.0]]]
+
+
+def _base64_vectors(rows):
+    import base64
+
+    import numpy as np
+
+    return [SimpleNamespace(embedding=base64.b64encode(np.asarray(row, dtype="<f4").tobytes()).decode()) for row in rows]
+
+
+def test_as_array_decodes_base64_and_passes_dimensions(emb):
+    import numpy as np
+
+    def create(input, model, **options):
+        return SimpleNamespace(data=_base64_vectors([[len(text), 0.5] for text in input]))
+
+    client = _fake_client(create)
+    with patch.object(emb, "get_async_client", return_value=client):
+        result = emb.generate_embeddings(["a", "bbb", "a"], as_array=True, dimensions=2)
+        again = emb.generate_embeddings(["bbb"], as_array=True, dimensions=2)
+
+    assert result.dtype == np.float32 and result.shape == (3, 2) and result.flags.c_contiguous
+    np.testing.assert_array_equal(result, [[1, 0.5], [3, 0.5], [1, 0.5]])
+    np.testing.assert_array_equal(again, [[3, 0.5]])
+    options = client.embeddings.create.call_args.kwargs
+    assert (options["encoding_format"], options["dimensions"]) == ("base64", 2)
+    assert client.embeddings.create.call_count == 1
+
+
+def test_as_array_failure_returns_empty_array(emb):
+    with patch.object(emb, "get_async_client", return_value=_fake_client(Exception("boom"))):
+        result = emb.generate_embeddings(["hello"], as_array=True, use_cache=False)
+
+    assert result.shape == (0, 0)
+
+
+def test_local_backend_is_selected_by_environment(emb, monkeypatch):
+    import numpy as np
+
+    monkeypatch.setenv("EMBEDDING_BACKEND", "local")
+    texts = ["情報セキュリティ方針を定める", "情報セキュリティ方針の策定", "売上報告書"]
+
+    with patch.object(emb, "get_async_client", side_effect=AssertionError("network used")):
+        first = emb.generate_embeddings(texts, as_array=True, dimensions=64)
+        second = emb.generate_embeddings(texts, as_array=True, dimensions=64)
+
+    assert first.shape == (3, 64) and first.dtype == np.float32
+    np.testing.assert_array_equal(first, second)
+    np.testing.assert_allclose(np.linalg.norm(first, axis=1), 1.0, rtol=1e-6)
+    similarity = first @ first.T
+    assert similarity[0, 1] > similarity[0, 2]
+    assert emb.get_embedding_cache_stats()["misses"] == 0
+
+
+def test_unknown_backend_is_rejected(emb):
+    with pytest.raises(ValueError, match="Unsupported embedding backend"):
+        emb.generate_embeddings(["text"], backend="nope")
+
+
+def test_throttled_requests_are_retried_by_the_governor(emb):
+    from llm_client.governor import CallGovernor
+
+    throttled = Exception("rate limited")
+    throttled.status_code = 429
+    responses = [throttled, _echo_lengths(["a", "bb"], "m")]
+
+    def create(input, model, **options):
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    governor = CallGovernor("embeddings", base_delay=0.001)
+    with patch.object(emb, "get_async_client", return_value=_fake_client(create)), \
+         patch.object(emb, "get_governor", return_value=governor):
+        assert emb.generate_embeddings(["a", "bb"], use_cache=False) == [[1.0], [2.0]]
+
+    assert governor.stats()["retries"] == 1
+
+
+def test_identical_concurrent_requests_are_sent_once(emb):
+    async def create(input, model, **options):
+        await asyncio.sleep(0.01)
+        return _echo_lengths(input, model)
+
+    client = MagicMock()
+    client.embeddings.create = AsyncMock(side_effect=create)
+
+    async def main():
+        return await asyncio.gather(*(emb.agenerate_embeddings(["a", "bb"]) for _ in range(3)))
+
+    with patch.object(emb, "get_async_client", return_value=client):
+        assert asyncio.run(main()) == [[[1.0], [2.0]]] * 3
+
+    assert client.embeddings.create.call_count == 1
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from llm_client import embedding_cache
+from llm_client.embedding_cache import EmbeddingCache, cache_key, lookup_embeddings
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(embedding_cache._cache, "instance", cache)
+    yield cache
+    cache.close()
+
+
+def test_key_ignores_whitespace_and_width_but_not_model():
+    assert cache_key("m", "ＩＳＯ  27001\n") == cache_key("m", "ISO 27001")
+    assert cache_key("m", "ISO 27001") != cache_key("other", "ISO 27001")
+
+
+def test_only_misses_are_computed_and_order_is_kept(cache):
+    calls = []
+
+    def compute(texts):
+        calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    first = lookup_embeddings("m", ["a", "bb", "a"], compute)
+    second = lookup_embeddings("m", ["ccc", "bb", "a"], compute)
+
+    assert calls == [["a", "bb"], ["ccc"]]
+    assert first == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    assert second == [[3.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["misses"]) == (2, 3)
+
+
+def test_disk_tier_survives_restart_and_memory_tier_is_bounded(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = EmbeddingCache(path, max_memory_bytes=2 * 4 * 4)
+    vectors = {cache_key("m", str(i)): np.full(4, i, dtype=np.float32) for i in range(3)}
+    cache.put_many("m", vectors)
+    assert cache.stats()["memory_entries"] == 2
+    cache.close()
+
+    reopened = EmbeddingCache(path)
+    found = reopened.get_many(vectors)
+    assert set(found) == set(vectors)
+    assert reopened.stats()["disk_hits"] == 3
+    np.testing.assert_array_equal(found[cache_key("m", "2")], [2, 2, 2, 2])
+    reopened.close()
+
+
+def test_disk_tier_is_opt_in(tmp_path, monkeypatch):
+    for variable in ("EMBEDDING_CACHE_PATH", "LLM_CACHE_DIR"):
+        monkeypatch.delenv(variable, raising=False)
+    monkeypatch.setattr(embedding_cache._cache, "instance", None)
+    assert embedding_cache.get_embedding_cache().path is None
+
+    monkeypatch.setenv("LLM_CACHE_DIR", str(tmp_path / "caches"))
+    monkeypatch.setattr(embedding_cache._cache, "instance", None)
+    cache = embedding_cache.get_embedding_cache()
+    assert cache.path == str(tmp_path / "caches" / "embeddings.sqlite3")
+    cache.close()
+
+    monkeypatch.setenv("EMBEDDING_CACHE_PATH", "")
+    monkeypatch.setattr(embedding_cache._cache, "instance", None)
+    assert embedding_cache.get_embedding_cache().path is None
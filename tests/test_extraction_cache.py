@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+from document_processor.extraction_cache import ExtractionCache, extraction_key
+
+
+def test_key_depends_on_bytes_and_type():
+    assert extraction_key(b"abc", "text/plain") == extraction_key(b"abc", "text/plain")
+    assert extraction_key(b"abc", "text/plain") != extraction_key(b"abd", "text/plain")
+    assert extraction_key(b"abc", "text/plain") != extraction_key(b"abc", "application/pdf")
+
+
+def test_memory_tier_is_bounded_by_bytes():
+    cache = ExtractionCache(max_memory_bytes=200)
+    for name in "abc":
+        cache.get_or_extract(name.encode(), "text/plain", lambda: name * 100)
+
+    stats = cache.stats()
+    assert stats["memory_entries"] == 1 and stats["memory_bytes"] <= 200
+    assert cache.get_or_extract(b"c", "text/plain", lambda: pytest.fail("re-parsed")) == "c" * 100
+
+
+def test_disk_tier_survives_restarts(tmp_path):
+    path = str(tmp_path / "extractions.sqlite3")
+    cache = ExtractionCache(path)
+    cache.get_or_extract(b"k", "text/plain", lambda: "本文")
+    cache.close()
+
+    cache = ExtractionCache(path)
+    assert cache.get_or_extract(b"k", "text/plain", lambda: pytest.fail("re-parsed")) == "本文"
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_concurrent_callers_parse_once_and_share_errors():
+    cache = ExtractionCache()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def extract():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        raise ValueError("corrupted")
+
+    errors = []
+
+    def worker():
+        try:
+            cache.get_or_extract(b"k", "application/pdf", extract)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(3)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    while cache.stats()["coalesced"] < 2:
+        threading.Event().wait(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1 and len(errors) == 3
+    assert cache.get_or_extract(b"k", "application/pdf", lambda: "fixed") == "fixed"
@@ -1,8 +1,14 @@
 import io
 import pytest
 
+from document_processor import extraction_cache
 from document_processor.extractor import extract_text
 
+
+@pytest.fixture(autouse=True)
+def fresh_extraction_cache(monkeypatch):
+    monkeypatch.setattr(extraction_cache._cache, "instance", extraction_cache.ExtractionCache())
+
 def create_pdf_bytes(text: str) -> bytes:
     from reportlab.pdfgen import canvas
 
@@ -53,3 +59,168 @@ def test_extract_text_docx_error():
             corrupted_docx,
             "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
         )
+
+
+def create_multipage_pdf_bytes(pages: int) -> bytes:
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer)
+    for page in range(pages):
+        c.drawString(100, 750, f"Page {page}")
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+def test_page_ranges_cover_every_page_in_order():
+    from document_processor.extractor import _page_ranges
+
+    assert _page_ranges(10, 3) == [(0, 3), (3, 6), (6, 10)]
+    assert _page_ranges(2, 8) == [(0, 1), (1, 2)]
+
+
+def test_extract_text_pdf_parallel_matches_serial():
+    from document_processor.extractor import extract_text_from_pdf
+
+    content = create_multipage_pdf_bytes(12)
+    serial = extract_text_from_pdf(content, workers=1)
+    parallel = extract_text_from_pdf(content, workers=2, min_pages=4)
+
+    assert parallel == serial
+    assert [line for line in parallel.splitlines() if line] == [f"Page {i}" for i in range(12)]
+
+
+
+def test_pool_is_reused_for_smaller_worker_counts():
+    from document_processor import extractor
+
+    pool = extractor._get_pool(2)
+    assert extractor._get_pool(1) is pool
+    assert extractor._get_pool(2) is pool
+
+def test_iter_text_yields_pages_with_locations():
+    from document_processor.extractor import iter_text
+
+    content = create_multipage_pdf_bytes(3)
+    segments = list(iter_text(content, "application/pdf"))
+
+    assert [segment.page for segment in segments] == [1, 2, 3]
+    assert [segment.text.strip() for segment in segments] == ["Page 0", "Page 1", "Page 2"]
+    assert "".join(segment.text for segment in segments) == extract_text(content, "application/pdf")
+
+
+def test_iter_text_yields_paragraphs_with_locations():
+    from docx import Document
+    from document_processor.extractor import DOCX_MIME_TYPE, iter_text
+
+    buffer = io.BytesIO()
+    doc = Document()
+    doc.add_paragraph("第1章 適用範囲")
+    doc.add_paragraph("第2章 用語")
+    doc.save(buffer)
+
+    segments = list(iter_text(buffer.getvalue(), DOCX_MIME_TYPE))
+    assert [(segment.paragraph, segment.text) for segment in segments] == [(0, "第1章 適用範囲\n"), (1, "第2章 用語\n")]
+
+    text = "一段落目\n続き\n\n二段落目\n\n\n三段落目"
+    segments = list(iter_text(text.encode("utf-8"), "text/plain"))
+    assert [segment.paragraph for segment in segments] == [0, 1, 2]
+    assert "".join(segment.text for segment in segments) == text
+
+
+def test_parallel_iterator_can_be_closed_early(tmp_path, monkeypatch):
+    import tempfile
+
+    from document_processor.extractor import iter_text_from_pdf
+
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    segments = iter_text_from_pdf(create_multipage_pdf_bytes(8), workers=2, min_pages=2)
+
+    assert next(segments).page == 1
+    segments.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_extract_text_parses_each_upload_once(monkeypatch):
+    from document_processor import extractor
+
+    calls = []
+    original = extractor.iter_text_from_pdf
+
+    def counting(file_content, *args):
+        calls.append(1)
+        return original(file_content, *args)
+
+    monkeypatch.setattr(extractor, "iter_text_from_pdf", counting)
+    content = create_pdf_bytes("Cached")
+
+    texts = [extract_text(content, "application/pdf") for _ in range(3)]
+    assert texts == [texts[0]] * 3 and texts[0].strip() == "Cached"
+    assert extract_text(content, "application/pdf", use_cache=False) == texts[0]
+    assert len(calls) == 2
+    assert extraction_cache.get_extraction_cache().stats()["memory_hits"] == 2
+
+
+def test_extract_text_docx_includes_tables_headers_and_footers():
+    from docx import Document
+
+    buffer = io.BytesIO()
+    doc = Document()
+    doc.sections[0].header.paragraphs[0].text = "ISMSマニュアル"
+    doc.sections[0].footer.paragraphs[0].text = "社外秘"
+    doc.add_paragraph("前文")
+    table = doc.add_table(rows=1, cols=2)
+    table.cell(0, 0).text = "A.5.1"
+    table.cell(0, 1).paragraphs[0].text = "方針"
+    table.cell(0, 1).add_paragraph("見直し")
+    doc.add_paragraph("後文\tタブ")
+    doc.save(buffer)
+
+    text = extract_text(
+        buffer.getvalue(),
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    )
+    assert text == "ISMSマニュアル\n前文\nA.5.1\n方針\n見直し\n後文\tタブ\n社外秘\n"
+
+
+@pytest.mark.parametrize(
+    "file_type, content",
+    [
+        ("application/pdf", create_pdf_bytes("From disk")),
+        ("application/vnd.openxmlformats-officedocument.wordprocessingml.document", create_docx_bytes("From disk")),
+        ("text/plain", "From disk\r\n".encode("utf-8")),
+    ],
+)
+def test_extract_text_accepts_paths_and_mmaps(tmp_path, file_type, content):
+    import mmap
+
+    path = tmp_path / "upload"
+    path.write_bytes(content)
+    expected = extract_text(content, file_type, use_cache=False)
+
+    assert extract_text(str(path), file_type, use_cache=False) == expected
+    assert extract_text(path, file_type, use_cache=False) == expected
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        assert extract_text(mapped, file_type, use_cache=False) == expected
+
+    # パスとバイト列は同じ内容なら同じキャッシュエントリを共有する
+    assert extract_text(content, file_type) == extract_text(path, file_type) == expected
+    assert extraction_cache.get_extraction_cache().stats()["misses"] == 1
+
+
+def test_extract_text_pdf_parallel_from_path(tmp_path):
+    from document_processor.extractor import extract_text_from_pdf
+
+    content = create_multipage_pdf_bytes(8)
+    path = tmp_path / "standard.pdf"
+    path.write_bytes(content)
+
+    assert extract_text_from_pdf(path, workers=2, min_pages=2) == extract_text_from_pdf(content, workers=1)
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_extract_text_empty_file(tmp_path):
+    path = tmp_path / "empty.txt"
+    path.write_bytes(b"")
+    assert extract_text(path, "text/plain") == ""
@@ -0,0 +1,129 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from llm_client.governor import CallGovernor, CircuitOpenError, is_retryable, retry_after
+
+
+class APIError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+class APIConnectionError(Exception):
+    pass
+
+
+def _flaky(*errors, result="ok"):
+    pending = list(errors)
+    calls = []
+
+    async def request():
+        calls.append(1)
+        if pending:
+            raise pending.pop(0)
+        return result
+
+    return request, calls
+
+
+def test_error_classification_and_headers():
+    assert is_retryable(APIError(429)) and is_retryable(APIError(503)) and is_retryable(APIConnectionError())
+    assert not is_retryable(APIError(400)) and not is_retryable(ValueError())
+    assert retry_after(APIError(429, {"retry-after-ms": "250"})) == 0.25
+    assert retry_after(APIError(429, {"retry-after": "2"})) == 2.0
+    assert retry_after(APIError(429, {"x-ratelimit-reset-requests": "1m0.5s", "x-ratelimit-reset-tokens": "20ms"})) == 60.5
+    assert retry_after(APIError(429)) is None
+
+
+def test_throttling_is_retried_and_halves_the_limit():
+    governor = CallGovernor(initial_concurrency=8, base_delay=0.001)
+    request, calls = _flaky(APIError(429, {"retry-after-ms": "1"}), APIError(500))
+
+    assert asyncio.run(governor.call(request)) == "ok"
+
+    stats = governor.stats()
+    assert len(calls) == 3
+    assert (stats["retries"], stats["throttled"], stats["successes"]) == (2, 1, 1)
+    assert stats["concurrency_limit"] == 4
+    assert stats["in_flight"] == 0 and stats["circuit"] == "closed"
+
+
+def test_non_retryable_errors_are_raised_at_once():
+    governor = CallGovernor(base_delay=0.001)
+    request, calls = _flaky(APIError(401))
+
+    with pytest.raises(APIError):
+        asyncio.run(governor.call(request))
+    assert len(calls) == 1 and governor.stats()["failures"] == 1
+
+
+def test_limit_grows_additively_and_bounds_in_flight_requests():
+    governor = CallGovernor(initial_concurrency=2, max_concurrency=3)
+    in_flight = []
+    peak = []
+
+    async def request():
+        in_flight.append(1)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.001)
+        in_flight.pop()
+        return "ok"
+
+    async def main():
+        tasks = [asyncio.ensure_future(governor.call(request)) for _ in range(5)]
+        await asyncio.sleep(0)
+        queued = governor.stats()["queued"]
+        await asyncio.gather(*tasks)
+        return queued
+
+    assert asyncio.run(main()) == 3
+    assert max(peak[:2]) <= 2
+    assert governor.stats()["concurrency_limit"] == 3
+
+
+def test_circuit_opens_and_recovers_after_a_probe():
+    governor = CallGovernor(max_retries=0, failure_threshold=2, reset_timeout=60)
+    for _ in range(2):
+        with pytest.raises(APIError):
+            asyncio.run(governor.call(_flaky(APIError(503))[0]))
+
+    request, calls = _flaky()
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(governor.call(request))
+    assert not calls and governor.stats()["circuit"] == "open"
+
+    governor.reset_timeout = 0
+    assert asyncio.run(governor.call(request)) == "ok"
+    assert governor.stats()["circuit"] == "closed"
+
+
+def test_cancelled_calls_release_their_slots_and_probes():
+    governor = CallGovernor(initial_concurrency=2, max_concurrency=2, max_retries=0, failure_threshold=1, reset_timeout=0)
+
+    async def hang():
+        await asyncio.sleep(60)
+
+    async def cancel_calls(count):
+        tasks = [asyncio.ensure_future(governor.call(hang)) for _ in range(count)]
+        await asyncio.sleep(0.01)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # 実行中と待機中の呼び出しをキャンセルしてもスロットは戻る
+    asyncio.run(cancel_calls(3))
+    stats = governor.stats()
+    assert (stats["in_flight"], stats["queued"]) == (0, 0)
+    assert asyncio.run(governor.call(_flaky()[0])) == "ok"
+
+    # キャンセルされた半開プローブの後も次のプローブが通り、回路が閉じる
+    with pytest.raises(APIError):
+        asyncio.run(governor.call(_flaky(APIError(503))[0]))
+    asyncio.run(cancel_calls(1))
+    assert governor.stats()["circuit"] == "open" and governor.stats()["in_flight"] == 0
+    assert asyncio.run(governor.call(_flaky()[0])) == "ok"
+    assert governor.stats()["circuit"] == "closed"
@@ -1,20 +1,56 @@
+import asyncio
 import sys
 from unittest.mock import patch
 
+from llm_client import async_client
 
-def test_embedding_uses_helper():
-    with patch("utils.helpers.load_env_variables", return_value={"OPENAI_API_KEY": "test"}) as mock_env, \
-         patch("openai.OpenAI"):
-        if "llm_client.embedding" in sys.modules:
-            del sys.modules["llm_client.embedding"]
-        import llm_client.embedding  # noqa: F401
-        mock_env.assert_called_once()
 
+def _fresh_import(name):
+    sys.modules.pop(name, None)
+    __import__(name)
+    sys.modules.pop(name, None)
 
-def test_completion_uses_helper():
-    with patch("utils.helpers.load_env_variables", return_value={"OPENAI_API_KEY": "test"}) as mock_env, \
-         patch("openai.OpenAI"):
-        if "llm_client.completion" in sys.modules:
-            del sys.modules["llm_client.completion"]
-        import llm_client.completion  # noqa: F401
-        mock_env.assert_called_once()
+
+def test_import_does_not_load_env_or_build_clients():
+    with patch("utils.helpers.load_env_variables") as mock_env, \
+         patch("openai.AsyncOpenAI") as client_cls:
+        _fresh_import("llm_client.embedding")
+        _fresh_import("llm_client.completion")
+    mock_env.assert_not_called()
+    client_cls.assert_not_called()
+
+
+def test_missing_key_falls_back_to_helper(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    with patch("utils.helpers.load_env_variables", return_value={"OPENAI_API_KEY": "from-dotenv"}) as mock_env:
+        assert async_client.client_config().api_key == "from-dotenv"
+    mock_env.assert_called_once()
+
+
+def test_client_is_shared_and_rebuilt_when_key_changes(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "first")
+    monkeypatch.setenv("LLM_TIMEOUT", "5")
+
+    async def clients():
+        first = async_client.get_async_client()
+        same = async_client.get_async_client()
+        monkeypatch.setenv("OPENAI_API_KEY", "second")
+        return first, same, async_client.get_async_client()
+
+    with patch("openai.AsyncOpenAI", side_effect=lambda **kwargs: kwargs):
+        first, same, changed = asyncio.run(clients())
+
+    assert first is same
+    assert (first["api_key"], first["timeout"]) == ("first", 5.0)
+    assert changed["api_key"] == "second"
+
+
+def test_configure_clients_overrides_environment(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "key")
+    async_client.configure_clients(base_url="http://proxy.local/v1", max_connections=8)
+    try:
+        config = async_client.client_config()
+        assert (config.base_url, config.max_connections) == ("http://proxy.local/v1", 8)
+    finally:
+        async_client.configure_clients(base_url=None, max_connections=None)
+    assert async_client.client_config().base_url is None
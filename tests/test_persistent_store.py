@@ -0,0 +1,128 @@
+import os
+
+import numpy as np
+
+from vector_db_manager import chroma, persistent
+from vector_db_manager.chroma import (
+    get_or_create_collection,
+    store_document_chunks,
+    search_similar_chunks,
+    build_document_filter,
+)
+from vector_db_manager.persistent import PersistentCollection
+
+
+def test_collection_uses_chroma_db_path_and_survives_reopen(tmp_path, monkeypatch):
+    monkeypatch.setenv("CHROMA_DB_PATH", str(tmp_path))
+    collection = get_or_create_collection("persisted")
+    assert isinstance(collection, PersistentCollection)
+
+    store_document_chunks(collection, ["x axis", "y axis"], [[1.0, 0.0], [0.0, 1.0]], "doc1")
+    store_document_chunks(collection, ["other"], [[0.0, 1.0]], "doc2")
+
+    chroma._collections.clear()
+    reopened = get_or_create_collection("persisted")
+    assert reopened is not collection
+    assert reopened.count() == 3
+    assert search_similar_chunks(reopened, [0.0, 1.0], top_k=1, where=build_document_filter("doc1")) == ["y axis"]
+
+    result = reopened.query([[1.0, 0.0]], n_results=1)
+    assert result["metadatas"] == [[{"document_id": "doc1", "chunk_index": 0}]]
+
+
+def test_readers_see_rows_written_by_another_handle(tmp_path):
+    writer = PersistentCollection(str(tmp_path / "shared"))
+    reader = PersistentCollection(str(tmp_path / "shared"))
+
+    store_document_chunks(writer, ["hello"], [[1.0, 0.0]], "doc1")
+
+    assert search_similar_chunks(reader, [1.0, 0.0]) == ["hello"]
+
+
+def test_segments_are_merged_without_changing_results(tmp_path, monkeypatch):
+    monkeypatch.setattr(persistent, "MAX_SEGMENTS", 4)
+    collection = PersistentCollection(str(tmp_path / "merged"))
+    vectors = np.random.default_rng(0).normal(size=(10, 4)).astype(np.float32)
+    for i, vector in enumerate(vectors):
+        store_document_chunks(collection, [f"chunk {i}"], [vector], f"doc{i}")
+
+    assert len(list(tmp_path.joinpath("merged").glob("seg_*.npy"))) <= 4
+    for i, vector in enumerate(vectors):
+        assert search_similar_chunks(collection, vector, top_k=1) == [f"chunk {i}"]
+        assert search_similar_chunks(collection, vector, where=build_document_filter(f"doc{i}")) == [f"chunk {i}"]
+
+
+def test_delete_and_compaction_on_disk(tmp_path):
+    from vector_db_manager.chroma import delete_document
+
+    collection = PersistentCollection(str(tmp_path / "compacted"))
+    collection.compaction_threshold = 1.0
+    store_document_chunks(collection, ["a0", "a1"], [[1.0, 0.0], [0.9, 0.1]], "a")
+    store_document_chunks(collection, ["b0"], [[0.0, 1.0]], "b")
+    store_document_chunks(collection, ["c0"], [[0.7, 0.7]], "c")
+
+    assert delete_document(collection, "a") == 2
+    assert collection.count() == 2
+    assert search_similar_chunks(collection, [1.0, 0.0], top_k=5) == ["c0", "b0"]
+
+    collection.compact()
+    reopened = PersistentCollection(str(tmp_path / "compacted"))
+    assert reopened._row_count() == 2
+    assert search_similar_chunks(reopened, [1.0, 0.0], top_k=5) == ["c0", "b0"]
+    assert search_similar_chunks(reopened, [0.0, 1.0], where=build_document_filter("b")) == ["b0"]
+
+
+def test_tenant_collections_live_in_their_own_directory(tmp_path, monkeypatch):
+    monkeypatch.setenv("CHROMA_DB_PATH", str(tmp_path))
+    collection = get_or_create_collection("docs", tenant="acme")
+    store_document_chunks(collection, ["hello"], [[1.0, 0.0]], "doc1")
+
+    assert collection.path == str(tmp_path / "tenants" / "acme" / "docs")
+    assert get_or_create_collection("docs").count() == 0
+
+
+def test_snapshot_imports_into_on_disk_collection(tmp_path, monkeypatch):
+    from vector_db_manager.snapshot import export_collection, import_collection
+
+    monkeypatch.setenv("CHROMA_DB_PATH", str(tmp_path / "db"))
+    store_document_chunks(get_or_create_collection("source"), ["x axis", "y axis"], [[1.0, 0.0], [0.0, 1.0]], "doc1")
+    export_collection("source", str(tmp_path / "source.snap"), dtype="float16")
+
+    restored = import_collection(str(tmp_path / "source.snap"), name="restored")
+    assert isinstance(restored, PersistentCollection)
+    assert search_similar_chunks(restored, [0.0, 1.0], top_k=1, where=build_document_filter("doc1")) == ["y axis"]
+
+
+def test_drop_tenant_closes_collections_and_deletes_files(tmp_path, monkeypatch):
+    from vector_db_manager.chroma import TenantLease, drop_tenant
+
+    monkeypatch.setenv("CHROMA_DB_PATH", str(tmp_path))
+    kept = get_or_create_collection("docs", tenant="kept")
+    store_document_chunks(kept, ["kept"], [[1.0, 0.0]], "doc1")
+    lease = TenantLease()
+    for name in ("docs", "notes"):
+        store_document_chunks(get_or_create_collection(name, tenant=lease.tenant), ["gone"], [[1.0, 0.0]], "doc1")
+    assert (tmp_path / "tenants" / lease.tenant).is_dir()
+
+    lease.release()
+    assert not (tmp_path / "tenants" / lease.tenant).exists()
+    assert get_or_create_collection("docs", tenant="kept") is kept and kept.count() == 1
+    assert drop_tenant("kept", delete_files=False) == 1
+    assert (tmp_path / "tenants" / "kept" / "docs").is_dir()
+
+
+def test_sweep_removes_only_orphaned_leased_tenants(tmp_path, monkeypatch):
+    import uuid
+
+    from vector_db_manager.chroma import sweep_orphaned_tenants
+
+    monkeypatch.setenv("CHROMA_DB_PATH", str(tmp_path))
+    orphan, live = uuid.uuid4().hex, uuid.uuid4().hex
+    for tenant in (orphan, live, "acme"):
+        store_document_chunks(get_or_create_collection("docs", tenant=tenant), ["text"], [[1.0, 0.0]], "doc1")
+    chroma._collections.pop(str(tmp_path / "tenants" / orphan / "docs")).close()
+
+    assert sweep_orphaned_tenants() == [orphan]
+    assert sorted(os.listdir(tmp_path / "tenants")) == sorted([live, "acme"])
+    monkeypatch.delenv("CHROMA_DB_PATH")
+    assert sweep_orphaned_tenants() == []
@@ -0,0 +1,118 @@
+import asyncio
+import threading
+
+import pytest
+
+from utils.singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_request():
+    flight = SingleFlight()
+    calls = []
+
+    async def request():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return ["result"]
+
+    async def main():
+        return await asyncio.gather(*(flight.do("key", request) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert flight.stats() == {"calls": 5, "coalesced": 4, "in_flight": 0}
+
+    asyncio.run(flight.do("key", request))
+    assert len(calls) == 2
+
+
+def test_callers_on_different_threads_and_loops_coalesce():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    async def request():
+        calls.append(1)
+        started.set()
+        await asyncio.get_running_loop().run_in_executor(None, release.wait)
+        return "shared"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(asyncio.run(flight.do("key", request))))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(asyncio.run(flight.do("key", request)))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    while flight.stats()["coalesced"] < 3:
+        threading.Event().wait(0.001)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert results == ["shared"] * 4 and len(calls) == 1
+
+
+def test_every_waiter_receives_the_same_exception():
+    flight = SingleFlight()
+    error = RuntimeError("rate limited")
+
+    async def request():
+        await asyncio.sleep(0.01)
+        raise error
+
+    async def main():
+        return await asyncio.gather(*(flight.do("key", request) for _ in range(3)), return_exceptions=True)
+
+    assert [result is error for result in asyncio.run(main())] == [True] * 3
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_cancelled_waiter_does_not_cancel_the_request():
+    flight = SingleFlight()
+
+    async def request():
+        await asyncio.sleep(0.01)
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(flight.do("key", request))
+        second = asyncio.ensure_future(flight.do("key", request))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "done"
+
+
+def test_blocking_callers_on_different_threads_coalesce():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls, results = [], []
+
+    def request():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "text"
+
+    threads = [threading.Thread(target=lambda: results.append(flight.do_sync("key", request))) for _ in range(3)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    while flight.stats()["coalesced"] < 2:
+        threading.Event().wait(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1 and results == ["text"] * 3
+    assert flight.stats()["in_flight"] == 0
+    with pytest.raises(ValueError):
+        flight.do_sync("key", lambda: int("not a number"))
+    assert flight.stats()["in_flight"] == 0
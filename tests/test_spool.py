@@ -0,0 +1,52 @@
+import io
+import os
+import time
+
+from document_processor.spool import prune_spool, spool_upload
+
+
+class Upload(io.BytesIO):
+    name = "Manual.PDF"
+
+
+def test_spool_upload_writes_each_content_once(tmp_path):
+    first = spool_upload(Upload(b"%PDF-1.4 content"), str(tmp_path))
+    mtime = os.stat(first).st_mtime_ns
+    second = spool_upload(Upload(b"%PDF-1.4 content"), str(tmp_path))
+    other = spool_upload(Upload(b"%PDF-1.4 other"), str(tmp_path))
+
+    assert first == second != other
+    assert first.endswith(".pdf")
+    with open(first, "rb") as f:
+        assert f.read() == b"%PDF-1.4 content"
+    assert os.stat(second).st_mtime_ns >= mtime
+    assert sorted(os.listdir(tmp_path)) == sorted([os.path.basename(first), os.path.basename(other)])
+
+
+def test_spool_upload_accepts_streams_and_bytes(tmp_path):
+    class Stream:
+        name = "notes.txt"
+
+        def __init__(self, data):
+            self._buffer = io.BytesIO(data)
+            self.seek = self._buffer.seek
+            self.read = self._buffer.read
+
+    data = b"x" * (3 * 1024 * 1024 + 7)
+    from_stream = spool_upload(Stream(data), str(tmp_path))
+    from_bytes = spool_upload(data, str(tmp_path))
+
+    assert from_stream == from_bytes + ".txt"
+    with open(from_stream, "rb") as f:
+        assert f.read() == data
+
+
+def test_prune_spool_removes_stale_files(tmp_path):
+    fresh = spool_upload(b"fresh", str(tmp_path))
+    stale = spool_upload(b"stale", str(tmp_path))
+    old = time.time() - 3600
+    os.utime(stale, (old, old))
+
+    assert prune_spool(str(tmp_path), ttl=60) == 1
+    assert os.listdir(tmp_path) == [os.path.basename(fresh)]
+    assert prune_spool(str(tmp_path / "missing"), ttl=60) == 0
@@ -0,0 +1,289 @@
+import uuid
+
+import numpy as np
+import pytest
+
+from vector_db_manager.chroma import (
+    get_or_create_collection,
+    store_document_chunks,
+    search_similar_chunks,
+)
+
+
+def _new_collection():
+    return get_or_create_collection(name=f"test_{uuid.uuid4()}")
+
+
+def test_search_similar_chunks_ranks_by_cosine_similarity():
+    collection = _new_collection()
+    store_document_chunks(
+        collection,
+        ["x axis", "y axis", "diagonal"],
+        [[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]],
+        "doc1",
+    )
+
+    assert search_similar_chunks(collection, [0.0, 2.0], top_k=2) == ["y axis", "diagonal"]
+
+
+def test_query_returns_cosine_distances():
+    collection = _new_collection()
+    store_document_chunks(collection, ["a", "b"], [[3.0, 0.0], [0.0, 1.0]], "doc1")
+
+    result = collection.query([[1.0, 0.0]], n_results=5)
+
+    assert result["documents"] == [["a", "b"]]
+    np.testing.assert_allclose(result["distances"][0], [0.0, 1.0], atol=1e-6)
+
+
+def test_matrix_grows_beyond_initial_capacity():
+    collection = _new_collection()
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(300, 8)).astype(np.float32)
+    for start in range(0, 300, 50):
+        store_document_chunks(
+            collection,
+            [f"chunk {i}" for i in range(start, start + 50)],
+            vectors[start : start + 50],
+            "doc1",
+        )
+
+    assert collection.count() == 300
+    assert search_similar_chunks(collection, vectors[123], top_k=1) == ["chunk 123"]
+
+
+def test_query_supports_in_and_and_filters():
+    collection = _new_collection()
+    embedding = [1.0, 0.0]
+    for doc_id in ("doc1", "doc2", "doc3"):
+        store_document_chunks(collection, [f"{doc_id} a", f"{doc_id} b"], [embedding, embedding], doc_id)
+
+    in_filter = {"document_id": {"$in": ["doc1", "doc3"]}}
+    documents = collection.query([embedding], n_results=10, where=in_filter)["documents"][0]
+    assert sorted(documents) == ["doc1 a", "doc1 b", "doc3 a", "doc3 b"]
+
+    and_filter = {"$and": [{"document_id": {"$eq": "doc2"}}, {"chunk_index": 1}]}
+    assert search_similar_chunks(collection, embedding, where=and_filter) == ["doc2 b"]
+
+    assert search_similar_chunks(collection, embedding, where={"document_id": "missing"}) == []
+
+
+def test_ivf_index_finds_neighbours_and_honours_filters():
+    from vector_db_manager.ann import recall_report
+
+    collection = _new_collection()
+    rng = np.random.default_rng(1)
+    centers = rng.normal(size=(16, 32))
+    vectors = (centers[rng.integers(0, 16, 2000)] + 0.1 * rng.normal(size=(2000, 32))).astype(np.float32)
+    store_document_chunks(collection, [f"chunk {i}" for i in range(1000)], vectors[:1000], "doc1")
+    collection.enable_ann(nlist=16, nprobe=4, min_train_rows=500, prefilter_rows=10)
+    store_document_chunks(collection, [f"chunk {i}" for i in range(1000, 2000)], vectors[1000:], "doc2")
+
+    assert collection.ann.trained
+    assert search_similar_chunks(collection, vectors[1500], top_k=1) == ["chunk 1500"]
+    assert search_similar_chunks(
+        collection, vectors[1500], top_k=3, where={"document_id": "doc1"}
+    ) == collection.query([vectors[1500]], n_results=3, where={"document_id": "doc1"}, exact=True)["documents"][0]
+
+    report = recall_report(collection, vectors[:20], top_k=5, nprobes=(1, 16))
+    assert report[-1]["recall"] == 1.0
+    assert report[0]["recall"] <= report[-1]["recall"]
+
+
+def test_delete_and_upsert_document_with_compaction():
+    from vector_db_manager.chroma import delete_document, upsert_document
+
+    collection = _new_collection()
+    collection.compaction_threshold = 1.0
+    store_document_chunks(collection, ["old a", "old b"], [[1.0, 0.0], [0.9, 0.1]], "manual")
+    store_document_chunks(collection, ["keep"], [[0.8, 0.2]], "other")
+
+    upsert_document(collection, "manual", ["new a"], [[1.0, 0.0]])
+    assert collection.count() == 2
+    assert search_similar_chunks(collection, [1.0, 0.0], top_k=5) == ["new a", "keep"]
+
+    assert delete_document(collection, "other") == 1
+    assert collection.embeddings.shape[0] == 4
+
+    collection.compact()
+    assert collection.embeddings.shape[0] == 1
+    assert search_similar_chunks(collection, [1.0, 0.0], where={"document_id": "manual"}) == ["new a"]
+    assert search_similar_chunks(collection, [1.0, 0.0], where={"document_id": "other"}) == []
+
+
+
+def test_failed_add_leaves_no_rows_in_any_index():
+    collection = _new_collection()
+    store_document_chunks(collection, ["kept"], [[1.0, 0.0]], "doc1")
+    assert collection.lexical_query("kept")["documents"] == [["kept"]]
+
+    with pytest.raises(TypeError):
+        collection.add(
+            embeddings=[[0.0, 1.0], [0.5, 0.5]],
+            documents=["ghost a", "ghost b"],
+            metadatas=[{"document_id": "doc2"}, {"document_id": ["unhashable"]}],
+            ids=["a", "b"],
+        )
+
+    assert collection.count() == 1 and len(collection.ids) == len(collection.metadatas) == 1
+    assert search_similar_chunks(collection, [0.0, 1.0], top_k=5, where={"document_id": "doc2"}) == []
+    store_document_chunks(collection, ["added"], [[0.0, 1.0]], "doc3")
+    assert search_similar_chunks(collection, [0.0, 1.0], top_k=1, where={"document_id": "doc3"}) == ["added"]
+    assert collection.lexical_query("ghost")["documents"] == [[]]
+    assert collection.lexical_query("added")["documents"] == [["added"]]
+
+def test_collection_upsert_replaces_matching_rows():
+    collection = _new_collection()
+    store_document_chunks(collection, ["old"], [[1.0, 0.0]], "manual")
+
+    removed = collection.upsert(
+        {"document_id": "manual"},
+        embeddings=[[0.0, 1.0]],
+        documents=["new"],
+        metadatas=[{"document_id": "manual", "chunk_index": 0}],
+        ids=["new-0"],
+    )
+    assert removed == 1
+    assert search_similar_chunks(collection, [1.0, 0.0], top_k=5, where={"document_id": "manual"}) == ["new"]
+
+def test_quantized_storage_keeps_ranking_with_less_memory():
+    from vector_db_manager.chroma import _Collection
+    from vector_db_manager.storage import quantization_report
+
+    rng = np.random.default_rng(2)
+    vectors = rng.normal(size=(500, 64)).astype(np.float32)
+    queries = vectors[:20] + 0.05 * rng.normal(size=(20, 64)).astype(np.float32)
+
+    report = {entry["storage"]: entry for entry in quantization_report(vectors, queries, top_k=5)}
+    assert report["float32"]["recall"] == 1.0
+    assert report["int8"]["bytes_per_row"] == 64 + 4
+    assert report["int8"]["compression"] > 25
+    assert report["int8+rescore"]["recall"] >= report["int8"]["recall"] >= 0.8
+
+    collection = _Collection(storage="float16")
+    store_document_chunks(collection, [f"chunk {i}" for i in range(500)], vectors, "doc1")
+    assert search_similar_chunks(collection, vectors[42], top_k=1) == ["chunk 42"]
+
+
+def test_search_similar_chunks_batch_returns_scores_and_matrix():
+    from vector_db_manager.chroma import search_similar_chunks_batch, delete_document
+
+    collection = _new_collection()
+    collection.compaction_threshold = 1.0
+    store_document_chunks(collection, ["x", "y"], [[1.0, 0.0], [0.0, 1.0]], "doc1")
+    store_document_chunks(collection, ["gone"], [[1.0, 1.0]], "doc2")
+    delete_document(collection, "doc2")
+
+    batch = search_similar_chunks_batch(
+        collection, np.array([[1.0, 0.0], [0.0, 3.0]]), top_k=1, return_scores=True
+    )
+
+    assert batch["documents"] == [["x"], ["y"]]
+    np.testing.assert_allclose(batch["scores"], [[1.0], [1.0]], atol=1e-6)
+    assert batch["score_matrix"].shape == (2, 2)
+    assert batch["score_ids"] == collection.ids[:2]
+    np.testing.assert_allclose(batch["score_matrix"], np.eye(2), atol=1e-6)
+
+
+def test_hybrid_search_finds_exact_terms_missed_by_vectors():
+    collection = _new_collection()
+    store_document_chunks(
+        collection,
+        ["情報セキュリティ方針を定める。", "個人情報保護管理者を任命する。", "A.5.23 クラウドサービスの利用"],
+        [[1.0, 0.0], [0.0, 1.0], [0.0, 1.0]],
+        "doc1",
+    )
+
+    assert search_similar_chunks(collection, [1.0, 0.0], top_k=1) == ["情報セキュリティ方針を定める。"]
+    assert collection.lexical_query("A.5.23", n_results=1)["documents"] == [["A.5.23 クラウドサービスの利用"]]
+    assert search_similar_chunks(
+        collection, [1.0, 0.0], top_k=2, query_text="保護管理者"
+    )[0] == "個人情報保護管理者を任命する。"
+
+
+def test_tenants_do_not_share_collections():
+    first = get_or_create_collection("shared_name", tenant=f"t_{uuid.uuid4().hex}")
+    second = get_or_create_collection("shared_name", tenant=f"t_{uuid.uuid4().hex}")
+    assert first is not second
+    assert first._lock is not second._lock
+
+    store_document_chunks(first, ["private"], [[1.0, 0.0]], "doc1")
+    assert search_similar_chunks(second, [1.0, 0.0]) == []
+
+
+def test_concurrent_adds_and_queries_stay_aligned():
+    import threading
+
+    collection = _new_collection()
+    errors = []
+
+    def writer(worker):
+        for i in range(50):
+            vector = [float(worker + 1), float(i + 1)]
+            store_document_chunks(collection, [f"{worker}:{i}"], [vector], f"doc{worker}")
+
+    def reader():
+        try:
+            for _ in range(200):
+                result = collection.query([[1.0, 1.0]], n_results=3)
+                for document, metadata in zip(result["documents"][0], result["metadatas"][0]):
+                    assert document.startswith(f"{metadata['document_id'][3:]}:")
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(w,)) for w in range(4)]
+    threads += [threading.Thread(target=reader) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert collection.count() == 200
+    for worker in range(4):
+        documents = search_similar_chunks(collection, [1.0, 0.0], top_k=200, where={"document_id": f"doc{worker}"})
+        assert sorted(documents) == sorted(f"{worker}:{i}" for i in range(50))
+
+
+def test_snapshot_round_trip_restores_live_rows(tmp_path):
+    from vector_db_manager import chroma
+    from vector_db_manager.chroma import delete_document
+    from vector_db_manager.snapshot import export_collection, import_collection
+
+    name = f"test_{uuid.uuid4()}"
+    collection = get_or_create_collection(name)
+    collection.compaction_threshold = 1.0
+    store_document_chunks(collection, ["x axis", "y 軸方向"], [[1.0, 0.0], [0.0, 1.0]], "doc1")
+    store_document_chunks(collection, ["gone"], [[1.0, 1.0]], "doc2")
+    delete_document(collection, "doc2")
+
+    path = str(tmp_path / "collection.snap")
+    assert export_collection(name, path) == 2
+    chroma._collections.pop((None, name))
+
+    restored = import_collection(path)
+    assert restored is get_or_create_collection(name)
+    assert restored.count() == 2
+    assert search_similar_chunks(restored, [0.0, 1.0], top_k=1) == ["y 軸方向"]
+    assert search_similar_chunks(restored, [1.0, 0.0], top_k=5, where={"document_id": "doc2"}) == []
+    assert restored.lexical_query("軸方向")["documents"] == [["y 軸方向"]]
+
+    store_document_chunks(restored, ["diagonal"], [[1.0, 1.0]], "doc3")
+    assert search_similar_chunks(restored, [1.0, 1.0], top_k=1) == ["diagonal"]
+
+
+def test_discarded_tenant_lease_drops_its_collections():
+    import gc
+
+    from vector_db_manager import chroma
+
+    lease = chroma.TenantLease()
+    tenant = lease.tenant
+    store_document_chunks(get_or_create_collection("docs", tenant=tenant), ["hello"], [[1.0, 0.0]], "doc1")
+    assert (tenant, "docs") in chroma._collections
+
+    del lease
+    gc.collect()
+    assert (tenant, "docs") not in chroma._collections
+    assert get_or_create_collection("docs", tenant=tenant).count() == 0
+    assert chroma.drop_tenant(tenant) == 1
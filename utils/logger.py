@@ -11,6 +11,10 @@ import traceback
 import json
 import os
 
+def get_logger(name: str) -> logging.Logger:
+    """モジュール用の標準ロガーを返す"""
+    return logging.getLogger(name)
+
 class StreamlitLogger:
     """Streamlit用のログ管理クラス"""
     
@@ -0,0 +1,118 @@
+"""Coalescing of identical requests that are in flight at the same time.
+
+Several Streamlit sessions, or a batch containing the same file twice, can
+issue the same embedding or completion request concurrently.  With
+:func:`coalesce` only the first caller (the leader) sends it; callers with
+the same key that arrive before it finishes wait for the leader's result,
+and all of them receive the same value or the same exception.  Once the
+request completes its key is forgotten, so later callers start afresh
+(typically hitting a cache the leader filled).
+
+The shared result is a :class:`concurrent.futures.Future`, which callers on
+any event loop or thread can await, so coroutines started by the blocking
+LLM API (on the :mod:`llm_client.async_client` background loop) and
+coroutines on an application's own loop coalesce with each other.  A
+waiter that is cancelled stops waiting without cancelling the request for
+the others.  Results are shared objects and must not be mutated.
+
+:meth:`SingleFlight.do_sync` does the same for blocking functions called
+from several threads; the extraction cache uses it so that concurrent
+extractions of one file parse it once.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import threading
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Runs at most one request per key at a time and shares its outcome."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, concurrent.futures.Future] = {}
+        self._counters = {"calls": 0, "coalesced": 0}
+
+    def _join(self, key: Hashable):
+        """Return the shared future of ``key`` and whether the caller leads it."""
+
+        with self._lock:
+            self._counters["calls"] += 1
+            shared = self._calls.get(key)
+            leader = shared is None
+            if leader:
+                shared = self._calls[key] = concurrent.futures.Future()
+            else:
+                self._counters["coalesced"] += 1
+        return shared, leader
+
+    def _forget(self, key: Hashable, shared: concurrent.futures.Future) -> None:
+        with self._lock:
+            if self._calls.get(key) is shared:
+                del self._calls[key]
+
+    async def do(self, key: Hashable, request: Callable[[], Awaitable[T]]) -> T:
+        """Return the result of ``request()``, sharing it with concurrent callers of ``key``."""
+
+        shared, leader = self._join(key)
+        if leader:
+            task = asyncio.ensure_future(request())
+            task.add_done_callback(partial(self._settle, key, shared))
+        return await asyncio.shield(asyncio.wrap_future(shared))
+
+    def do_sync(self, key: Hashable, request: Callable[[], T]) -> T:
+        """Blocking :meth:`do` for a plain function, run in the leader's thread.
+
+        Callers of the same key in other threads block until the leader
+        returns or raises.
+        """
+
+        shared, leader = self._join(key)
+        if not leader:
+            return shared.result()
+        try:
+            result = request()
+        except BaseException as e:
+            self._forget(key, shared)
+            shared.set_exception(e)
+            raise
+        self._forget(key, shared)
+        shared.set_result(result)
+        return result
+
+    def _settle(self, key: Hashable, shared: concurrent.futures.Future, task: asyncio.Future) -> None:
+        self._forget(key, shared)
+        if task.cancelled():
+            # Only happens when the leader's event loop shuts down mid-request.
+            shared.set_exception(asyncio.CancelledError())
+        elif task.exception() is not None:
+            shared.set_exception(task.exception())
+        else:
+            shared.set_result(task.result())
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of calls, how many were coalesced and the keys in flight."""
+
+        with self._lock:
+            return dict(self._counters, in_flight=len(self._calls))
+
+
+_flights = SingleFlight()
+
+
+async def coalesce(key: Hashable, request: Callable[[], Awaitable[T]]) -> T:
+    """:meth:`SingleFlight.do` on the process-wide instance used by :mod:`llm_client`."""
+
+    return await _flights.do(key, request)
+
+
+def coalescing_stats() -> Dict[str, Any]:
+    """Return :meth:`SingleFlight.stats` of the process-wide instance."""
+
+    return _flights.stats()
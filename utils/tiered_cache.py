@@ -0,0 +1,172 @@
+"""Storage tiers shared by the project's caches.
+
+:class:`TieredCache` is the base of the embedding, completion and extraction
+caches.  It provides
+
+* an in-process LRU bounded by the size of its values (disabled when
+  ``max_memory_bytes`` is 0),
+* an optional SQLite table on disk, in WAL mode so several processes can
+  share it, and
+* hit/miss counters behind :meth:`~TieredCache.stats`.
+
+Subclasses define the table, the counters and how values are read and
+written.  :class:`ProcessWide` holds the lazily created instance of a cache
+that a whole process shares.  Disk tiers are opt-in: :func:`disk_cache_path`
+finds their file in the configuration.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+C = TypeVar("C")
+
+# Directory of the LLM caches' SQLite files; unset keeps them off disk.
+CACHE_DIR_VARIABLE = "LLM_CACHE_DIR"
+
+
+def open_database(path: Optional[str], schema: str) -> sqlite3.Connection:
+    """Open the SQLite file ``path`` (``None``: an in-memory database) and apply ``schema``."""
+
+    if path:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path or ":memory:", timeout=30, isolation_level=None, check_same_thread=False)
+    if path:
+        conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(schema)
+    return conn
+
+
+def disk_cache_path(path_variable: str, filename: str) -> Optional[str]:
+    """Return the SQLite file of an opt-in disk tier, or ``None`` when it is off.
+
+    The environment variable ``path_variable`` names the file itself (an
+    empty value turns the disk tier off); otherwise the file is
+    ``filename`` in the ``LLM_CACHE_DIR`` directory.  With neither set the
+    cache stays in memory: its entries are derived from document content,
+    which is only written to disk where that was asked for.
+    """
+
+    path = os.getenv(path_variable)
+    if path is None:
+        directory = os.getenv(CACHE_DIR_VARIABLE)
+        path = os.path.join(directory, filename) if directory else None
+    return os.path.abspath(os.path.expanduser(path)) if path else None
+
+
+class TieredCache:
+    """Memory LRU in front of an optional SQLite table.
+
+    ``path`` is the SQLite file.  Without one there is no disk tier, unless
+    ``memory_database`` is set, in which case the table lives in an
+    in-memory SQLite database.  Every method taking the lock is
+    thread-safe; the ``_memory_*`` helpers expect the caller to hold it.
+    """
+
+    table = ""
+    schema = ""
+    memory_database = False
+    counters: Tuple[str, ...] = ("memory_hits", "disk_hits", "misses")
+    hit_counters: Tuple[str, ...] = ("memory_hits", "disk_hits")
+
+    def __init__(self, path: Optional[str] = None, max_memory_bytes: int = 0) -> None:
+        self.path = path
+        self.max_memory_bytes = max_memory_bytes
+        self._memory: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(self.counters, 0)
+        self._conn = open_database(path, self.schema) if path or self.memory_database else None
+
+    @staticmethod
+    def sizeof(value: Any) -> int:
+        """Bytes that ``value`` counts against ``max_memory_bytes``."""
+
+        return sys.getsizeof(value)
+
+    # -- memory tier -----------------------------------------------------
+
+    def _memory_get(self, key: Hashable) -> Any:
+        value = self._memory.get(key)
+        if value is not None:
+            self._memory.move_to_end(key)
+            self._counters["memory_hits"] += 1
+        return value
+
+    def _memory_put(self, key: Hashable, value: Any) -> None:
+        if not self.max_memory_bytes:
+            return
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        self._memory[key] = value
+        self._memory_bytes += self.sizeof(value)
+        while self._memory_bytes > self.max_memory_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= self.sizeof(evicted)
+
+    # -- bookkeeping -----------------------------------------------------
+
+    def _table_stats(self) -> Dict[str, Any]:
+        """Extra figures for :meth:`stats`; called with the lock held."""
+
+        return {}
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the counters, the hit rate and the size of the memory tier."""
+
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_bytes
+            stats.update(self._table_stats())
+        hits = sum(stats[name] for name in self.hit_counters)
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = hits / lookups if lookups else 0.0
+        return stats
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            for name in self._counters:
+                self._counters[name] = 0
+
+    def clear(self) -> None:
+        """Drop every cached entry from both tiers."""
+
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            if self._conn is not None:
+                self._conn.execute(f"DELETE FROM {self.table}")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class ProcessWide(Generic[C]):
+    """The instance of a cache shared by the whole process, created on first use.
+
+    Assigning :attr:`instance` replaces it (tests use this to install a
+    private cache).
+    """
+
+    def __init__(self, create: Callable[[], C]) -> None:
+        self._create = create
+        self._lock = threading.Lock()
+        self.instance: Optional[C] = None
+
+    def get(self) -> C:
+        with self._lock:
+            if self.instance is None:
+                self.instance = self._create()
+            return self.instance
@@ -0,0 +1,175 @@
+"""Approximate nearest-neighbour search with an IVF-flat index.
+
+The index partitions the normalised embeddings into ``nlist`` cells whose
+centroids are trained with spherical k-means in NumPy.  A query only scores
+the rows stored in its ``nprobe`` closest cells, which trades a little recall
+for a large reduction in work once a collection holds many documents.
+
+Rows are assigned to cells incrementally as they are added; until enough rows
+exist to train the centroids, collections fall back to exact search.  Use
+:func:`recall_report` to choose ``nprobe`` for a given corpus.
+"""
+
+from __future__ import annotations
+
+import time
+from array import array
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from vector_db_manager.collection import normalize_rows
+
+
+def train_centroids(vectors: np.ndarray, nlist: int, iterations: int = 20, seed: int = 0) -> np.ndarray:
+    """Return ``nlist`` unit-norm centroids fitted to ``vectors`` by spherical k-means."""
+
+    rng = np.random.default_rng(seed)
+    nlist = min(nlist, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        counts = np.bincount(assignment, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty cells with random rows so every list stays useful.
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file index over the rows of a collection.
+
+    ``nlist`` defaults to roughly ``sqrt(n)`` for the ``n`` rows present when
+    the index is trained.  Filtered queries whose filter selects at most
+    ``prefilter_rows`` rows skip the index and score those rows exactly;
+    larger filters are applied to the index candidates afterwards.
+    """
+
+    def __init__(
+        self,
+        nlist: Optional[int] = None,
+        nprobe: int = 8,
+        min_train_rows: int = 1024,
+        prefilter_rows: int = 2048,
+        seed: int = 0,
+    ) -> None:
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_rows = min_train_rows
+        self.prefilter_rows = prefilter_rows
+        self.seed = seed
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget the centroids and all cell assignments."""
+
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: List[array] = []
+        self._indexed = 0
+        self._trained_rows = 0
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def stale(self, total: int) -> bool:
+        """Whether :meth:`update` has work to do for a collection of ``total`` rows."""
+
+        if not self.trained:
+            return total >= self.min_train_rows
+        return self._indexed < total or total > 4 * self._trained_rows
+
+    def update(self, collection) -> None:
+        """Assign rows added to ``collection`` since the last call.
+
+        Trains the centroids once ``min_train_rows`` rows exist and retrains
+        from scratch when the collection has grown fourfold since training.
+        """
+
+        total = collection._row_count()
+        if not self.trained or total > 4 * self._trained_rows:
+            if total < self.min_train_rows:
+                return
+            vectors = collection._rows_block(0, total)
+            nlist = self.nlist or max(int(np.sqrt(total)), 1)
+            self.centroids = train_centroids(vectors, nlist, seed=self.seed)
+            self._lists = [array("q") for _ in range(len(self.centroids))]
+            self._indexed = 0
+            self._trained_rows = total
+        if self._indexed >= total:
+            return
+
+        vectors = collection._rows_block(self._indexed, total)
+        assignment = np.argmax(vectors @ self.centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        cells, starts = np.unique(assignment[order], return_index=True)
+        bounds = np.append(starts, len(order))
+        for cell, lo, hi in zip(cells, bounds[:-1], bounds[1:]):
+            self._lists[cell].extend((order[lo:hi] + self._indexed).tolist())
+        self._indexed = total
+
+    def candidates(self, queries: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        """Return the sorted rows stored in the cells closest to any of ``queries``."""
+
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        cell_scores = queries @ self.centroids.T
+        probed = np.unique(np.argpartition(-cell_scores, nprobe - 1, axis=1)[:, :nprobe])
+        parts = [np.frombuffer(self._lists[cell], dtype=np.int64) for cell in probed if len(self._lists[cell])]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(parts))
+
+    def select_rows(
+        self, queries: np.ndarray, rows: Optional[np.ndarray], n_results: int, nprobe: Optional[int] = None
+    ) -> Optional[np.ndarray]:
+        """Narrow the filter result ``rows`` (``None`` for all) to ANN candidates.
+
+        Small filters are returned unchanged (pre-filtering); otherwise the
+        probed candidates are intersected with the filter (post-filtering).
+        When that leaves fewer than ``n_results`` rows, ``rows`` is returned
+        so the caller falls back to an exact search.
+        """
+
+        if not self.trained or (rows is not None and len(rows) <= self.prefilter_rows):
+            return rows
+        candidates = self.candidates(queries, nprobe)
+        if rows is not None:
+            candidates = np.intersect1d(candidates, rows, assume_unique=True)
+        return candidates if len(candidates) >= n_results else rows
+
+
+def recall_report(
+    collection,
+    queries,
+    top_k: int = 10,
+    nprobes=(1, 2, 4, 8, 16, 32),
+    where: Optional[Dict] = None,
+) -> List[Dict[str, float]]:
+    """Measure recall@``top_k`` and latency of ANN search against exact search.
+
+    Returns one entry per ``nprobe`` value with the mean recall and the mean
+    per-query latency in milliseconds for both approximate and exact search.
+    """
+
+    queries = np.asarray(queries, dtype=np.float32)
+
+    def timed(**kwargs):
+        started = time.perf_counter()
+        ids = [collection.query([query], n_results=top_k, where=where, **kwargs)["ids"][0] for query in queries]
+        return ids, (time.perf_counter() - started) * 1000 / len(queries)
+
+    exact_ids, exact_ms = timed(exact=True)
+    report = []
+    for nprobe in nprobes:
+        approx_ids, approx_ms = timed(nprobe=nprobe)
+        recall = np.mean(
+            [len(set(a) & set(e)) / max(len(e), 1) for a, e in zip(approx_ids, exact_ids)]
+        )
+        report.append(
+            {"nprobe": nprobe, "recall": float(recall), "latency_ms": approx_ms, "exact_latency_ms": exact_ms}
+        )
+    return report
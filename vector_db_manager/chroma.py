@@ -1,84 +1,470 @@
-"""Light‑weight in-memory vector store used for tests.
+"""Light‑weight vector store used in place of ChromaDB.
 
 This module replaces the original ChromaDB dependent implementation with a
-minimal in-memory substitute.  It provides a very small subset of the API used
+minimal substitute.  It provides a very small subset of the API used
 by the application and the accompanying tests:
 
 ``get_or_create_collection`` – obtain a named collection (creating it if it
 doesn't exist),
 ``store_document_chunks`` – persist chunks with embeddings and metadata, and
-``search_similar_chunks`` – return stored documents, optionally filtered by the
-``document_id`` metadata.
+``search_similar_chunks`` – return the stored documents most similar to a
+query embedding, optionally restricted by a metadata ``where`` filter, and
+``search_similar_chunks_batch`` – the same for many query embeddings at once.
 
-Similarity search is not actually performed; results are simply returned in the
-order they were inserted, which is sufficient for unit testing behaviour around
-filtering.
+Collections live in memory unless ``CHROMA_DB_PATH`` is set, in which case
+:class:`~vector_db_manager.persistent.PersistentCollection` keeps them on disk.
+
+Embeddings are L2-normalised on insertion and kept in one contiguous
+(optionally quantised) matrix, so cosine similarity for a query is a single matrix-vector product
+followed by an ``argpartition`` top-k selection.  ``where`` filters are
+answered from a :class:`~vector_db_manager.metadata_index.MetadataIndex`, so
+only the selected rows take part in the similarity search.
+
+Collections may be shared between threads: queries run concurrently under a
+shared lock while writes take it exclusively (see
+:mod:`vector_db_manager.locking`), and per-tenant namespaces keep sessions
+apart entirely.  :func:`drop_tenant` closes a tenant's collections and
+deletes its files; a :class:`TenantLease` does so when it is discarded, and
+:func:`sweep_orphaned_tenants` removes the directories of leased tenants
+whose process died before it could.
 """
 
 from __future__ import annotations
 
+import os
+import re
+import shutil
+import threading
 import uuid
-from dataclasses import dataclass, field
-from typing import Dict, List, Optional
+import weakref
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
 
+from vector_db_manager.collection import (
+    INITIAL_CAPACITY,
+    BaseCollection,
+    as_embedding_block,
+    normalize_rows,
+)
+from vector_db_manager.lexical import CharNgramIndex
+from vector_db_manager.locking import ReadWriteLock
+from vector_db_manager.metadata_index import MetadataIndex
+from vector_db_manager.persistent import PersistentCollection
+from vector_db_manager.storage import create_matrix
 
-@dataclass
-class _Collection:
-    """Simple container emulating a ChromaDB collection."""
 
-    documents: List[str] = field(default_factory=list)
-    embeddings: List[List[float]] = field(default_factory=list)
-    metadatas: List[Dict[str, str]] = field(default_factory=list)
+class _Collection(BaseCollection):
+    """Simple container emulating a ChromaDB collection.
 
-    def add(self, *, embeddings, documents, metadatas, ids):  # pragma: no cover - trivial
-        self.embeddings.extend(embeddings)
-        self.documents.extend(documents)
-        self.metadatas.extend(metadatas)
+    ``documents``, ``metadatas`` and ``ids`` are plain lists aligned with the
+    rows of a pre-allocated embedding matrix.  Only the first ``_count`` rows
+    of the matrix are valid; deleted rows stay in place, flagged in a
+    tombstone mask, until :meth:`compact` rewrites the matrix.
 
-    def query(self, query_embeddings, n_results: int = 5, where: Optional[Dict] = None):
-        if where and "document_id" in where:
-            docs = [
-                doc
-                for doc, meta in zip(self.documents, self.metadatas)
-                if meta.get("document_id") == where["document_id"]
-            ]
-        else:
-            docs = list(self.documents)
-        return {"documents": [docs[:n_results]]}
+    ``storage`` selects how embeddings are held in memory (``"float32"``,
+    ``"float16"`` or ``"int8"``, see :mod:`vector_db_manager.storage`).  With
+    ``rescore`` an int8 collection re-ranks ``oversample`` times more
+    candidates than requested against a float16 copy of the embeddings.
 
+    ``add`` writes new rows past ``_count`` and indexes their metadata
+    before extending any list or advancing ``_count``, so the rows of an
+    append become visible together or, if it fails, leave nothing behind.
+    The ANN and lexical indexes are derived from the published rows.
+    """
 
-_collections: Dict[str, _Collection] = {}
+    def __init__(self, storage: str = "float32", rescore: bool = False, oversample: int = 4) -> None:
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict[str, str]] = []
+        self._store = create_matrix(storage, rescore)
+        self._oversample = oversample if rescore else 1
+        self._deleted = np.zeros(0, dtype=bool)
+        self._count = 0
+        self._dead = 0
+        self._index = MetadataIndex()
+        self.lexical = CharNgramIndex()
+        self._lock = ReadWriteLock()
 
+    @property
+    def dimension(self) -> Optional[int]:
+        """Embedding dimensionality, or ``None`` before the first insert."""
 
-def get_or_create_collection(name: str = "iso_documents") -> _Collection:
-    """Return a collection with ``name``, creating it on first use."""
+        return self._store.dimension
 
-    return _collections.setdefault(name, _Collection())
+    @property
+    def embeddings(self) -> np.ndarray:
+        """The normalised embeddings currently stored, including deleted rows, as float32."""
 
+        return self._store.rows(0, self._count)
 
-def store_document_chunks(collection: _Collection, chunks: List[str], embeddings, doc_id: str) -> None:
-    """Store ``chunks`` and ``embeddings`` within ``collection``."""
+    def count(self) -> int:
+        return self._count - self._dead
 
-    if not chunks or not embeddings:
-        return
+    def _row_count(self) -> int:
+        return self._count
+
+    def _reserve(self, extra: int, dimension: int) -> None:
+        """Ensure room for ``extra`` more rows, doubling capacity as needed."""
+
+        if self.dimension is not None and dimension != self.dimension:
+            raise ValueError(
+                f"Embedding dimension {dimension} does not match collection dimension {self.dimension}"
+            )
+        required = self._count + extra
+        capacity = self._store.capacity
+        if required <= capacity:
+            return
+        new_capacity = max(capacity, INITIAL_CAPACITY)
+        while new_capacity < required:
+            new_capacity *= 2
+        deleted = np.zeros(new_capacity, dtype=bool)
+        deleted[: self._count] = self._deleted[: self._count]
+        self._store.resize(new_capacity, dimension, self._count)
+        self._deleted = deleted
+
+    def add(self, *, embeddings, documents, metadatas, ids):
+        block = as_embedding_block(embeddings, documents, metadatas, ids)
+        if not len(block):
+            return
+        block = normalize_rows(block)
+
+        with self._lock.write():
+            start = self._count
+            self._reserve(len(block), block.shape[1])
+            # Rows past ``_count`` are invisible, and the metadata index only
+            # changes if indexing succeeds, so a failure here leaves no trace.
+            self._store.write(start, block)
+            self._index.add(start, metadatas)
+            # Nothing below can fail; publish the rows once every array holds them.
+            self.ids.extend(ids)
+            self.documents.extend(documents)
+            self.metadatas.extend(metadatas)
+            self._count = start + len(block)
+            self._after_add()
+
+    def delete(self, where: Dict) -> int:
+        """Tombstone the rows matching ``where`` and return how many were removed."""
+
+        with self._lock.write():
+            rows = self._index.select(where)
+            rows = rows[~self._deleted[rows]]
+            self._deleted[rows] = True
+            self._dead += len(rows)
+        if len(rows):
+            self._maybe_compact()
+        return len(rows)
+
+    def compact(self) -> None:
+        """Rewrite the embedding matrix and metadata without deleted rows."""
+
+        with self._lock.write():
+            if not self._dead:
+                return
+            live = np.flatnonzero(~self._deleted[: self._count])
+            capacity = INITIAL_CAPACITY
+            while capacity < len(live):
+                capacity *= 2
+            store = self._store.compacted(live, capacity)
+            metadatas = [self.metadatas[i] for i in live]
+            index = MetadataIndex()
+            index.add(0, metadatas)
+
+            self.ids = [self.ids[i] for i in live]
+            self.documents = [self.documents[i] for i in live]
+            self.metadatas = metadatas
+            self._store = store
+            self._deleted = np.zeros(capacity, dtype=bool)
+            self._count = len(live)
+            self._dead = 0
+            self._index = index
+            self._after_compact(live)
+
+    def _restore(self, block: np.ndarray, ids: List[str], documents, metadatas: List[Dict]) -> None:
+        """Fill an empty collection with already normalised rows from a snapshot.
+
+        ``documents`` may be any sequence supporting ``extend`` and slice
+        deletion.  The lexical index is left to be built by the first
+        lexical query.
+        """
+
+        with self._lock.write():
+            if self._count:
+                raise ValueError("Snapshots can only be restored into an empty collection")
+            self._store.load(block)
+            self._deleted = np.zeros(len(block), dtype=bool)
+            self.ids = ids
+            self.documents = documents
+            self.metadatas = metadatas
+            self._index.add(0, metadatas)
+            self.lexical = None
+            self._count = len(block)
+
+    def _dead_rows(self) -> Optional[np.ndarray]:
+        return self._deleted[: self._count] if self._dead else None
+
+    def _rows_block(self, start: int, stop: int) -> np.ndarray:
+        return self._store.rows(start, stop)
+
+    def _texts(self, start: int, stop: int) -> List[Tuple[int, str]]:
+        return list(enumerate(self.documents[start:stop], start))
+
+    def _filter_rows(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        if not where:
+            return None
+        return self._index.select(where)
+
+    def _scores(self, queries: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        return self._store.scores(queries, self._count, rows)
+
+    def _exact_scores(self, query: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        return self._store.exact(rows) @ query
+
+    def _fetch(self, rows) -> Tuple[List[str], List[str], List[Dict]]:
+        return (
+            [self.ids[i] for i in rows],
+            [self.documents[i] for i in rows],
+            [self.metadatas[i] for i in rows],
+        )
+
+
+_collections: Dict[object, BaseCollection] = {}
+_collections_lock = threading.Lock()
+
+# TenantLease が払い出すテナント名（uuid4 の16進表記）
+_LEASED_TENANT = re.compile(r"[0-9a-f]{32}")
+
+
+def _check_path_component(kind: str, value: str) -> None:
+    if value in ("", ".", "..") or os.path.basename(value) != value:
+        raise ValueError(f"Invalid {kind} name: {value!r}")
+
+
+def get_or_create_collection(name: str = "iso_documents", tenant: Optional[str] = None) -> BaseCollection:
+    """Return a collection with ``name``, creating it on first use.
+
+    When the ``CHROMA_DB_PATH`` environment variable is set the collection is
+    stored on disk below that directory and survives restarts; otherwise it
+    only lives in this process.  Setting ``VECTOR_INDEX=ivf`` enables an
+    approximate nearest-neighbour index on newly opened collections, and
+    ``VECTOR_STORAGE`` (``float32``, ``float16``, ``int8`` or
+    ``int8+rescore``) selects how in-memory collections hold embeddings.
+
+    ``tenant`` selects a separate namespace: collections of different tenants
+    share neither rows nor locks, so sessions working in their own tenant
+    never block or see each other.  On disk a tenant's collections live in
+    ``tenants/<tenant>/`` below ``CHROMA_DB_PATH``.
+    """
+
+    key = _collection_key(name, tenant)
+    collection = _collections.get(key)
+    if collection is not None:
+        return collection
+    with _collections_lock:
+        collection = _collections.get(key)
+        if collection is None:
+            collection = PersistentCollection(key) if isinstance(key, str) else _memory_collection()
+            if os.getenv("VECTOR_INDEX", "").lower() == "ivf":
+                collection.enable_ann()
+            _collections[key] = collection
+    return collection
+
+
+def drop_tenant(tenant: str, delete_files: bool = True) -> int:
+    """Close and forget every open collection of ``tenant``.
+
+    With ``delete_files`` the tenant's directory below ``CHROMA_DB_PATH``
+    is removed as well.  Returns the number of collections closed.
+    """
+
+    _check_path_component("tenant", tenant)
+    db_path = os.getenv("CHROMA_DB_PATH")
+    tenant_root = os.path.join(os.path.abspath(db_path), "tenants", tenant) if db_path else None
+
+    def owned(key) -> bool:
+        if isinstance(key, tuple):
+            return key[0] == tenant
+        return tenant_root is not None and os.path.dirname(key) == tenant_root
+
+    with _collections_lock:
+        dropped = [_collections.pop(key) for key in list(_collections) if owned(key)]
+    for collection in dropped:
+        collection.close()
+    if delete_files and tenant_root:
+        shutil.rmtree(tenant_root, ignore_errors=True)
+    return len(dropped)
+
+
+class TenantLease:
+    """Holds a throwaway tenant and drops it once the lease is released.
+
+    The tenant is dropped (see :func:`drop_tenant`) when :meth:`release` is
+    called, when the lease is garbage collected or at interpreter exit,
+    whichever comes first.  Keeping the lease in per-session state thus
+    frees a session's collections when the session is discarded.  This
+    suits in-memory collections; on disk a lease's directory outlives a
+    crashed process until :func:`sweep_orphaned_tenants` removes it.
+    """
+
+    def __init__(self, tenant: Optional[str] = None) -> None:
+        self.tenant = tenant or uuid.uuid4().hex
+        self._finalizer = weakref.finalize(self, drop_tenant, self.tenant)
+
+    def release(self) -> None:
+        self._finalizer()
+
+
+def sweep_orphaned_tenants() -> List[str]:
+    """Delete the directories that leased tenants left below ``CHROMA_DB_PATH``.
+
+    Only tenants named like those of :class:`TenantLease` and without an
+    open collection in this process are removed, so named tenants are
+    kept.  Meant to be called once at startup.  Returns the removed tenants.
+    """
+
+    db_path = os.getenv("CHROMA_DB_PATH")
+    if not db_path:
+        return []
+    root = os.path.join(os.path.abspath(db_path), "tenants")
+    try:
+        names = os.listdir(root)
+    except FileNotFoundError:
+        return []
+    with _collections_lock:
+        in_use = {
+            os.path.basename(os.path.dirname(key))
+            for key in _collections
+            if isinstance(key, str) and os.path.dirname(os.path.dirname(key)) == root
+        }
+    removed = []
+    for name in sorted(names):
+        if _LEASED_TENANT.fullmatch(name) and name not in in_use:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+            removed.append(name)
+    return removed
+
+
+def _memory_collection() -> _Collection:
+    """Return an empty in-memory collection using the ``VECTOR_STORAGE`` mode."""
+
+    storage = os.getenv("VECTOR_STORAGE", "float32").lower()
+    return _Collection(storage=storage.replace("+rescore", ""), rescore=storage.endswith("+rescore"))
+
+
+def _collection_key(name: str, tenant: Optional[str]):
+    """Return the registry key: a directory path on disk, else ``(tenant, name)``."""
+
+    db_path = os.getenv("CHROMA_DB_PATH")
+    if tenant is not None:
+        _check_path_component("tenant", tenant)
+    if not db_path:
+        return (tenant, name)
+    _check_path_component("collection", name)
+    root = os.path.abspath(db_path)
+    if tenant is not None:
+        root = os.path.join(root, "tenants", tenant)
+    return os.path.join(root, name)
+
+
+def _chunk_rows(chunks: List[str], doc_id: str) -> Tuple[List[Dict], List[str]]:
+    """Return the metadata and fresh ids of the rows storing ``chunks`` of ``doc_id``."""
 
     metadatas = [{"document_id": doc_id, "chunk_index": i} for i, _ in enumerate(chunks)]
     ids = [str(uuid.uuid4()) for _ in chunks]
+    return metadatas, ids
+
+
+def store_document_chunks(collection: BaseCollection, chunks: List[str], embeddings, doc_id: str) -> None:
+    """Store ``chunks`` and ``embeddings`` within ``collection``."""
+
+    if not len(chunks) or embeddings is None or not len(embeddings):
+        return
+
+    metadatas, ids = _chunk_rows(chunks, doc_id)
     collection.add(embeddings=embeddings, documents=chunks, metadatas=metadatas, ids=ids)
 
 
+def delete_document(collection: BaseCollection, doc_id: str) -> int:
+    """Remove every chunk of ``doc_id`` from ``collection``.
+
+    Returns the number of chunks removed.
+    """
+
+    return collection.delete(where=build_document_filter(doc_id))
+
+
+def upsert_document(collection: BaseCollection, doc_id: str, chunks: List[str], embeddings) -> None:
+    """Replace the chunks stored for ``doc_id`` with ``chunks``."""
+
+    if not len(chunks) or embeddings is None or not len(embeddings):
+        delete_document(collection, doc_id)
+        return
+
+    metadatas, ids = _chunk_rows(chunks, doc_id)
+    collection.upsert(
+        build_document_filter(doc_id), embeddings=embeddings, documents=chunks, metadatas=metadatas, ids=ids
+    )
+
+
 def build_document_filter(doc_id: str) -> Dict[str, str]:
     """Construct a metadata filter for ``doc_id``."""
 
     return {"document_id": doc_id}
 
 
-def search_similar_chunks(collection: _Collection, query_embedding, top_k: int = 5, where: Optional[Dict] = None):
-    """Return stored documents matching ``where`` criteria.
+def search_similar_chunks(
+    collection: BaseCollection,
+    query_embedding,
+    top_k: int = 5,
+    where: Optional[Dict] = None,
+    nprobe: Optional[int] = None,
+    query_text: Optional[str] = None,
+):
+    """Return the ``top_k`` stored documents most similar to ``query_embedding``.
 
-    No actual vector similarity is computed; this is merely a convenience for
-    unit tests that expect the API shape of a similarity search call.
+    Results are ordered by decreasing cosine similarity and restricted to rows
+    matching the ``where`` criteria.  ``nprobe`` tunes the ANN index, if any.
+    When ``query_text`` is given, the vector ranking is fused with a BM25
+    ranking over character n-grams so exact terms and clause numbers in the
+    text are not missed.
     """
 
-    return collection.query([query_embedding], n_results=top_k, where=where).get("documents", [[]])[0]
+    if query_text:
+        result = collection.hybrid_query(query_embedding, query_text, n_results=top_k, where=where, nprobe=nprobe)
+    else:
+        result = collection.query([query_embedding], n_results=top_k, where=where, nprobe=nprobe)
+    return result.get("documents", [[]])[0]
+
+
+def search_similar_chunks_batch(
+    collection: BaseCollection,
+    query_matrix,
+    top_k: int = 5,
+    where: Optional[Dict] = None,
+    return_scores: bool = False,
+):
+    """Search for many query embeddings at once with a single matrix product.
+
+    Returns a dictionary with one list per query under ``ids``, ``documents``
+    and ``scores`` (cosine similarities, best first).  With ``return_scores``
+    the exact ``(queries x chunks)`` similarity matrix over every chunk
+    matching ``where`` is added as ``score_matrix``, with the chunk ids of its
+    columns in ``score_ids``.
+    """
 
+    result = collection.query(
+        query_matrix,
+        n_results=top_k,
+        where=where,
+        exact=return_scores,
+        include_scores=return_scores,
+    )
+    batch = {
+        "ids": result["ids"],
+        "documents": result["documents"],
+        "scores": [[1.0 - distance for distance in distances] for distances in result["distances"]],
+    }
+    if return_scores:
+        batch["score_matrix"] = result["score_matrix"]
+        batch["score_ids"] = result["score_ids"]
+    return batch
@@ -0,0 +1,366 @@
+"""Storage-independent parts of the vector store collections.
+
+:class:`BaseCollection` implements ChromaDB-style ``query`` on top of three
+small hooks that each backend provides: selecting rows for a ``where``
+filter, scoring normalised queries against stored rows, and fetching the
+ids, documents and metadata of the winning rows.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Number of rows allocated for the first ``add``; capacity doubles afterwards.
+INITIAL_CAPACITY = 64
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Return ``matrix`` with every row scaled to unit L2 norm.
+
+    All-zero rows are left untouched instead of producing ``nan`` values.
+    """
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return column indices of the ``k`` highest ``scores`` per row, best first."""
+
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def as_embedding_block(embeddings, documents, metadatas, ids) -> np.ndarray:
+    """Validate an ``add`` call and return its embeddings as float32 rows."""
+
+    block = np.asarray(embeddings, dtype=np.float32)
+    if block.ndim != 2:
+        raise ValueError("embeddings must be a two-dimensional array-like")
+    if not len(block) == len(documents) == len(metadatas) == len(ids):
+        raise ValueError("embeddings, documents, metadatas and ids must have equal length")
+    return block
+
+
+class BaseCollection:
+    """Common query logic shared by the in-memory and on-disk collections.
+
+    ``ann`` optionally holds an :class:`~vector_db_manager.ann.IVFIndex` that
+    is updated after every ``add`` and consulted by ``query``.
+
+    ``lexical`` holds a :class:`~vector_db_manager.lexical.CharNgramIndex`
+    used by ``lexical_query`` and ``hybrid_query``; backends either build it
+    as rows are added or create it on first use.
+
+    Deleted rows are skipped by ``query`` until a compaction rewrites the
+    storage.  Compaction starts on a background thread once the deleted
+    fraction of rows exceeds ``compaction_threshold``.
+
+    ``_lock`` is a :class:`~vector_db_manager.locking.ReadWriteLock`: queries
+    share its read side and never modify the collection, while ``add``,
+    ``delete``, ``upsert``, compaction and index maintenance hold its write
+    side.
+    """
+
+    ann = None
+    lexical = None
+    compaction_threshold = 0.3
+    _oversample = 1
+    _compaction_thread: Optional[threading.Thread] = None
+
+    def enable_ann(self, lazy: bool = False, **options):
+        """Attach an IVF index built from ``options`` and index existing rows.
+
+        With ``lazy`` the existing rows are indexed by the next query instead.
+        """
+
+        from vector_db_manager.ann import IVFIndex
+
+        with self._lock.write():
+            self.ann = IVFIndex(**options)
+            if not lazy:
+                self.ann.update(self)
+        return self.ann
+
+    @property
+    def dimension(self) -> Optional[int]:
+        raise NotImplementedError
+
+    def count(self) -> int:
+        """Number of live (not deleted) rows."""
+
+        raise NotImplementedError
+
+    def add(self, *, embeddings, documents, metadatas, ids):
+        raise NotImplementedError
+
+    def delete(self, where: Dict) -> int:
+        raise NotImplementedError
+
+    def upsert(self, where: Dict, *, embeddings, documents, metadatas, ids) -> int:
+        """Replace the rows matching ``where`` with the given rows.
+
+        The delete and the add run under one write lock, so queries see
+        either the old rows or the new ones.  Returns the number of rows
+        removed.
+        """
+
+        with self._lock.write():
+            removed = self.delete(where)
+            self.add(embeddings=embeddings, documents=documents, metadatas=metadatas, ids=ids)
+        return removed
+
+    def compact(self) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release the resources held by the collection, which is unusable afterwards.
+
+        Waits for a running background compaction first.
+        """
+
+        thread = self._compaction_thread
+        if thread is not None:
+            thread.join()
+
+    def _row_count(self) -> int:
+        """Number of stored rows, including deleted ones awaiting compaction."""
+
+        raise NotImplementedError
+
+    def _dead_rows(self) -> Optional[np.ndarray]:
+        """Boolean tombstone mask over all rows, or ``None`` if nothing is deleted."""
+
+        raise NotImplementedError
+
+    def _maybe_compact(self) -> None:
+        """Start a background compaction once enough rows are deleted."""
+
+        total = self._row_count()
+        if not total or (total - self.count()) / total <= self.compaction_threshold:
+            return
+        with self._lock.write():
+            if self._compaction_thread is not None and self._compaction_thread.is_alive():
+                return
+            self._compaction_thread = threading.Thread(target=self.compact, name="vector-store-compaction", daemon=True)
+            self._compaction_thread.start()
+
+    def _after_compact(self, live: Optional[np.ndarray] = None) -> None:
+        """Rebuild row-keyed indexes; ``live`` maps new rows to old ones if known."""
+
+        if self.ann is not None:
+            self.ann.reset()
+            self.ann.update(self)
+        if self.lexical is not None:
+            if live is None:
+                self.lexical.reset()
+            else:
+                self.lexical.remap(live)
+
+    def _catch_up(self) -> None:
+        """Bring derived state up to date before a query.
+
+        Indexes the rows an ANN index has not seen yet; backends whose storage
+        can change outside this object also pick up those changes here.  The
+        write lock is only taken when there is work to do, so the query
+        itself only reads.
+        """
+
+        if self.ann is not None and self.ann.stale(self._row_count()):
+            with self._lock.write():
+                self.ann.update(self)
+
+    def _rows_block(self, start: int, stop: int) -> np.ndarray:
+        """Return the normalised embeddings of rows ``start`` to ``stop``."""
+
+        raise NotImplementedError
+
+    def _texts(self, start: int, stop: int) -> List[Tuple[int, str]]:
+        """Return ``(row, document)`` pairs for the live rows ``start`` to ``stop``."""
+
+        raise NotImplementedError
+
+    def _lexical_index(self):
+        """Return the lexical index, creating it and catching up on new rows."""
+
+        from vector_db_manager.lexical import CharNgramIndex
+
+        lexical = self.lexical
+        if lexical is None or lexical._indexed < self._row_count():
+            with self._lock.write():
+                if self.lexical is None:
+                    self.lexical = CharNgramIndex()
+                self.lexical.sync(self)
+                lexical = self.lexical
+        return lexical
+
+    def _after_add(self) -> None:
+        if self.ann is not None:
+            self.ann.update(self)
+        if self.lexical is not None:
+            self.lexical.sync(self)
+
+    def _filter_rows(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        """Return the sorted row indices matching ``where`` or ``None`` for all rows."""
+
+        raise NotImplementedError
+
+    def _scores(self, queries: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """Return cosine similarities of shape ``(len(queries), len(rows))``."""
+
+        raise NotImplementedError
+
+    def _exact_scores(self, query: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Return full-precision similarities of ``query`` to ``rows``.
+
+        Only called when ``_oversample`` is above one, i.e. when ``_scores``
+        is approximate and the best candidates are re-ranked.
+        """
+
+        raise NotImplementedError
+
+    def _fetch(self, rows) -> Tuple[List[str], List[str], List[Dict]]:
+        """Return ``(ids, documents, metadatas)`` for ``rows`` in the given order."""
+
+        raise NotImplementedError
+
+    def query(
+        self,
+        query_embeddings,
+        n_results: int = 5,
+        where: Optional[Dict] = None,
+        *,
+        nprobe: Optional[int] = None,
+        exact: bool = False,
+        include_scores: bool = False,
+    ):
+        """Return the ``n_results`` nearest rows for each query embedding.
+
+        The result mirrors ChromaDB's layout: every key maps to one list per
+        query.  ``distances`` are cosine distances (``1 - cosine similarity``).
+        All queries are scored with a single matrix product.  When an ANN
+        index is enabled it narrows the candidates unless ``exact`` is true;
+        ``nprobe`` overrides the index default.
+
+        With ``include_scores`` the result also holds ``score_matrix``, the
+        similarities of every query to every candidate row, and
+        ``score_ids``, the ids of those rows in column order.
+        """
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[np.newaxis, :]
+        self._catch_up()
+        with self._lock.read():
+            return self._query(queries, n_results, where, nprobe, exact, include_scores)
+
+    def _query(self, queries, n_results, where, nprobe, exact, include_scores):
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+
+        rows = self._filter_rows(where)
+        dead = self._dead_rows()
+        if dead is not None:
+            if rows is not None:
+                rows = rows[~dead[rows]]
+            elif include_scores:
+                rows = np.flatnonzero(~dead)
+        available = self.count() if rows is None else len(rows)
+        if not available or n_results <= 0:
+            for key in result:
+                result[key] = [[] for _ in range(len(queries))]
+            if include_scores:
+                result["score_matrix"] = np.empty((len(queries), 0), dtype=np.float32)
+                result["score_ids"] = []
+            return result
+        if queries.shape[1] != self.dimension:
+            raise ValueError(
+                f"Query dimension {queries.shape[1]} does not match collection dimension {self.dimension}"
+            )
+
+        queries = normalize_rows(queries)
+        if self.ann is not None and not exact:
+            rows = self.ann.select_rows(queries, rows, n_results, nprobe)
+            if rows is not None and dead is not None:
+                rows = rows[~dead[rows]]
+            available = self.count() if rows is None else len(rows)
+        scores = self._scores(queries, rows)
+        if rows is None and dead is not None:
+            scores[:, dead] = -np.inf
+        if include_scores:
+            result["score_matrix"] = scores
+            result["score_ids"] = self._fetch(np.arange(self._row_count()) if rows is None else rows)[0]
+        n_results = min(n_results, available)
+        best = top_k(scores, min(n_results * self._oversample, available))
+        for query, query_scores, positions in zip(queries, scores, best):
+            selected = positions if rows is None else rows[positions]
+            similarities = query_scores[positions]
+            if self._oversample > 1:
+                similarities = self._exact_scores(query, selected)
+                order = np.argsort(-similarities, kind="stable")[:n_results]
+                selected, similarities = selected[order], similarities[order]
+            ids, documents, metadatas = self._fetch(selected)
+            result["ids"].append(ids)
+            result["documents"].append(documents)
+            result["metadatas"].append(metadatas)
+            result["distances"].append((1.0 - similarities).tolist())
+        return result
+
+    def lexical_query(self, query_text: str, n_results: int = 5, where: Optional[Dict] = None):
+        """Return the ``n_results`` best BM25 matches for ``query_text``.
+
+        The result has the same layout as ``query`` with ``scores`` (BM25)
+        in place of ``distances``.
+        """
+
+        self._catch_up()
+        self._lexical_index()
+        with self._lock.read():
+            return self._lexical_query(query_text, n_results, where)
+
+    def _lexical_query(self, query_text, n_results, where):
+        rows = self._filter_rows(where)
+        hits, scores = self.lexical.search(query_text, n_results, rows, self._dead_rows())
+        ids, documents, metadatas = self._fetch(hits)
+        return {"ids": [ids], "documents": [documents], "metadatas": [metadatas], "scores": [scores.tolist()]}
+
+    def hybrid_query(
+        self,
+        query_embedding,
+        query_text: str,
+        n_results: int = 5,
+        where: Optional[Dict] = None,
+        nprobe: Optional[int] = None,
+    ):
+        """Fuse vector and BM25 rankings with reciprocal-rank fusion.
+
+        Each ranking contributes ``max(4 * n_results, 20)`` candidates.
+        """
+
+        from vector_db_manager.lexical import reciprocal_rank_fusion
+
+        depth = max(4 * n_results, 20)
+        queries = np.asarray(query_embedding, dtype=np.float32)[np.newaxis, :]
+        self._catch_up()
+        self._lexical_index()
+        with self._lock.read():
+            # One read lock for both rankings, so they see the same rows.
+            vector = self._query(queries, depth, where, nprobe, False, False)
+            lexical = self._lexical_query(query_text, depth, where)
+
+        records = {}
+        for result in (vector, lexical):
+            records.update(zip(result["ids"][0], zip(result["documents"][0], result["metadatas"][0])))
+        fused = reciprocal_rank_fusion([vector["ids"][0], lexical["ids"][0]])[:n_results]
+        return {
+            "ids": [fused],
+            "documents": [[records[chunk_id][0] for chunk_id in fused]],
+            "metadatas": [[records[chunk_id][1] for chunk_id in fused]],
+        }
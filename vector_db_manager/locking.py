@@ -0,0 +1,101 @@
+"""Reader/writer lock guarding a collection.
+
+Queries only read the stored rows, so any number of them may run at once;
+``add``, ``delete`` and compaction need the collection to themselves.  The
+lock prefers writers: once a writer is waiting, new readers queue behind it
+so a steady stream of queries cannot starve an upload.
+
+Both sides are reentrant for the thread that holds them, and the writing
+thread may also take the read side (``upsert`` deletes and adds
+under one write lock; ``hybrid_query`` runs two queries under one read
+lock).  Upgrading a read lock to a write lock would deadlock against a
+second reader doing the same and raises :class:`RuntimeError` instead.
+"""
+
+from __future__ import annotations
+
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+class ReadWriteLock:
+    """Writer-preferring reader/writer lock with per-thread reentrancy."""
+
+    def __init__(self) -> None:
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer: Optional[int] = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+        self._local = threading.local()
+
+    def _read_depth(self) -> int:
+        return getattr(self._local, "depth", 0)
+
+    def acquire_read(self) -> None:
+        me = threading.get_ident()
+        depth = self._read_depth()
+        if depth or self._writer == me:
+            # Nested read: never wait behind queued writers, or we would deadlock on ourselves.
+            self._local.depth = depth + 1
+            return
+        with self._condition:
+            while self._writer is not None or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        self._local.depth = 1
+
+    def release_read(self) -> None:
+        depth = self._read_depth() - 1
+        self._local.depth = depth
+        if depth or self._writer == threading.get_ident():
+            return
+        with self._condition:
+            self._readers -= 1
+            if not self._readers:
+                self._condition.notify_all()
+
+    def acquire_write(self) -> None:
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            if self._read_depth():
+                raise RuntimeError("Cannot acquire the write lock while holding the read lock")
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def release_write(self) -> None:
+        with self._condition:
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                self._writer = None
+                self._condition.notify_all()
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        """Hold the lock shared with other readers."""
+
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """Hold the lock exclusively."""
+
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
@@ -0,0 +1,87 @@
+"""Inverted index over chunk metadata used to evaluate ``where`` filters.
+
+Every ``(key, value)`` pair seen in the stored metadata maps to the rows that
+carry it.  Rows are appended in increasing order, so each postings list is
+already sorted and filters reduce to NumPy set operations instead of a scan
+over every stored metadata dictionary.
+
+Supported filter syntax follows ChromaDB::
+
+    {"document_id": "doc_1"}
+    {"document_id": {"$eq": "doc_1"}}
+    {"document_id": {"$in": ["doc_1", "doc_2"]}}
+    {"$and": [{"document_id": "doc_1"}, {"chunk_index": 0}]}
+"""
+
+from __future__ import annotations
+
+from array import array
+from typing import Any, Dict, Iterable, List, Mapping
+
+import numpy as np
+
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+class MetadataIndex:
+    """Map metadata key/value pairs to sorted arrays of row indices."""
+
+    def __init__(self) -> None:
+        self._postings: Dict[str, Dict[Any, array]] = {}
+
+    def add(self, start: int, metadatas: Iterable[Mapping[str, Any]]) -> None:
+        """Index ``metadatas`` as consecutive rows beginning at ``start``.
+
+        The new postings are collected before any is merged, so a value that
+        cannot be indexed (e.g. an unhashable one) leaves the index as it was.
+        """
+
+        added: Dict[str, Dict[Any, List[int]]] = {}
+        for row, metadata in enumerate(metadatas, start):
+            for key, value in metadata.items():
+                added.setdefault(key, {}).setdefault(value, []).append(row)
+        for key, values in added.items():
+            postings = self._postings.setdefault(key, {})
+            for value, rows in values.items():
+                postings.setdefault(value, array("q")).extend(rows)
+
+    def rows_for(self, key: str, value: Any) -> np.ndarray:
+        """Return the sorted rows whose metadata has ``key == value``."""
+
+        postings = self._postings.get(key, {}).get(value)
+        if postings is None:
+            return _EMPTY
+        # Copy so the ``array`` can keep growing; exported buffers block resizing.
+        return np.frombuffer(postings, dtype=np.int64).copy()
+
+    def select(self, where: Mapping[str, Any]) -> np.ndarray:
+        """Return the sorted rows matching the ``where`` filter."""
+
+        selections = []
+        for key, condition in where.items():
+            if key == "$and":
+                selections.extend(self.select(clause) for clause in condition)
+            elif key.startswith("$"):
+                raise ValueError(f"Unsupported filter operator: {key}")
+            else:
+                selections.append(self._match(key, condition))
+
+        if not selections:
+            raise ValueError("Empty metadata filter")
+        rows = selections[0]
+        for other in selections[1:]:
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
+
+    def _match(self, key: str, condition: Any) -> np.ndarray:
+        if not isinstance(condition, Mapping):
+            return self.rows_for(key, condition)
+        if len(condition) != 1:
+            raise ValueError(f"Filter for {key!r} must contain exactly one operator")
+        operator, operand = next(iter(condition.items()))
+        if operator == "$eq":
+            return self.rows_for(key, operand)
+        if operator == "$in":
+            parts = [self.rows_for(key, value) for value in operand]
+            return np.unique(np.concatenate(parts)) if parts else _EMPTY
+        raise ValueError(f"Unsupported filter operator: {operator}")
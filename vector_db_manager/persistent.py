@@ -0,0 +1,415 @@
+"""On-disk vector collection used when ``CHROMA_DB_PATH`` is configured.
+
+Layout of a collection directory::
+
+    store.sqlite3       chunk ids, documents, metadata and the segment table
+    seg_000001.npy      append-only float32 embedding segments
+
+Every ``add`` writes its normalised embeddings to a new ``.npy`` segment and
+records the chunks in SQLite within a single transaction.  Segments are
+opened with ``np.load(mmap_mode="r")``, so opening a collection only reads
+the segment table regardless of corpus size, and the operating system's page
+cache is shared by every process reading the same store.  SQLite runs in WAL
+mode: several processes can read while one writes, and readers pick up
+segments committed elsewhere on their next query (``PRAGMA data_version``
+tells them cheaply whether anything changed).
+
+Deleting chunks removes their documents and metadata immediately and records
+the row numbers in the ``tombstones`` table; :meth:`PersistentCollection.compact`
+later rewrites the segments without those rows and renumbers the rest.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from vector_db_manager.collection import BaseCollection, as_embedding_block, normalize_rows
+from vector_db_manager.locking import ReadWriteLock
+from vector_db_manager.metadata_index import MetadataIndex
+
+logger = logging.getLogger(__name__)
+
+# Once a collection has more segments than this, the newest half is merged.
+MAX_SEGMENTS = 64
+
+# Rows fetched per ``SELECT ... IN`` statement; stays below SQLite's bound-parameter limit.
+_FETCH_BATCH = 10000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    start INTEGER NOT NULL,
+    rows INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    row INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    document TEXT NOT NULL,
+    metadata TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS metadata (
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    row INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS metadata_lookup ON metadata (key, value, row);
+CREATE TABLE IF NOT EXISTS tombstones (
+    row INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    value
+);
+"""
+
+# Renumbers the live rows to 0..n-1 in their current order during compaction.
+# Rows pass through negative values so the primary key never collides.
+_RENUMBER_ROWS = (
+    "CREATE TEMP TABLE remap (old INTEGER PRIMARY KEY, new INTEGER NOT NULL)",
+    "INSERT INTO remap SELECT row, ROW_NUMBER() OVER (ORDER BY row) - 1 FROM chunks",
+    "UPDATE chunks SET row = -1 - (SELECT new FROM remap WHERE old = chunks.row)",
+    "UPDATE chunks SET row = -1 - row",
+    "UPDATE metadata SET row = (SELECT new FROM remap WHERE old = metadata.row)",
+    "DROP TABLE remap",
+    "DELETE FROM tombstones",
+)
+
+
+class _SqliteMetadataIndex(MetadataIndex):
+    """:class:`MetadataIndex` whose postings live in the ``metadata`` table."""
+
+    def __init__(self, collection: "PersistentCollection") -> None:
+        super().__init__()
+        self._collection = collection
+
+    def rows_for(self, key, value) -> np.ndarray:
+        cursor = self._collection._execute(
+            "SELECT row FROM metadata WHERE key = ? AND value = ? ORDER BY row",
+            (key, json.dumps(value)),
+        )
+        return np.fromiter((row for (row,) in cursor), dtype=np.int64)
+
+
+class PersistentCollection(BaseCollection):
+    """Collection backed by memory-mapped segments and a SQLite database."""
+
+    def __init__(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self._lock = ReadWriteLock()
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(path, "store.sqlite3"),
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._index = _SqliteMetadataIndex(self)
+        self._segments: Dict[int, np.ndarray] = {}
+        self._layout: List[Tuple[int, int, int]] = []
+        self._starts = np.empty(0, dtype=np.int64)
+        self._dimension: Optional[int] = None
+        self._generation: Optional[int] = None
+        self._deleted = np.zeros(0, dtype=bool)
+        self._dead = 0
+        self._refresh()
+
+    # -- bookkeeping -----------------------------------------------------
+
+    def _execute(self, sql: str, parameters=()):
+        # Readers share the connection; statements on it must not interleave.
+        with self._db_lock:
+            return self._conn.execute(sql, parameters).fetchall()
+
+    def _segment_path(self, segment_id: int) -> str:
+        return os.path.join(self.path, f"seg_{segment_id:06d}.npy")
+
+    def _refresh(self) -> None:
+        """Synchronise the open segments with the committed segment table."""
+
+        with self._lock.write():
+            self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            for _ in range(3):
+                layout = self._conn.execute("SELECT id, start, rows FROM segments ORDER BY start").fetchall()
+                try:
+                    segments = {
+                        segment_id: self._segments.get(segment_id)
+                        if segment_id in self._segments
+                        else np.load(self._segment_path(segment_id), mmap_mode="r")
+                        for segment_id, _, _ in layout
+                    }
+                except FileNotFoundError:
+                    # A concurrent merge replaced the segments we just listed.
+                    continue
+                break
+            else:  # pragma: no cover - only under sustained concurrent merging
+                raise RuntimeError(f"Could not open the segments of {self.path}")
+
+            settings = dict(self._conn.execute("SELECT name, value FROM settings").fetchall())
+            tombstones = np.fromiter(
+                (row for (row,) in self._conn.execute("SELECT row FROM tombstones")), dtype=np.int64
+            )
+            deleted = np.zeros(sum(rows for _, _, rows in layout), dtype=bool)
+            deleted[tombstones] = True
+
+            compacted = self._generation is not None and settings.get("generation", 0) != self._generation
+            self._dimension = settings.get("dimension")
+            self._generation = settings.get("generation", 0)
+            self._segments = segments
+            self._layout = layout
+            self._starts = np.array([start for _, start, _ in layout], dtype=np.int64)
+            self._deleted = deleted
+            self._dead = len(tombstones)
+            if compacted:
+                # Row numbers changed under us; rebuild anything keyed by row.
+                self._after_compact()
+
+    def _write_segment(self, segment_id: int, block: np.ndarray) -> None:
+        path = self._segment_path(segment_id)
+        with open(path + ".tmp", "wb") as handle:
+            np.save(handle, block)
+        os.replace(path + ".tmp", path)
+
+    def _remove_files(self, segment_ids) -> None:
+        for segment_id in segment_ids:
+            try:
+                os.remove(self._segment_path(segment_id))
+            except OSError as e:  # pragma: no cover - e.g. still mapped on Windows
+                logger.warning("Could not remove segment %s: %s", segment_id, e)
+
+    # -- BaseCollection --------------------------------------------------
+
+    def close(self) -> None:
+        """Close the SQLite connection and unmap the segments."""
+
+        super().close()
+        with self._lock.write():
+            self._segments = {}
+            self.ann = None
+            self.lexical = None
+            with self._db_lock:
+                self._conn.close()
+
+    @property
+    def dimension(self) -> Optional[int]:
+        return self._dimension
+
+    def count(self) -> int:
+        return self._row_count() - self._dead
+
+    def _row_count(self) -> int:
+        return sum(rows for _, _, rows in self._layout)
+
+    def _dead_rows(self) -> Optional[np.ndarray]:
+        return self._deleted if self._dead else None
+
+    def add(self, *, embeddings, documents, metadatas, ids):
+        block = as_embedding_block(embeddings, documents, metadatas, ids)
+        if not len(block):
+            return
+        block = normalize_rows(block)
+
+        with self._lock.write():
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                dimension = self._conn.execute("SELECT value FROM settings WHERE name = 'dimension'").fetchone()
+                if dimension is None:
+                    self._conn.execute("INSERT INTO settings VALUES ('dimension', ?)", (block.shape[1],))
+                elif dimension[0] != block.shape[1]:
+                    raise ValueError(
+                        f"Embedding dimension {block.shape[1]} does not match collection dimension {dimension[0]}"
+                    )
+                (start,) = self._conn.execute("SELECT COALESCE(MAX(start + rows), 0) FROM segments").fetchone()
+                segment_id = self._conn.execute(
+                    "INSERT INTO segments (start, rows) VALUES (?, ?)", (start, len(block))
+                ).lastrowid
+                self._write_segment(segment_id, block)
+                self._conn.executemany(
+                    "INSERT INTO chunks VALUES (?, ?, ?, ?)",
+                    [
+                        (row, chunk_id, document, json.dumps(metadata, ensure_ascii=False))
+                        for row, (chunk_id, document, metadata) in enumerate(zip(ids, documents, metadatas), start)
+                    ],
+                )
+                self._conn.executemany(
+                    "INSERT INTO metadata VALUES (?, ?, ?)",
+                    [
+                        (key, json.dumps(value), row)
+                        for row, metadata in enumerate(metadatas, start)
+                        for key, value in metadata.items()
+                    ],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._refresh()
+            if len(self._layout) > MAX_SEGMENTS:
+                self.merge_segments()
+            self._after_add()
+
+    def merge_segments(self, count: Optional[int] = None) -> None:
+        """Merge the newest ``count`` segments (default: half of them) into one.
+
+        Merging only the most recent segments keeps the rewrite cost
+        proportional to recently added data, similar to a log-structured
+        merge.  The new segment is copied block by block through a memory map.
+        """
+
+        with self._lock.write():
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                layout = self._conn.execute("SELECT id, start, rows FROM segments ORDER BY start").fetchall()
+                merged = layout[-(count or max(len(layout) // 2, 2)) :]
+                if len(merged) < 2:
+                    self._conn.execute("COMMIT")
+                    return
+                start = merged[0][1]
+                total = sum(rows for _, _, rows in merged)
+                segment_id = self._conn.execute(
+                    "INSERT INTO segments (start, rows) VALUES (?, ?)", (start, total)
+                ).lastrowid
+                path = self._segment_path(segment_id)
+                target = np.lib.format.open_memmap(
+                    path + ".tmp", mode="w+", dtype=np.float32, shape=(total, self._dimension)
+                )
+                for old_id, old_start, rows in merged:
+                    source = np.load(self._segment_path(old_id), mmap_mode="r")
+                    target[old_start - start : old_start - start + rows] = source
+                target.flush()
+                del target
+                os.replace(path + ".tmp", path)
+                self._conn.executemany("DELETE FROM segments WHERE id = ?", [(old_id,) for old_id, _, _ in merged])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._refresh()
+            self._remove_files(old_id for old_id, _, _ in merged)
+
+    def delete(self, where: Dict) -> int:
+        """Tombstone the rows matching ``where`` and return how many were removed."""
+
+        with self._lock.write():
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = [(int(row),) for row in self._index.select(where)]
+                self._conn.executemany("INSERT OR IGNORE INTO tombstones VALUES (?)", rows)
+                self._conn.executemany("DELETE FROM chunks WHERE row = ?", rows)
+                self._conn.executemany("DELETE FROM metadata WHERE row = ?", rows)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._refresh()
+        if rows:
+            self._maybe_compact()
+        return len(rows)
+
+    def compact(self) -> None:
+        """Rewrite all segments into one without deleted rows and renumber the rest."""
+
+        with self._lock.write():
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh()
+                if not self._dead:
+                    self._conn.execute("COMMIT")
+                    return
+                old_layout = self._layout
+                live = np.flatnonzero(~self._deleted)
+                if len(live):
+                    segment_id = self._conn.execute(
+                        "INSERT INTO segments (start, rows) VALUES (0, ?)", (len(live),)
+                    ).lastrowid
+                    path = self._segment_path(segment_id)
+                    target = np.lib.format.open_memmap(
+                        path + ".tmp", mode="w+", dtype=np.float32, shape=(len(live), self._dimension)
+                    )
+                    boundaries = np.append(np.searchsorted(live, self._starts), len(live))
+                    for position, (old_id, start, _) in enumerate(old_layout):
+                        lo, hi = boundaries[position], boundaries[position + 1]
+                        target[lo:hi] = self._segments[old_id][live[lo:hi] - start]
+                    target.flush()
+                    del target
+                    os.replace(path + ".tmp", path)
+
+                for statement in _RENUMBER_ROWS:
+                    self._conn.execute(statement)
+                self._conn.executemany("DELETE FROM segments WHERE id = ?", [(old_id,) for old_id, _, _ in old_layout])
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO settings VALUES ('generation', ?)", ((self._generation or 0) + 1,)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._refresh()
+            self._remove_files(old_id for old_id, _, _ in old_layout)
+
+    def _catch_up(self) -> None:
+        with self._db_lock:
+            (version,) = self._conn.execute("PRAGMA data_version").fetchone()
+        if version != self._data_version:
+            with self._lock.write():
+                self._refresh()
+                self._after_add()
+        super()._catch_up()
+
+    def _rows_block(self, start: int, stop: int) -> np.ndarray:
+        return self._gather(np.arange(start, stop, dtype=np.int64))
+
+    def _texts(self, start: int, stop: int) -> List[Tuple[int, str]]:
+        return self._execute(
+            "SELECT row, document FROM chunks WHERE row >= ? AND row < ? ORDER BY row", (start, stop)
+        )
+
+    def _filter_rows(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        if not where:
+            return None
+        return self._index.select(where)
+
+    def _gather(self, rows: np.ndarray) -> np.ndarray:
+        """Copy the embeddings of the sorted ``rows`` out of their segments."""
+
+        layout, segments = self._layout, self._segments
+        block = np.empty((len(rows), self._dimension or 0), dtype=np.float32)
+        boundaries = np.append(np.searchsorted(rows, self._starts), len(rows))
+        for position, (segment_id, start, _) in enumerate(layout):
+            lo, hi = boundaries[position], boundaries[position + 1]
+            if lo < hi:
+                block[lo:hi] = segments[segment_id][rows[lo:hi] - start]
+        return block
+
+    def _scores(self, queries: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        if rows is None:
+            return np.concatenate([queries @ self._segments[segment_id].T for segment_id, _, _ in self._layout], axis=1)
+        return queries @ self._gather(rows).T
+
+    def _fetch(self, rows) -> Tuple[List[str], List[str], List[Dict]]:
+        rows = [int(row) for row in rows]
+        if not rows:
+            return [], [], []
+        found = {}
+        for lo in range(0, len(rows), _FETCH_BATCH):
+            batch = rows[lo : lo + _FETCH_BATCH]
+            placeholders = ", ".join("?" * len(batch))
+            for row, chunk_id, document, metadata in self._execute(
+                f"SELECT row, id, document, metadata FROM chunks WHERE row IN ({placeholders})", batch
+            ):
+                found[row] = (chunk_id, document, json.loads(metadata))
+        records = [found[row] for row in rows]
+        return (
+            [record[0] for record in records],
+            [record[1] for record in records],
+            [record[2] for record in records],
+        )
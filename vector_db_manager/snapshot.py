@@ -0,0 +1,231 @@
+"""Single-file snapshots of vector collections for fast warm starts.
+
+:func:`export_collection` writes the live rows of a collection to one
+binary file and :func:`import_collection` loads it back without calling the
+embeddings API again.  Layout of a snapshot::
+
+    magic      8 bytes   b"VDBSNAP1"
+    length     4 bytes   little-endian uint32 size of the header
+    header     JSON      name, rows, dimension, dtype and section offsets
+    embeddings           raw float32 or float16 rows, 64-byte aligned
+    offsets              int64 byte offsets of each document, 64-byte aligned
+    documents            UTF-8 text of all documents, back to back
+    metadata             zlib-compressed JSON with the ids and metadata
+
+The embeddings are stored already normalised, so an in-memory collection
+whose ``VECTOR_STORAGE`` matches the snapshot dtype adopts the memory-mapped
+block directly (copy-on-write) instead of reading and copying it.  Document
+text, which dominates the file size, is memory mapped too and only decoded
+for the rows a query returns.  Only the ids and
+metadata are parsed up front, which keeps loading a 100k-chunk collection
+well under a second; ANN and lexical indexes are rebuilt on first use.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import struct
+import zlib
+from collections.abc import MutableSequence
+from typing import Optional
+
+import numpy as np
+
+from vector_db_manager import chroma
+from vector_db_manager.chroma import _collection_key, _memory_collection, get_or_create_collection
+
+MAGIC = b"VDBSNAP1"
+_ALIGNMENT = 64
+
+# Rows copied per block while exporting or importing into the on-disk backend.
+_EXPORT_BLOCK_ROWS = 4096
+
+_DTYPES = {"float32": np.float32, "float16": np.float16}
+
+
+class SnapshotTexts(MutableSequence):
+    """Documents of an imported snapshot, decoded from the mapped file on access.
+
+    Documents added after the import are kept in an ordinary list.  Any
+    other modification first decodes every document into that list.
+    """
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray) -> None:
+        self._data = data
+        self._offsets = offsets
+        self._base = len(offsets) - 1
+        self._added: list = []
+
+    def __len__(self) -> int:
+        return self._base + len(self._added)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("document index out of range")
+        if index >= self._base:
+            return self._added[index - self._base]
+        return self._data[self._offsets[index] : self._offsets[index + 1]].tobytes().decode("utf-8")
+
+    def _materialize(self) -> None:
+        if self._base:
+            self._added = list(self)
+            self._base = 0
+
+    def __setitem__(self, index, value) -> None:
+        self._materialize()
+        self._added[index] = value
+
+    def __delitem__(self, index) -> None:
+        if isinstance(index, slice) and index.step is None and (index.start or 0) >= self._base:
+            # Rolling back a failed append only touches the added documents.
+            del self._added[index.start - self._base : None if index.stop is None else index.stop - self._base]
+            return
+        self._materialize()
+        del self._added[index]
+
+    def insert(self, index, value) -> None:
+        if index >= len(self):
+            self._added.append(value)
+            return
+        self._materialize()
+        self._added.insert(index, value)
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+def export_collection(name: str, path: str, tenant: Optional[str] = None, dtype: Optional[str] = None) -> int:
+    """Write the live rows of collection ``name`` to the snapshot file ``path``.
+
+    ``dtype`` (``"float32"`` or ``"float16"``) defaults to float32 for exact
+    collections and float16 for quantised ones.  The file is written next to
+    ``path`` and renamed into place.  Returns the number of rows exported.
+    """
+
+    collection = get_or_create_collection(name, tenant=tenant)
+    storage = getattr(getattr(collection, "_store", None), "storage", "float32")
+    dtype = dtype or ("float32" if storage == "float32" else "float16")
+    if dtype not in _DTYPES:
+        raise ValueError(f"Unsupported snapshot dtype: {dtype}")
+
+    collection._catch_up()
+    with collection._lock.read():
+        total = collection._row_count()
+        dead = collection._dead_rows()
+        live = np.arange(total) if dead is None else np.flatnonzero(~dead)
+        ids, documents, metadatas = collection._fetch(live)
+        encoded = [document.encode("utf-8") for document in documents]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(document) for document in encoded], out=offsets[1:])
+        metadata = zlib.compress(
+            json.dumps({"ids": ids, "metadatas": metadatas}, ensure_ascii=False).encode("utf-8")
+        )
+
+        dimension = collection.dimension or 0
+        item_size = np.dtype(_DTYPES[dtype]).itemsize
+        sections = {}
+        # The header length depends on the offsets it records; reserve a generous fixed size.
+        position = _aligned(len(MAGIC) + 4 + 1024)
+        for section, length in (
+            ("embeddings", len(live) * dimension * item_size),
+            ("offsets", offsets.nbytes),
+            ("documents", int(offsets[-1])),
+            ("metadata", len(metadata)),
+        ):
+            sections[section] = [position, length]
+            position = _aligned(position + length)
+        header = json.dumps(
+            {"version": 1, "name": name, "rows": len(live), "dimension": dimension, "dtype": dtype, "sections": sections}
+        ).encode("utf-8")
+        if len(MAGIC) + 4 + len(header) > sections["embeddings"][0]:
+            raise ValueError("Snapshot header too large")
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as handle:
+            handle.write(MAGIC + struct.pack("<I", len(header)) + header)
+            handle.seek(sections["embeddings"][0])
+            for lo in range(0, len(live), _EXPORT_BLOCK_ROWS):
+                rows = live[lo : lo + _EXPORT_BLOCK_ROWS]
+                block = collection._rows_block(int(rows[0]), int(rows[-1]) + 1)[rows - rows[0]]
+                handle.write(block.astype(_DTYPES[dtype]).tobytes())
+            handle.seek(sections["offsets"][0])
+            handle.write(offsets.tobytes())
+            handle.seek(sections["documents"][0])
+            for document in encoded:
+                handle.write(document)
+            handle.seek(sections["metadata"][0])
+            handle.write(metadata)
+    os.replace(tmp_path, path)
+    return len(live)
+
+
+def _read_header(path: str) -> dict:
+    with open(path, "rb") as handle:
+        prefix = handle.read(len(MAGIC) + 4)
+        if len(prefix) < len(MAGIC) + 4 or prefix[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a vector store snapshot: {path}")
+        (length,) = struct.unpack("<I", prefix[len(MAGIC) :])
+        return json.loads(handle.read(length))
+
+
+def import_collection(path: str, name: Optional[str] = None, tenant: Optional[str] = None):
+    """Load the snapshot at ``path`` into collection ``name`` and return it.
+
+    ``name`` defaults to the name recorded in the snapshot.  The target
+    collection must be empty.  In memory the snapshot file is mapped rather
+    than read and must stay in place while the collection is in use; with
+    ``CHROMA_DB_PATH`` set the rows are copied into the on-disk collection.
+    """
+
+    header = _read_header(path)
+    name = name or header["name"]
+    rows, dimension = header["rows"], header["dimension"]
+    sections = header["sections"]
+
+    def section(key, dtype, shape=None):
+        offset, length = sections[key]
+        if not length:
+            return np.empty(shape or 0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="c" if key == "embeddings" else "r", offset=offset, shape=shape)
+
+    block = section("embeddings", _DTYPES[header["dtype"]], (rows, dimension))
+    offsets = section("offsets", np.int64, (rows + 1,))
+    data = section("documents", np.uint8)
+    offset, length = sections["metadata"]
+    with open(path, "rb") as handle:
+        handle.seek(offset)
+        metadata = json.loads(zlib.decompress(handle.read(length)))
+
+    key = _collection_key(name, tenant)
+    if isinstance(key, str):
+        collection = get_or_create_collection(name, tenant=tenant)
+        if collection.count():
+            raise ValueError(f"Collection {name!r} is not empty")
+        documents = SnapshotTexts(data, offsets)
+        for lo in range(0, rows, _EXPORT_BLOCK_ROWS):
+            hi = min(lo + _EXPORT_BLOCK_ROWS, rows)
+            collection.add(
+                embeddings=np.asarray(block[lo:hi], dtype=np.float32),
+                documents=documents[lo:hi],
+                metadatas=metadata["metadatas"][lo:hi],
+                ids=metadata["ids"][lo:hi],
+            )
+        return collection
+
+    with chroma._collections_lock:
+        existing = chroma._collections.get(key)
+        if existing is not None and existing.count():
+            raise ValueError(f"Collection {name!r} is not empty")
+        collection = _memory_collection()
+        if rows:
+            collection._restore(block, metadata["ids"], SnapshotTexts(data, offsets), metadata["metadatas"])
+        if os.getenv("VECTOR_INDEX", "").lower() == "ivf":
+            collection.enable_ann(lazy=True)
+        chroma._collections[key] = collection
+    return collection
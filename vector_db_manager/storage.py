@@ -0,0 +1,248 @@
+"""Growable embedding matrices with optional quantisation.
+
+The in-memory collection keeps its normalised embeddings in one of these
+matrices.  All of them grow by doubling and expose the same small API; they
+differ only in how rows are encoded:
+
+``float32``  4 bytes per dimension, exact.
+``float16``  2 bytes per dimension; rows are widened to float32 block by
+             block while scoring.
+``int8``     1 byte per dimension plus one float32 scale per row
+             (symmetric quantisation, ``x ≈ code * scale``).  With
+             ``rescore=True`` a float16 copy is kept as well and the best
+             candidates are re-ranked with it in float32 arithmetic.
+
+For ``text-embedding-3-small`` (1536 dimensions) a chunk held as a list of
+Python floats costs about 50 KB; float32 needs 6 KB, float16 3 KB, int8
+about 1.5 KB and int8 with rescoring about 4.5 KB.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+# Rows widened to float32 at a time when scoring a quantised matrix.
+SCORE_BLOCK_ROWS = 4096
+
+# Size of a Python float object, plus its 8-byte pointer in the list.
+_PYTHON_FLOAT_BYTES = 24
+
+
+class EmbeddingMatrix:
+    """Exact float32 storage; base class for the quantised variants."""
+
+    storage = "float32"
+
+    def __init__(self, rescore: bool = False) -> None:
+        self.rescore = rescore
+        self._arrays: Dict[str, np.ndarray] = {}
+        self.dimension: Optional[int] = None
+
+    # -- encoding --------------------------------------------------------
+
+    def _layout(self, dimension: int) -> Dict[str, tuple]:
+        """Return ``{name: (dtype, per-row shape)}`` for the backing arrays."""
+
+        return {"values": (np.float32, (dimension,))}
+
+    def _encode(self, block: np.ndarray) -> Dict[str, np.ndarray]:
+        return {"values": block}
+
+    def _decode(self, arrays: Dict[str, np.ndarray]) -> np.ndarray:
+        return arrays["values"]
+
+    def _decode_exact(self, arrays: Dict[str, np.ndarray]) -> np.ndarray:
+        return self._decode(arrays)
+
+    # -- storage ---------------------------------------------------------
+
+    @property
+    def capacity(self) -> int:
+        return len(next(iter(self._arrays.values()))) if self._arrays else 0
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self._arrays.values())
+
+    def bytes_per_row(self) -> int:
+        return sum(
+            np.dtype(dtype).itemsize * int(np.prod(shape)) for dtype, shape in self._layout(self.dimension or 0).values()
+        )
+
+    def resize(self, capacity: int, dimension: int, keep: int) -> None:
+        """Reallocate to ``capacity`` rows, preserving the first ``keep`` rows."""
+
+        arrays = {
+            name: np.empty((capacity,) + shape, dtype=dtype) for name, (dtype, shape) in self._layout(dimension).items()
+        }
+        for name, array in self._arrays.items():
+            arrays[name][:keep] = array[:keep]
+        self._arrays = arrays
+        self.dimension = dimension
+
+    def write(self, start: int, block: np.ndarray) -> None:
+        """Store the normalised float32 ``block`` at rows ``start`` onwards."""
+
+        for name, encoded in self._encode(block).items():
+            self._arrays[name][start : start + len(block)] = encoded
+
+    def load(self, block: np.ndarray) -> None:
+        """Replace the contents with the normalised ``block``.
+
+        When ``block`` already has this matrix's encoding (float32 or
+        float16 values) it is adopted as is, so a memory-mapped snapshot is
+        not copied until the matrix next grows.
+        """
+
+        layout = self._layout(block.shape[1])
+        if list(layout) == ["values"] and block.dtype == layout["values"][0]:
+            self._arrays = {"values": block}
+            self.dimension = block.shape[1]
+            return
+        self.resize(len(block), block.shape[1], 0)
+        for lo in range(0, len(block), SCORE_BLOCK_ROWS):
+            self.write(lo, np.asarray(block[lo : lo + SCORE_BLOCK_ROWS], dtype=np.float32))
+
+    def _slice(self, index) -> Dict[str, np.ndarray]:
+        return {name: array[index] for name, array in self._arrays.items()}
+
+    def rows(self, start: int, stop: int) -> np.ndarray:
+        """Return rows ``start`` to ``stop`` as float32."""
+
+        return self._decode(self._slice(slice(start, stop)))
+
+    def take(self, rows: np.ndarray) -> np.ndarray:
+        """Return the given ``rows`` as float32."""
+
+        return self._decode(self._slice(rows))
+
+    def exact(self, rows: np.ndarray) -> np.ndarray:
+        """Return the given ``rows`` at the best precision available."""
+
+        return self._decode_exact(self._slice(rows))
+
+    def scores(self, queries: np.ndarray, count: int, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Return ``queries @ rows.T`` over the first ``count`` rows or over ``rows``."""
+
+        if type(self)._decode is EmbeddingMatrix._decode:
+            stored = self._arrays["values"][:count] if rows is None else self._arrays["values"][rows]
+            return queries @ stored.T
+
+        total = count if rows is None else len(rows)
+        scores = np.empty((len(queries), total), dtype=np.float32)
+        for lo in range(0, total, SCORE_BLOCK_ROWS):
+            hi = min(lo + SCORE_BLOCK_ROWS, total)
+            block = self.rows(lo, hi) if rows is None else self.take(rows[lo:hi])
+            scores[:, lo:hi] = queries @ block.T
+        return scores
+
+    def compacted(self, live: np.ndarray, capacity: int) -> "EmbeddingMatrix":
+        """Return a new matrix of ``capacity`` rows holding only ``live`` rows."""
+
+        matrix = type(self)(rescore=self.rescore)
+        matrix.resize(capacity, self.dimension, 0)
+        for name, array in self._arrays.items():
+            matrix._arrays[name][: len(live)] = array[live]
+        return matrix
+
+
+class Float16Matrix(EmbeddingMatrix):
+    storage = "float16"
+
+    def _layout(self, dimension):
+        return {"values": (np.float16, (dimension,))}
+
+    def _encode(self, block):
+        return {"values": block.astype(np.float16)}
+
+    def _decode(self, arrays):
+        return arrays["values"].astype(np.float32)
+
+
+class Int8Matrix(EmbeddingMatrix):
+    storage = "int8"
+
+    def _layout(self, dimension):
+        layout = {"codes": (np.int8, (dimension,)), "scales": (np.float32, ())}
+        if self.rescore:
+            layout["exact"] = (np.float16, (dimension,))
+        return layout
+
+    def _encode(self, block):
+        scales = np.abs(block).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        encoded = {
+            "codes": np.round(block / scales[:, np.newaxis]).astype(np.int8),
+            "scales": scales.astype(np.float32),
+        }
+        if self.rescore:
+            encoded["exact"] = block.astype(np.float16)
+        return encoded
+
+    def _decode(self, arrays):
+        return arrays["codes"].astype(np.float32) * arrays["scales"][..., np.newaxis]
+
+    def _decode_exact(self, arrays):
+        if self.rescore:
+            return arrays["exact"].astype(np.float32)
+        return self._decode(arrays)
+
+
+MATRIX_TYPES = {matrix.storage: matrix for matrix in (EmbeddingMatrix, Float16Matrix, Int8Matrix)}
+
+
+def create_matrix(storage: str = "float32", rescore: bool = False) -> EmbeddingMatrix:
+    """Return an empty matrix for the ``storage`` mode."""
+
+    try:
+        return MATRIX_TYPES[storage](rescore=rescore)
+    except KeyError:
+        raise ValueError(f"Unsupported embedding storage: {storage}") from None
+
+
+def quantization_report(
+    vectors,
+    queries,
+    top_k: int = 10,
+    modes: Iterable[tuple] = (("float16", False), ("int8", False), ("int8", True)),
+) -> List[Dict[str, float]]:
+    """Compare memory use and recall@``top_k`` of each storage mode with float32.
+
+    ``modes`` holds ``(storage, rescore)`` pairs.  ``compression`` is measured
+    against the same embeddings held as lists of Python floats.
+    """
+
+    from vector_db_manager.chroma import _Collection
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    queries = np.asarray(queries, dtype=np.float32)
+    python_row_bytes = vectors.shape[1] * (_PYTHON_FLOAT_BYTES + 8)
+
+    def build(storage, rescore):
+        collection = _Collection(storage=storage, rescore=rescore)
+        collection.add(
+            embeddings=vectors,
+            documents=[""] * len(vectors),
+            metadatas=[{}] * len(vectors),
+            ids=[str(i) for i in range(len(vectors))],
+        )
+        return collection
+
+    reference = build("float32", False).query(queries, n_results=top_k)["ids"]
+    report = []
+    for storage, rescore in (("float32", False),) + tuple(modes):
+        collection = build(storage, rescore)
+        found = collection.query(queries, n_results=top_k)["ids"]
+        recall = np.mean([len(set(a) & set(e)) / max(len(e), 1) for a, e in zip(found, reference)])
+        row_bytes = collection._store.bytes_per_row()
+        report.append(
+            {
+                "storage": storage + ("+rescore" if rescore else ""),
+                "bytes_per_row": row_bytes,
+                "compression": python_row_bytes / row_bytes,
+                "recall": float(recall),
+            }
+        )
+    return report